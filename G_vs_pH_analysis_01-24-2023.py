@@ -32,19 +32,33 @@ Created on Tue Nov 23 15:06:42 2021
 import numpy as np
 import matplotlib.pyplot as plt
 import os
-# import time
-import scipy
+import time
 # from scipy import optimize
-from scipy.stats import linregress
-import statistics as st
+from scipy.optimize import least_squares
 import glob
+import hashlib
+import json
+import argparse
+import pickle
 import ntpath
 # from numpy import diff
 import re
 import logging
+import sys
+import tracemalloc
 # import sys
 from lmfit import Parameters, minimize, fit_report
 from matplotlib.offsetbox import AnchoredText
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from dataclasses import dataclass, fields, asdict
+from functools import partial
+try:
+    import resource         # peak RSS for the stage reports (function #19), not on Windows
+except ImportError:
+    resource = None
 
 #...................FUNCTIONS........................
 """1. Collect all file names that you want to analyze in a list"""
@@ -72,14 +86,7 @@ def list_of_files(path_to_file, common_name, save_file_tag, pH_in_label):
     for h in range(len(abc)):
         file_name = ntpath.basename(f"{abc[h]}")
         title = file_name[:-4]
-        regex = re.compile(r'\d+')
-        numbers = [int(s) for s in regex.findall(title)]
-        int_pH = pH_in_label[0]
-        dec_pH = pH_in_label[1]
-        pH_label1 = numbers[int_pH] # these need to change with the naming scheme - number corisponds to the grouping of numbers
-        pH_label2 = numbers[dec_pH]
-        pH_label2 = pH_label2/100
-        pH = pH_label1 + pH_label2
+        pH = pH_from_file_name(title, pH_in_label)         # Function #1.1
         pHs.append(pH)
         file_names.append(title)
         save_file_name = [f"{title}_{save_file_tag}"]
@@ -88,28 +95,397 @@ def list_of_files(path_to_file, common_name, save_file_tag, pH_in_label):
     return(file_names, save_file_names, pHs)
 
 
+"""1.1 pH from a file name"""
+def pH_from_file_name(title, pH_in_label):
+    """
+        This function takes the pH out of a file name (title, no .bin), the groups of numbers at (pH_in_label) are the whole number and the two decimals
+        (example: BS_p096_GvpH2-81_run1_0808 with (1, 2) => pH: 2.81).
+        
+        1. pH
+    """
+    regex = re.compile(r'\d+')
+    numbers = [int(s) for s in regex.findall(title)]
+    int_pH = pH_in_label[0]
+    dec_pH = pH_in_label[1]
+    pH_label1 = numbers[int_pH] # these need to change with the naming scheme - number corisponds to the grouping of numbers
+    pH_label2 = numbers[dec_pH]
+    pH_label2 = pH_label2/100
+    pH = pH_label1 + pH_label2
+    
+    return(pH)
+
+
 """2. Open data and separate Raw data into raw voltage and raw current"""
-def open_bin_data(path_to_file, file_name):
+def open_bin_data(path_to_file, file_name, memory_map = False):
     """
         This function opens a file with the current file name in the path, extracts and separates the (raw_current ) and the (raw_voltage).
         A master index is also made from the total length of the raw data
         1. raw_current, list of the raw current values.
         2. raw_voltage, list of the raw voltage values
-        3. x_data_index_master, indexing list for current and voltage (list from 0 to len(raw_current))
-        
+        3. x_data_index_master, indexing for current and voltage (0 to len(raw_current)), made with function #2.3 so no index array is stored
+
+        (memory_map) = True opens the file with function #2.1 instead of reading it all into RAM. (raw_current) and (raw_voltage) are then the
+        fields of the memory mapped file and only the parts that are used get read from the disk.
+
         Updated: BS - 01/11/2022
     """
+    if memory_map:
+        raw_data = open_bin_data_memmap(path_to_file, file_name)
+        raw_current = raw_data['current']
+        raw_voltage = raw_data['voltage']
+        x_data_index_master = sample_index(raw_current)
+        return(raw_current, raw_voltage, x_data_index_master)
+
     with open(os.path.join(path_to_file, file_name + ".bin"),'r') as current_file:
         data_type = np.dtype('>d') # assign data type: big-endian ordered 64 bit long data format 
         raw_data = np.fromfile(current_file, dtype = data_type) # use numpy module to assign current trace data to [raw_data]
         raw_current = raw_data[0::2] # array of full baseline (current) data with first second and trailing values removed
         raw_voltage = raw_data[1::2]
-        x_data_index_master = np.linspace(0,len(raw_current), len(raw_current), endpoint = True, dtype = 'int')
+        x_data_index_master = sample_index(raw_current)
         current_file.close() # closes large data file
         del current_file
     
     return(raw_current, raw_voltage, x_data_index_master)
+
+
+"""2.1 Memory map the raw data file"""
+BIN_SAMPLE_DTYPE = np.dtype([('current', '>d'), ('voltage', '>d')]) # one sample of the .bin file: big-endian 64 bit current followed by big-endian 64 bit voltage
+
+def open_bin_data_memmap(path_to_file, file_name):
+    """
+        This function memory maps the .bin file instead of loading it. Each sample is read as a (BIN_SAMPLE_DTYPE) record so the current and voltage
+        are fields of one array (raw_data['current'], raw_data['voltage']) and no copy of the data is made. Nothing is read from the disk until it is used,
+        so files larger than the RAM can be opened.
+
+        The data stays big-endian on the disk, use function #2.2 to get native byte order chunks of a field to do math on.
+        A partly written last sample (file size not a multiple of 16 bytes) is left off.
+
+        1. raw_data, memory mapped record array with the fields 'current' and 'voltage'
+    """
+    bin_file_path = os.path.join(path_to_file, file_name + ".bin")
+    number_of_samples = os.path.getsize(bin_file_path) // BIN_SAMPLE_DTYPE.itemsize
+    raw_data = np.memmap(bin_file_path, dtype = BIN_SAMPLE_DTYPE, mode = 'r', shape = (number_of_samples,))
+
+    return(raw_data)
+
+
+"""2.2 Native byte order chunks of memory mapped data"""
+def bin_data_chunks(raw_data_field, chunk_size, start = 0, stop = None):
+    """
+        This function walks through a field of the memory mapped data (raw_data['current'] or raw_data['voltage']) from (start) to (stop) and yields it
+        (chunk_size) datapoints at a time. Each chunk is converted to native byte order float64 as it is yielded, so only one chunk is ever held in RAM.
+
+        yields (chunk_start, chunk), chunk_start is the index of the first datapoint in the chunk
+    """
+    if stop is None:
+        stop = len(raw_data_field)
+    for chunk_start in range(start, stop, chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, stop)
+        yield chunk_start, np.asarray(raw_data_field[chunk_start:chunk_stop], dtype = np.float64)
+
+
+"""2.3 Sample index"""
+def sample_index(raw_data):
+    """
+        This function makes the index for the raw data (0 to len(raw_data)) without making an array for it. A range is returned, which can be
+        sliced and looped over like the old index array (x_data_index_master[start:stop]) but only stores its start, stop and step, so it
+        costs the same amount of memory for any length of data.
+
+        1. x_data_index_master, range from 0 to len(raw_data)
+    """
+    return(range(len(raw_data)))
+
+
+"""2.4 Time axis"""
+def time_axis(sample_indexs, acquisition_rate):
+    """
+        This function turns sample index's (usually a slice of the range from function #2.3, x_data_index_master[start:stop]) into seconds for the
+        x-axis of a plot. The seconds are made as one numpy array (np.arange(start, stop) / acquisition_rate) instead of one Python float per datapoint,
+        and only for the slice being plotted, so no time array the length of the whole recording is ever made.
+        
+        1. seconds, numpy float64 array, the same length as (sample_indexs)
+    """
+    if isinstance(sample_indexs, range):
+        return(np.arange(sample_indexs.start, sample_indexs.stop, sample_indexs.step, dtype = np.float64) / acquisition_rate)
+    
+    return(np.asarray(sample_indexs, dtype = np.float64) / acquisition_rate)
+
+
+"""2.41 Seconds to datapoints"""
+def seconds_to_datapoints(seconds, acquisition_rate):
+    """
+        This function turns a user defined length in seconds into a whole number of datapoints at (acquisition_rate), so that fractional seconds
+        (0.5 seconds at 10000 Hz = 5000 datapoints) can be used to index and slice the data. Whole seconds give the same value as seconds * acquisition_rate.
+        
+        1. datapoints, int
+    """
+    return(int(round(seconds * acquisition_rate)))
+
+
+"""2.45 Running statistics"""
+def new_running_stats():
+    """
+        This function starts a running mean / standard deviation accumulator (Welford), for data that comes in blocks (function #2.46), such as
+        a long slice of a memory mapped recording. Many windows at once are done by function #2.47 without it.
+        
+        1. running_stats, dictionary with the 'count', 'mean' and 'm2' (sum of squared differences from the mean) of the data so far
+    """
+    return({'count': 0, 'mean': 0.0, 'm2': 0.0})
+
+
+def update_running_stats(running_stats, values):
+    """
+        This function adds a block of (values) to (running_stats). The mean and sum of squared differences of the block are found with numpy and
+        merged with the running ones (Chan et al. pairwise update), so the result is the same as one pass over all the data, without the round off
+        of sum(x**2) - n*mean**2, and without holding all the data at once.
+        
+        1. running_stats, the same dictionary, updated
+    """
+    values = np.asarray(values, dtype = np.float64)
+    block_count = len(values)
+    if block_count == 0:
+        return(running_stats)
+    block_mean = np.mean(values)
+    block_m2 = np.sum(np.square(values - block_mean))
+    
+    count = running_stats['count'] + block_count
+    delta = block_mean - running_stats['mean']
+    running_stats['m2'] += block_m2 + delta * delta * running_stats['count'] * block_count / count
+    running_stats['mean'] += delta * block_count / count
+    running_stats['count'] = count
+    
+    return(running_stats)
+
+
+def running_stats_result(running_stats):
+    """
+        1. mean, NaN if there is no data
+        2. stdev, sample standard deviation (same as statistics.stdev), NaN with less than 2 values
+        3. count, number of values
+    """
+    count = running_stats['count']
+    mean = running_stats['mean'] if count else np.nan
+    stdev = np.sqrt(running_stats['m2'] / (count - 1)) if count > 1 else np.nan
+    
+    return(mean, stdev, count)
+
+
+"""2.46 Statistics of data"""
+def data_stats(values, block_size = 1048576):
+    """
+        This function finds the mean, sample standard deviation and count of (values) (a list, an array, or a slice of the raw or memory mapped data)
+        with numpy, (block_size) values at a time (function #2.45). It replaces statistics.stdev, which works one Python number at a time.
+        
+        1. mean
+        2. stdev, same as statistics.stdev, NaN with less than 2 values
+        3. count
+    """
+    running_stats = new_running_stats()
+    if not isinstance(values, np.ndarray):
+        values = np.asarray(values, dtype = np.float64)
+    for block_start in range(0, len(values), block_size):
+        update_running_stats(running_stats, values[block_start:block_start + block_size])
+    
+    return(running_stats_result(running_stats))
+
+
+"""2.47 Statistics of windows"""
+def window_stats(raw_data, first_indexs, window_length, window_block_size = 1048576):
+    """
+        This function finds the mean, sample standard deviation and count of (raw_data) in every window [first_index, first_index + window_length)
+        at once. The windows are taken in order of their start and done in blocks, each block is the windows that fit in about (window_block_size)
+        datapoints from the first one (at least one window). Only the span of (raw_data) covered by a block is read (so a memory mapped file is read a
+        block at a time), and the sums of x, of (x - shift) and of (x - shift)**2 over every window in the block are each found with one np.add.reduceat
+        call (window starts and ends interleaved, same as function #7.45). (shift) is the mean of the window each datapoint is in, so the squares stay
+        small and (sum((x - shift)**2) - sum(x - shift)**2 / count) / (count - 1) does not lose precision.
+        Windows that overlap are split into groups that do not (every (layers)th window in order), and each group is done the same way.
+        Windows that run past the end of (raw_data) are cut short, like a slice would be.
+        
+        1. means, numpy array with the mean of each window, NaN for an empty window
+        2. stdevs, numpy array with the sample standard deviation of each window (same as statistics.stdev), NaN with less than 2 values
+        3. counts, numpy array with the number of datapoints in each window
+    """
+    window_length = int(window_length)
+    first_indexs = np.clip(np.asarray(first_indexs, dtype = np.int64), 0, len(raw_data))
+    window_ends = np.minimum(first_indexs + window_length, len(raw_data))
+    counts = np.maximum(window_ends - first_indexs, 0)
+    means = np.full(len(first_indexs), np.nan)
+    stdevs = np.full(len(first_indexs), np.nan)
+    
+    def block_stats(block_windows):
+        span_start = int(first_indexs[block_windows].min())
+        span_stop = int(window_ends[block_windows].max())
+        values = np.zeros(span_stop - span_start + 1)       # one extra zero at the end, reduceat can not take an index equal to the length
+        values[:-1] = raw_data[span_start:span_stop]
+        
+        def window_edges(windows):
+            edges = np.empty(2*len(windows), dtype = np.int64)
+            edges[0::2] = first_indexs[windows] - span_start
+            edges[1::2] = window_ends[windows] - span_start
+            return(edges)
+        
+        means[block_windows] = np.add.reduceat(values, window_edges(block_windows))[0::2] / counts[block_windows]
+        
+        starts_in_order = first_indexs[block_windows]
+        layers = 1
+        while np.any(starts_in_order[layers:] - starts_in_order[:-layers] < window_length):
+            layers += 1
+        for layer in range(layers):
+            windows = block_windows[layer::layers]
+            edges = window_edges(windows)
+            segment_shifts = np.zeros(len(edges) + 1)
+            segment_shifts[1::2] = means[windows]        # the datapoints between the windows are not used, they are shifted by 0
+            shifted_values = values - np.repeat(segment_shifts, np.diff(edges, prepend = 0, append = len(values)))
+            shifted_sums = np.add.reduceat(shifted_values, edges)[0::2]
+            np.square(shifted_values, out = shifted_values)
+            shifted_squares = np.add.reduceat(shifted_values, edges)[0::2]
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                variances = (shifted_squares - np.square(shifted_sums) / counts[windows]) / (counts[windows] - 1)
+            stdevs[windows] = np.where(counts[windows] > 1, np.sqrt(np.maximum(variances, 0)), np.nan)
+    
+    has_data = np.flatnonzero(counts > 0)
+    windows_in_order = has_data[np.argsort(first_indexs[has_data], kind = 'stable')]
+    ends_in_order = window_ends[windows_in_order]        # the windows all have the same length, so the ends are in order too
+    i = 0
+    while i < len(windows_in_order):
+        block_stop = np.searchsorted(ends_in_order, first_indexs[windows_in_order[i]] + window_block_size, side = 'right')
+        block_stop = max(int(block_stop), i + 1)
+        block_stats(windows_in_order[i:block_stop])
+        i = block_stop
+    
+    return(means, stdevs, counts)
+
+
+"""2.5 Result cache"""
+def make_result_cache(cache_folder, cache_size_limit_mb, path_to_file, file_name, hash_file_contents = False):
+    """
+        This function sets up the on disk result cache for one .bin file. Functions #6, #7, #7.5, #8 and #9 take the cache as (result_cache) and skip their
+        work when they have already been run on the same file with the same inputs (function #2.54). With (cache_folder) = None there is no cache.
+        
+        The file is identified by its size and modification time, or by a hash of its contents with (hash_file_contents) = True (slower, but the cache
+        still works after the file is copied or moved).
+        (cache_size_limit_mb) caps the size of the cache folder, the least recently used results are deleted first (function #2.53).
+        
+        1. result_cache, (cache_folder, cache_size_limit in bytes, file_key) or None
+    """
+    if cache_folder is None:
+        return(None)
+    os.makedirs(cache_folder, exist_ok = True)
+    
+    bin_file_path = os.path.join(path_to_file, file_name + ".bin")
+    if hash_file_contents:
+        file_hash = hashlib.sha256()
+        with open(bin_file_path, 'rb') as bin_file:
+            for block in iter(lambda: bin_file.read(1 << 20), b''):
+                file_hash.update(block)
+        file_key = file_hash.hexdigest()
+    else:
+        file_stat = os.stat(bin_file_path)
+        file_key = f"{os.path.abspath(bin_file_path)}|{file_stat.st_size}|{file_stat.st_mtime_ns}"
+    
+    return((cache_folder, int(cache_size_limit_mb * 1024 * 1024), file_key))
+
+
+"""2.51 Result cache key"""
+def result_cache_key(result_cache, stage_name, stage_inputs):
+    """
+        This function makes the cache key of one stage: a sha256 of the file key, the (stage_name) and every value in (stage_inputs).
+        Arrays are hashed by their contents, so a stage that is given different index's or data gets a different key.
+        
+        1. key, hex string
+    """
+    key_hash = hashlib.sha256()
+    key_hash.update(result_cache[2].encode())
+    key_hash.update(stage_name.encode())
+    for stage_input in stage_inputs:
+        if isinstance(stage_input, np.ndarray):
+            stage_input = np.ascontiguousarray(stage_input)
+            key_hash.update(f"{stage_input.dtype.str}{stage_input.shape}".encode())
+            key_hash.update(stage_input.tobytes())
+        else:
+            key_hash.update(repr(stage_input).encode())
+    
+    return(key_hash.hexdigest())
+
+
+"""2.52 Load a cached result"""
+def load_cached_result(result_cache, key):
+    """
+        This function loads the result saved under (key), or returns (False, None) if there is none. The file time of a result is updated every
+        time it is loaded, so function #2.53 deletes the results that have gone the longest without being used.
         
+        1. found, True if the result was in the cache
+        2. result
+    """
+    cache_file = os.path.join(result_cache[0], key + ".pkl")
+    try:
+        with open(cache_file, 'rb') as cached:
+            result = pickle.load(cached)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return(False, None)
+    os.utime(cache_file)
+    
+    return(True, result)
+
+
+"""2.53 Save a result to the cache"""
+def save_cached_result(result_cache, key, result):
+    """
+        This function saves (result) under (key) and then deletes the least recently used results until the cache folder is under its size limit.
+        The result is written to a temporary file first and then renamed, so processes running at the same time never read half a file.
+    """
+    cache_folder, cache_size_limit = result_cache[:2]
+    cache_file = os.path.join(cache_folder, key + ".pkl")
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as cached:
+        pickle.dump(result, cached, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, cache_file)
+    
+    cached_files = []
+    for cached_name in os.listdir(cache_folder):
+        if not cached_name.endswith(".pkl"):
+            continue
+        try:
+            cached_stat = os.stat(os.path.join(cache_folder, cached_name))
+        except OSError:
+            continue
+        cached_files.append((cached_stat.st_mtime_ns, cached_stat.st_size, cached_name))
+    cached_files.sort()
+    
+    cache_size = sum([cached[1] for cached in cached_files])
+    for mtime, size, cached_name in cached_files:
+        if cache_size <= cache_size_limit or cached_name == key + ".pkl":
+            continue
+        try:
+            os.remove(os.path.join(cache_folder, cached_name))
+        except OSError:
+            pass
+        cache_size -= size
+
+
+"""2.54 Run a stage through the cache"""
+def cached_stage(result_cache, stage_name, stage_inputs, stage_function, *args, **kwargs):
+    """
+        This function returns stage_function(*args, **kwargs), from the cache if the stage has already been run on this file with the same (stage_inputs).
+        (stage_inputs) has to hold everything that changes the result other than the .bin file itself (user defined values, index's, fit settings),
+        settings that only change how fast it runs (number of workers) are left out. With (result_cache) = None the stage is always run.
+        
+        1. result, the output of (stage_function)
+    """
+    if result_cache is None:
+        return(stage_function(*args, **kwargs))
+    
+    key = result_cache_key(result_cache, stage_name, stage_inputs)       # Function #2.51
+    found, result = load_cached_result(result_cache, key)       # Function #2.52
+    if found:
+        print(f"{stage_name}: loaded from the result cache")
+        return(result)
+    
+    result = stage_function(*args, **kwargs)
+    save_cached_result(result_cache, key, result)       # Function #2.53
+    
+    return(result)
+
 
 """3. Read_text_file opens metadata file and reads acquisition rate """
 def read_text_file(path_to_file, file_name):
@@ -218,8 +594,37 @@ def create_error_log_file(analysis_title, pHs, save_path, save_file_folder_name,
     return (print("we are logging errors"), logger)
 
 
+"""5.4 Min/max decimation for plotting"""
+def min_max_decimate(x_data, y_data, number_of_bins):
+    """
+        This function cuts a trace down to about the number of pixels it will be drawn on before plotting. The data is split into (number_of_bins)
+        equal bins and only the smallest and largest point of each bin are kept (in time order), so the envelope of the trace is drawn the same
+        and no capacitance spike is lost, but a panel of a million points becomes a few thousand. Traces with 2 * (number_of_bins) points or less
+        are returned as they are.
+        
+        1. x_data, numpy array of the x values of the points kept
+        2. y_data, numpy array of the y values of the points kept
+    """
+    x_data = np.asarray(x_data, dtype = np.float64)
+    y_data = np.asarray(y_data, dtype = np.float64)
+    number_of_points = len(y_data)
+    if number_of_points <= 2 * number_of_bins:
+        return(x_data, y_data)
+    
+    bin_length = -(-number_of_points // number_of_bins)
+    bins = np.pad(y_data, (0, bin_length * number_of_bins - number_of_points), mode = 'edge').reshape(number_of_bins, bin_length)
+    bin_starts = np.arange(number_of_bins) * bin_length
+    min_index = np.minimum(bin_starts + np.argmin(bins, axis = 1), number_of_points - 1)
+    max_index = np.minimum(bin_starts + np.argmax(bins, axis = 1), number_of_points - 1)
+    keep = np.column_stack((np.minimum(min_index, max_index), np.maximum(min_index, max_index))).ravel()
+    
+    return(x_data[keep], y_data[keep])
+
+
 """5.5 Plotting raw data"""
-def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition_rate, analysis_title, path_to_save, analysis_folder_name, plots_folder_name, raw_data_plots_folder_name):
+def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition_rate, analysis_title, path_to_save, analysis_folder_name, plots_folder_name, raw_data_plots_folder_name, PLOT_DPI):
+    
+    raw_plot_bins = int(8 * PLOT_DPI)         # about the pixel width of each panel, see function #5.4
     
     # raw data from the start in times 30 seconds to 160 seconds
     
@@ -230,12 +635,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_1_ydata = raw_current[start_1:stop_1]
     xdata_1 = x_data_index_master[start_1:stop_1]
-    plot_1_xdata = [element / acquisition_rate for element in xdata_1]
+    plot_1_xdata = time_axis(xdata_1, acquisition_rate)
     plot_1_V_ydata = raw_voltage[start_1:stop_1]
+    plot_1_V_xdata, plot_1_V_ydata = min_max_decimate(plot_1_xdata, plot_1_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_1_xdata, plot_1_ydata = min_max_decimate(plot_1_xdata, plot_1_ydata, raw_plot_bins)
     
-    avg_cur_1 = round(sum((raw_current[start_1:stop_1])/(stop_1-start_1)),2)
-    stdev_1 = round(st.stdev((raw_current[start_1:stop_1])),2)
-    avg_V_1 = round(sum((raw_voltage[start_1:stop_1])/(stop_1-start_1)),2)
+    cur_mean_1, cur_stdev_1, cur_count_1 = data_stats(raw_current[start_1:stop_1])          # Function #2.46
+    avg_cur_1 = round(cur_mean_1,2)
+    stdev_1 = round(cur_stdev_1,2)
+    avg_V_1 = round(data_stats(raw_voltage[start_1:stop_1])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -255,7 +663,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_1_V_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -272,12 +680,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_2_ydata = raw_current[start_2:stop_2]
     xdata_2 = x_data_index_master[start_2:stop_2]
-    plot_2_xdata = [element / acquisition_rate for element in xdata_2]
+    plot_2_xdata = time_axis(xdata_2, acquisition_rate)
     plot_2_V_ydata = raw_voltage[start_2:stop_2]
+    plot_2_V_xdata, plot_2_V_ydata = min_max_decimate(plot_2_xdata, plot_2_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_2_xdata, plot_2_ydata = min_max_decimate(plot_2_xdata, plot_2_ydata, raw_plot_bins)
     
-    avg_cur_2 = round(sum((raw_current[start_2:stop_2])/(stop_2-start_2)),2)
-    stdev_2 = round(st.stdev((raw_current[start_2:stop_2])),2)
-    avg_V_2 = round(sum((raw_voltage[start_2:stop_2])/(stop_2-start_2)),2)
+    cur_mean_2, cur_stdev_2, cur_count_2 = data_stats(raw_current[start_2:stop_2])          # Function #2.46
+    avg_cur_2 = round(cur_mean_2,2)
+    stdev_2 = round(cur_stdev_2,2)
+    avg_V_2 = round(data_stats(raw_voltage[start_2:stop_2])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -297,7 +708,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_2_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_2_V_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -313,12 +724,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
 
     plot_21_ydata = raw_current[start_21:stop_21]
     xdata_21 = x_data_index_master[start_21:stop_21]
-    plot_21_xdata = [element / acquisition_rate for element in xdata_21]
+    plot_21_xdata = time_axis(xdata_21, acquisition_rate)
     plot_21_V_ydata = raw_voltage[start_21:stop_21]
+    plot_21_V_xdata, plot_21_V_ydata = min_max_decimate(plot_21_xdata, plot_21_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_21_xdata, plot_21_ydata = min_max_decimate(plot_21_xdata, plot_21_ydata, raw_plot_bins)
     
-    avg_cur_21 = round(sum((raw_current[start_21:stop_21])/(stop_21-start_21)),2)
-    stdev_21 = round(st.stdev((raw_current[start_21:stop_21])),2)
-    avg_V_21 = round(sum((raw_voltage[start_21:stop_21])/(stop_21-start_21)),2)
+    cur_mean_21, cur_stdev_21, cur_count_21 = data_stats(raw_current[start_21:stop_21])          # Function #2.46
+    avg_cur_21 = round(cur_mean_21,2)
+    stdev_21 = round(cur_stdev_21,2)
+    avg_V_21 = round(data_stats(raw_voltage[start_21:stop_21])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -338,7 +752,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_21_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_21_V_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -354,12 +768,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_3_ydata = raw_current[start_3:stop_3]
     xdata_3 = x_data_index_master[start_3:stop_3]
-    plot_3_xdata = [element / acquisition_rate for element in xdata_3]
+    plot_3_xdata = time_axis(xdata_3, acquisition_rate)
     plot_3_V_ydata = raw_voltage[start_3:stop_3]
+    plot_3_V_xdata, plot_3_V_ydata = min_max_decimate(plot_3_xdata, plot_3_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_3_xdata, plot_3_ydata = min_max_decimate(plot_3_xdata, plot_3_ydata, raw_plot_bins)
     
-    avg_cur_3 = round(sum((raw_current[start_3:stop_3])/(stop_3-start_3)),2)
-    stdev_3 = round(st.stdev((raw_current[start_3:stop_3])),2)
-    avg_V_3 = round(sum((raw_voltage[start_3:stop_3])/(stop_3-start_3)),2)
+    cur_mean_3, cur_stdev_3, cur_count_3 = data_stats(raw_current[start_3:stop_3])          # Function #2.46
+    avg_cur_3 = round(cur_mean_3,2)
+    stdev_3 = round(cur_stdev_3,2)
+    avg_V_3 = round(data_stats(raw_voltage[start_3:stop_3])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -379,7 +796,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_3_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_3_V_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -395,12 +812,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_1_ydata = raw_current[start_1:stop_1]
     xdata_1 = x_data_index_master[start_1:stop_1]
-    plot_1_xdata = [element / acquisition_rate for element in xdata_1]
+    plot_1_xdata = time_axis(xdata_1, acquisition_rate)
     plot_1_V_ydata = raw_voltage[start_1:stop_1]
+    plot_1_V_xdata, plot_1_V_ydata = min_max_decimate(plot_1_xdata, plot_1_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_1_xdata, plot_1_ydata = min_max_decimate(plot_1_xdata, plot_1_ydata, raw_plot_bins)
     
-    avg_cur_1 = round(sum((raw_current[start_1:stop_1])/(stop_1-start_1)),2)
-    stdev_1 = round(st.stdev((raw_current[start_1:stop_1])),2)
-    avg_V_1 = round(sum((raw_voltage[start_1:stop_1])/(stop_1-start_1)),2)
+    cur_mean_1, cur_stdev_1, cur_count_1 = data_stats(raw_current[start_1:stop_1])          # Function #2.46
+    avg_cur_1 = round(cur_mean_1,2)
+    stdev_1 = round(cur_stdev_1,2)
+    avg_V_1 = round(data_stats(raw_voltage[start_1:stop_1])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -420,7 +840,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_1_V_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -436,12 +856,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_2_ydata = raw_current[start_2:stop_2]
     xdata_2 = x_data_index_master[start_2:stop_2]
-    plot_2_xdata = [element / acquisition_rate for element in xdata_2]
+    plot_2_xdata = time_axis(xdata_2, acquisition_rate)
     plot_2_V_ydata = raw_voltage[start_2:stop_2]
+    plot_2_V_xdata, plot_2_V_ydata = min_max_decimate(plot_2_xdata, plot_2_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_2_xdata, plot_2_ydata = min_max_decimate(plot_2_xdata, plot_2_ydata, raw_plot_bins)
     
-    avg_cur_2 = round(sum((raw_current[start_2:stop_2])/(stop_2-start_2)),2)
-    stdev_2 = round(st.stdev((raw_current[start_2:stop_2])),2)
-    avg_V_2 = round(sum((raw_voltage[start_2:stop_2])/(stop_2-start_2)),2)
+    cur_mean_2, cur_stdev_2, cur_count_2 = data_stats(raw_current[start_2:stop_2])          # Function #2.46
+    avg_cur_2 = round(cur_mean_2,2)
+    stdev_2 = round(cur_stdev_2,2)
+    avg_V_2 = round(data_stats(raw_voltage[start_2:stop_2])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -461,7 +884,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_2_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_2_V_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -477,12 +900,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
 
     plot_21_ydata = raw_current[start_21:stop_21]
     xdata_21 = x_data_index_master[start_21:stop_21]
-    plot_21_xdata = [element / acquisition_rate for element in xdata_21]
+    plot_21_xdata = time_axis(xdata_21, acquisition_rate)
     plot_21_V_ydata = raw_voltage[start_21:stop_21]
+    plot_21_V_xdata, plot_21_V_ydata = min_max_decimate(plot_21_xdata, plot_21_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_21_xdata, plot_21_ydata = min_max_decimate(plot_21_xdata, plot_21_ydata, raw_plot_bins)
     
-    avg_cur_21 = round(sum((raw_current[start_21:stop_21])/(stop_21-start_21)),2)
-    stdev_21 = round(st.stdev((raw_current[start_21:stop_21])),2)
-    avg_V_21 = round(sum((raw_voltage[start_21:stop_21])/(stop_21-start_21)),2)
+    cur_mean_21, cur_stdev_21, cur_count_21 = data_stats(raw_current[start_21:stop_21])          # Function #2.46
+    avg_cur_21 = round(cur_mean_21,2)
+    stdev_21 = round(cur_stdev_21,2)
+    avg_V_21 = round(data_stats(raw_voltage[start_21:stop_21])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -502,7 +928,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_21_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_21_V_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -518,12 +944,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_3_ydata = raw_current[start_3:stop_3]
     xdata_3 = x_data_index_master[start_3:stop_3]
-    plot_3_xdata = [element / acquisition_rate for element in xdata_3]
+    plot_3_xdata = time_axis(xdata_3, acquisition_rate)
     plot_3_V_ydata = raw_voltage[start_3:stop_3]
+    plot_3_V_xdata, plot_3_V_ydata = min_max_decimate(plot_3_xdata, plot_3_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_3_xdata, plot_3_ydata = min_max_decimate(plot_3_xdata, plot_3_ydata, raw_plot_bins)
     
-    avg_cur_3 = round(sum((raw_current[start_3:stop_3])/(stop_3-start_3)),2)
-    stdev_3 = round(st.stdev((raw_current[start_3:stop_3])),2)
-    avg_V_3 = round(sum((raw_voltage[start_3:stop_3])/(stop_3-start_3)),2)
+    cur_mean_3, cur_stdev_3, cur_count_3 = data_stats(raw_current[start_3:stop_3])          # Function #2.46
+    avg_cur_3 = round(cur_mean_3,2)
+    stdev_3 = round(cur_stdev_3,2)
+    avg_V_3 = round(data_stats(raw_voltage[start_3:stop_3])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -543,7 +972,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_3_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_3_V_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -559,12 +988,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_1_ydata = raw_current[start_1:stop_1]
     xdata_1 = x_data_index_master[start_1:stop_1]
-    plot_1_xdata = [element / acquisition_rate for element in xdata_1]
+    plot_1_xdata = time_axis(xdata_1, acquisition_rate)
     plot_1_V_ydata = raw_voltage[start_1:stop_1]
+    plot_1_V_xdata, plot_1_V_ydata = min_max_decimate(plot_1_xdata, plot_1_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_1_xdata, plot_1_ydata = min_max_decimate(plot_1_xdata, plot_1_ydata, raw_plot_bins)
     
-    avg_cur_1 = round(sum((raw_current[start_1:stop_1])/(stop_1-start_1)),2)
-    stdev_1 = round(st.stdev((raw_current[start_1:stop_1])),2)
-    avg_V_1 = round(sum((raw_voltage[start_1:stop_1])/(stop_1-start_1)),2)
+    cur_mean_1, cur_stdev_1, cur_count_1 = data_stats(raw_current[start_1:stop_1])          # Function #2.46
+    avg_cur_1 = round(cur_mean_1,2)
+    stdev_1 = round(cur_stdev_1,2)
+    avg_V_1 = round(data_stats(raw_voltage[start_1:stop_1])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -584,7 +1016,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_1_V_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -600,12 +1032,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_2_ydata = raw_current[start_2:stop_2]
     xdata_2 = x_data_index_master[start_2:stop_2]
-    plot_2_xdata = [element / acquisition_rate for element in xdata_2]
+    plot_2_xdata = time_axis(xdata_2, acquisition_rate)
     plot_2_V_ydata = raw_voltage[start_2:stop_2]
+    plot_2_V_xdata, plot_2_V_ydata = min_max_decimate(plot_2_xdata, plot_2_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_2_xdata, plot_2_ydata = min_max_decimate(plot_2_xdata, plot_2_ydata, raw_plot_bins)
     
-    avg_cur_2 = round(sum((raw_current[start_2:stop_2])/(stop_2-start_2)),2)
-    stdev_2 = round(st.stdev((raw_current[start_2:stop_2])),2)
-    avg_V_2 = round(sum((raw_voltage[start_2:stop_2])/(stop_2-start_2)),2)
+    cur_mean_2, cur_stdev_2, cur_count_2 = data_stats(raw_current[start_2:stop_2])          # Function #2.46
+    avg_cur_2 = round(cur_mean_2,2)
+    stdev_2 = round(cur_stdev_2,2)
+    avg_V_2 = round(data_stats(raw_voltage[start_2:stop_2])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -625,7 +1060,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_2_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_2_V_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -641,12 +1076,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
 
     plot_21_ydata = raw_current[start_21:stop_21]
     xdata_21 = x_data_index_master[start_21:stop_21]
-    plot_21_xdata = [element / acquisition_rate for element in xdata_21]
+    plot_21_xdata = time_axis(xdata_21, acquisition_rate)
     plot_21_V_ydata = raw_voltage[start_21:stop_21]
+    plot_21_V_xdata, plot_21_V_ydata = min_max_decimate(plot_21_xdata, plot_21_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_21_xdata, plot_21_ydata = min_max_decimate(plot_21_xdata, plot_21_ydata, raw_plot_bins)
     
-    avg_cur_21 = round(sum((raw_current[start_21:stop_21])/(stop_21-start_21)),2)
-    stdev_21 = round(st.stdev((raw_current[start_21:stop_21])),2)
-    avg_V_21 = round(sum((raw_voltage[start_21:stop_21])/(stop_21-start_21)),2)
+    cur_mean_21, cur_stdev_21, cur_count_21 = data_stats(raw_current[start_21:stop_21])          # Function #2.46
+    avg_cur_21 = round(cur_mean_21,2)
+    stdev_21 = round(cur_stdev_21,2)
+    avg_V_21 = round(data_stats(raw_voltage[start_21:stop_21])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -666,7 +1104,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_21_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_21_V_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -682,12 +1120,15 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     plot_3_ydata = raw_current[start_3:stop_3]
     xdata_3 = x_data_index_master[start_3:stop_3]
-    plot_3_xdata = [element / acquisition_rate for element in xdata_3]
+    plot_3_xdata = time_axis(xdata_3, acquisition_rate)
     plot_3_V_ydata = raw_voltage[start_3:stop_3]
+    plot_3_V_xdata, plot_3_V_ydata = min_max_decimate(plot_3_xdata, plot_3_V_ydata, raw_plot_bins)        # Function #5.4
+    plot_3_xdata, plot_3_ydata = min_max_decimate(plot_3_xdata, plot_3_ydata, raw_plot_bins)
     
-    avg_cur_3 = round(sum((raw_current[start_3:stop_3])/(stop_3-start_3)),2)
-    stdev_3 = round(st.stdev((raw_current[start_3:stop_3])),2)
-    avg_V_3 = round(sum((raw_voltage[start_3:stop_3])/(stop_3-start_3)),2)
+    cur_mean_3, cur_stdev_3, cur_count_3 = data_stats(raw_current[start_3:stop_3])          # Function #2.46
+    avg_cur_3 = round(cur_mean_3,2)
+    stdev_3 = round(cur_stdev_3,2)
+    avg_V_3 = round(data_stats(raw_voltage[start_3:stop_3])[0],2)          # Function #2.46
     
     fig,ax = plt.subplots(figsize=(8,4))
     
@@ -707,7 +1148,7 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
     
     ax2=ax.twinx()
     
-    ax2.scatter(plot_3_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
+    ax2.scatter(plot_3_V_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
     
     ax2.set_ylim(-100,100)
     
@@ -720,7 +1161,9 @@ def plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition
 
 
 """5.75 Plotting All Important Raw Data on a Single Subplot"""
-def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_master, acquisition_rate, analysis_title, path_to_save, analysis_folder_name, plots_folder_name, raw_data_plots_folder_name):
+def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_master, acquisition_rate, analysis_title, path_to_save, analysis_folder_name, plots_folder_name, raw_data_plots_folder_name, PLOT_DPI):
+    
+    raw_plot_bins = int(22 / 3 * PLOT_DPI)          # about the pixel width of each panel, see function #5.4
     
     # raw data from the start in times 30 seconds to 160 seconds
     
@@ -731,10 +1174,12 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_1_ydata = raw_current[start_1:stop_1]
         xdata_1 = x_data_index_master[start_1:stop_1]
-        plot_1_xdata = [element / acquisition_rate for element in xdata_1]
+        plot_1_xdata = time_axis(xdata_1, acquisition_rate)
         plot_1_V_ydata = raw_voltage[start_1:stop_1]
+        plot_1_V_xdata, plot_1_V_ydata = min_max_decimate(plot_1_xdata, plot_1_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_1_xdata, plot_1_ydata = min_max_decimate(plot_1_xdata, plot_1_ydata, raw_plot_bins)
         
-        avg_cur_1 = round(sum((raw_current[start_1:stop_1])/(stop_1-start_1)),2)
+        avg_cur_1 = round(data_stats(raw_current[start_1:stop_1])[0],2)          # Function #2.46
         
         fig, ax = plt.subplots(4, 3, figsize = (22,12))
         
@@ -751,7 +1196,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax2=ax[0,0].twinx()
         
-        ax2.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
+        ax2.scatter(plot_1_V_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax2.set_ylim(-100,100)
         
@@ -764,12 +1209,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_2_ydata = raw_current[start_2:stop_2]
         xdata_2 = x_data_index_master[start_2:stop_2]
-        plot_2_xdata = [element / acquisition_rate for element in xdata_2]
+        plot_2_xdata = time_axis(xdata_2, acquisition_rate)
         plot_2_V_ydata = raw_voltage[start_2:stop_2]
+        plot_2_V_xdata, plot_2_V_ydata = min_max_decimate(plot_2_xdata, plot_2_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_2_xdata, plot_2_ydata = min_max_decimate(plot_2_xdata, plot_2_ydata, raw_plot_bins)
         
-        avg_cur_2 = round(sum((raw_current[start_2:stop_2])/(stop_2-start_2)),2)
-        stdev_2 = round(st.stdev((raw_current[start_2:stop_2])),2)
-        avg_V_2 = round(sum((raw_voltage[start_2:stop_2])/(stop_2-start_2)),2)
+        cur_mean_2, cur_stdev_2, cur_count_2 = data_stats(raw_current[start_2:stop_2])          # Function #2.46
+        avg_cur_2 = round(cur_mean_2,2)
+        stdev_2 = round(cur_stdev_2,2)
+        avg_V_2 = round(data_stats(raw_voltage[start_2:stop_2])[0],2)          # Function #2.46
         
         ax[1,0].scatter(plot_2_xdata, plot_2_ydata, s=5, alpha=0.75, color = "b")
         
@@ -787,7 +1235,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax3=ax[1,0].twinx()
         
-        ax3.scatter(plot_2_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
+        ax3.scatter(plot_2_V_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax3.set_ylim(-100,100)
         
@@ -800,12 +1248,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
     
         plot_21_ydata = raw_current[start_21:stop_21]
         xdata_21 = x_data_index_master[start_21:stop_21]
-        plot_21_xdata = [element / acquisition_rate for element in xdata_21]
+        plot_21_xdata = time_axis(xdata_21, acquisition_rate)
         plot_21_V_ydata = raw_voltage[start_21:stop_21]
+        plot_21_V_xdata, plot_21_V_ydata = min_max_decimate(plot_21_xdata, plot_21_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_21_xdata, plot_21_ydata = min_max_decimate(plot_21_xdata, plot_21_ydata, raw_plot_bins)
         
-        avg_cur_21 = round(sum((raw_current[start_21:stop_21])/(stop_21-start_21)),2)
-        stdev_21 = round(st.stdev((raw_current[start_21:stop_21])),2)
-        avg_V_21 = round(sum((raw_voltage[start_21:stop_21])/(stop_21-start_21)),2)
+        cur_mean_21, cur_stdev_21, cur_count_21 = data_stats(raw_current[start_21:stop_21])          # Function #2.46
+        avg_cur_21 = round(cur_mean_21,2)
+        stdev_21 = round(cur_stdev_21,2)
+        avg_V_21 = round(data_stats(raw_voltage[start_21:stop_21])[0],2)          # Function #2.46
             
         ax[2,0].scatter(plot_21_xdata, plot_21_ydata, s=5, alpha=0.75, color = "b")
         
@@ -823,7 +1274,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax4=ax[2,0].twinx()
         
-        ax4.scatter(plot_21_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
+        ax4.scatter(plot_21_V_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax4.set_ylim(-100,100)
         
@@ -836,12 +1287,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_3_ydata = raw_current[start_3:stop_3]
         xdata_3 = x_data_index_master[start_3:stop_3]
-        plot_3_xdata = [element / acquisition_rate for element in xdata_3]
+        plot_3_xdata = time_axis(xdata_3, acquisition_rate)
         plot_3_V_ydata = raw_voltage[start_3:stop_3]
+        plot_3_V_xdata, plot_3_V_ydata = min_max_decimate(plot_3_xdata, plot_3_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_3_xdata, plot_3_ydata = min_max_decimate(plot_3_xdata, plot_3_ydata, raw_plot_bins)
         
-        avg_cur_3 = round(sum((raw_current[start_3:stop_3])/(stop_3-start_3)),2)
-        stdev_3 = round(st.stdev((raw_current[start_3:stop_3])),2)
-        avg_V_3 = round(sum((raw_voltage[start_3:stop_3])/(stop_3-start_3)),2)
+        cur_mean_3, cur_stdev_3, cur_count_3 = data_stats(raw_current[start_3:stop_3])          # Function #2.46
+        avg_cur_3 = round(cur_mean_3,2)
+        stdev_3 = round(cur_stdev_3,2)
+        avg_V_3 = round(data_stats(raw_voltage[start_3:stop_3])[0],2)          # Function #2.46
         
         ax[3,0].scatter(plot_3_xdata, plot_3_ydata, s=5, alpha=0.75, color = "b")
         
@@ -859,7 +1313,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax5=ax[3,0].twinx()
         
-        ax5.scatter(plot_3_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
+        ax5.scatter(plot_3_V_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax5.set_ylim(-100,100)
         
@@ -872,10 +1326,12 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_1_ydata = raw_current[start_1:stop_1]
         xdata_1 = x_data_index_master[start_1:stop_1]
-        plot_1_xdata = [element / acquisition_rate for element in xdata_1]
+        plot_1_xdata = time_axis(xdata_1, acquisition_rate)
         plot_1_V_ydata = raw_voltage[start_1:stop_1]
+        plot_1_V_xdata, plot_1_V_ydata = min_max_decimate(plot_1_xdata, plot_1_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_1_xdata, plot_1_ydata = min_max_decimate(plot_1_xdata, plot_1_ydata, raw_plot_bins)
         
-        avg_cur_1 = round(sum((raw_current[start_1:stop_1])/(stop_1-start_1)),2)
+        avg_cur_1 = round(data_stats(raw_current[start_1:stop_1])[0],2)          # Function #2.46
         
         ax[0,1].scatter(plot_1_xdata, plot_1_ydata, s=5, alpha=0.75, color = "b")
         
@@ -893,7 +1349,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax6=ax[0,1].twinx()
         
-        ax6.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
+        ax6.scatter(plot_1_V_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax6.set_ylim(-100,100)
         
@@ -906,12 +1362,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_2_ydata = raw_current[start_2:stop_2]
         xdata_2 = x_data_index_master[start_2:stop_2]
-        plot_2_xdata = [element / acquisition_rate for element in xdata_2]
+        plot_2_xdata = time_axis(xdata_2, acquisition_rate)
         plot_2_V_ydata = raw_voltage[start_2:stop_2]
+        plot_2_V_xdata, plot_2_V_ydata = min_max_decimate(plot_2_xdata, plot_2_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_2_xdata, plot_2_ydata = min_max_decimate(plot_2_xdata, plot_2_ydata, raw_plot_bins)
         
-        avg_cur_2 = round(sum((raw_current[start_2:stop_2])/(stop_2-start_2)),2)
-        stdev_2 = round(st.stdev((raw_current[start_2:stop_2])),2)
-        avg_V_2 = round(sum((raw_voltage[start_2:stop_2])/(stop_2-start_2)),2)
+        cur_mean_2, cur_stdev_2, cur_count_2 = data_stats(raw_current[start_2:stop_2])          # Function #2.46
+        avg_cur_2 = round(cur_mean_2,2)
+        stdev_2 = round(cur_stdev_2,2)
+        avg_V_2 = round(data_stats(raw_voltage[start_2:stop_2])[0],2)          # Function #2.46
             
         ax[1,1].scatter(plot_2_xdata, plot_2_ydata, s=5, alpha=0.75, color = "b")
         
@@ -929,7 +1388,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax7=ax[1,1].twinx()
         
-        ax7.scatter(plot_2_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
+        ax7.scatter(plot_2_V_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax7.set_ylim(-100,100)
         
@@ -942,12 +1401,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
     
         plot_21_ydata = raw_current[start_21:stop_21]
         xdata_21 = x_data_index_master[start_21:stop_21]
-        plot_21_xdata = [element / acquisition_rate for element in xdata_21]
+        plot_21_xdata = time_axis(xdata_21, acquisition_rate)
         plot_21_V_ydata = raw_voltage[start_21:stop_21]
+        plot_21_V_xdata, plot_21_V_ydata = min_max_decimate(plot_21_xdata, plot_21_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_21_xdata, plot_21_ydata = min_max_decimate(plot_21_xdata, plot_21_ydata, raw_plot_bins)
         
-        avg_cur_21 = round(sum((raw_current[start_21:stop_21])/(stop_21-start_21)),2)
-        stdev_21 = round(st.stdev((raw_current[start_21:stop_21])),2)
-        avg_V_21 = round(sum((raw_voltage[start_21:stop_21])/(stop_21-start_21)),2)
+        cur_mean_21, cur_stdev_21, cur_count_21 = data_stats(raw_current[start_21:stop_21])          # Function #2.46
+        avg_cur_21 = round(cur_mean_21,2)
+        stdev_21 = round(cur_stdev_21,2)
+        avg_V_21 = round(data_stats(raw_voltage[start_21:stop_21])[0],2)          # Function #2.46
             
         ax[2,1].scatter(plot_21_xdata, plot_21_ydata, s=5, alpha=0.75, color = "b")
         
@@ -965,7 +1427,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax8=ax[2,1].twinx()
         
-        ax8.scatter(plot_21_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
+        ax8.scatter(plot_21_V_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax8.set_ylim(-100,100)
         
@@ -978,12 +1440,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_3_ydata = raw_current[start_3:stop_3]
         xdata_3 = x_data_index_master[start_3:stop_3]
-        plot_3_xdata = [element / acquisition_rate for element in xdata_3]
+        plot_3_xdata = time_axis(xdata_3, acquisition_rate)
         plot_3_V_ydata = raw_voltage[start_3:stop_3]
+        plot_3_V_xdata, plot_3_V_ydata = min_max_decimate(plot_3_xdata, plot_3_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_3_xdata, plot_3_ydata = min_max_decimate(plot_3_xdata, plot_3_ydata, raw_plot_bins)
         
-        avg_cur_3 = round(sum((raw_current[start_3:stop_3])/(stop_3-start_3)),2)
-        stdev_3 = round(st.stdev((raw_current[start_3:stop_3])),2)
-        avg_V_3 = round(sum((raw_voltage[start_3:stop_3])/(stop_3-start_3)),2)
+        cur_mean_3, cur_stdev_3, cur_count_3 = data_stats(raw_current[start_3:stop_3])          # Function #2.46
+        avg_cur_3 = round(cur_mean_3,2)
+        stdev_3 = round(cur_stdev_3,2)
+        avg_V_3 = round(data_stats(raw_voltage[start_3:stop_3])[0],2)          # Function #2.46
             
         ax[3,1].scatter(plot_3_xdata, plot_3_ydata, s=5, alpha=0.75, color = "b")
         
@@ -1001,7 +1466,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax9=ax[3,1].twinx()
         
-        ax9.scatter(plot_3_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
+        ax9.scatter(plot_3_V_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax9.set_ylim(-100,100)
         
@@ -1014,10 +1479,12 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_1_ydata = raw_current[start_1:stop_1]
         xdata_1 = x_data_index_master[start_1:stop_1]
-        plot_1_xdata = [element / acquisition_rate for element in xdata_1]
+        plot_1_xdata = time_axis(xdata_1, acquisition_rate)
         plot_1_V_ydata = raw_voltage[start_1:stop_1]
+        plot_1_V_xdata, plot_1_V_ydata = min_max_decimate(plot_1_xdata, plot_1_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_1_xdata, plot_1_ydata = min_max_decimate(plot_1_xdata, plot_1_ydata, raw_plot_bins)
         
-        avg_cur_1 = round(sum((raw_current[start_1:stop_1])/(stop_1-start_1)),2)
+        avg_cur_1 = round(data_stats(raw_current[start_1:stop_1])[0],2)          # Function #2.46
         
         ax[0,2].scatter(plot_1_xdata, plot_1_ydata, s=5, alpha=0.75, color = "b")
         
@@ -1032,7 +1499,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax10=ax[0,2].twinx()
         
-        ax10.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
+        ax10.scatter(plot_1_V_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax10.set_ylim(-100,100)
         
@@ -1045,12 +1512,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_2_ydata = raw_current[start_2:stop_2]
         xdata_2 = x_data_index_master[start_2:stop_2]
-        plot_2_xdata = [element / acquisition_rate for element in xdata_2]
+        plot_2_xdata = time_axis(xdata_2, acquisition_rate)
         plot_2_V_ydata = raw_voltage[start_2:stop_2]
+        plot_2_V_xdata, plot_2_V_ydata = min_max_decimate(plot_2_xdata, plot_2_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_2_xdata, plot_2_ydata = min_max_decimate(plot_2_xdata, plot_2_ydata, raw_plot_bins)
         
-        avg_cur_2 = round(sum((raw_current[start_2:stop_2])/(stop_2-start_2)),2)
-        stdev_2 = round(st.stdev((raw_current[start_2:stop_2])),2)
-        avg_V_2 = round(sum((raw_voltage[start_2:stop_2])/(stop_2-start_2)),2)
+        cur_mean_2, cur_stdev_2, cur_count_2 = data_stats(raw_current[start_2:stop_2])          # Function #2.46
+        avg_cur_2 = round(cur_mean_2,2)
+        stdev_2 = round(cur_stdev_2,2)
+        avg_V_2 = round(data_stats(raw_voltage[start_2:stop_2])[0],2)          # Function #2.46
             
         ax[1,2].scatter(plot_2_xdata, plot_2_ydata, s=5, alpha=0.75, color = "b")
         
@@ -1068,7 +1538,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax11=ax[1,2].twinx()
         
-        ax11.scatter(plot_2_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
+        ax11.scatter(plot_2_V_xdata, plot_2_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax11.set_ylim(-100,100)
         
@@ -1081,12 +1551,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
     
         plot_21_ydata = raw_current[start_21:stop_21]
         xdata_21 = x_data_index_master[start_21:stop_21]
-        plot_21_xdata = [element / acquisition_rate for element in xdata_21]
+        plot_21_xdata = time_axis(xdata_21, acquisition_rate)
         plot_21_V_ydata = raw_voltage[start_21:stop_21]
+        plot_21_V_xdata, plot_21_V_ydata = min_max_decimate(plot_21_xdata, plot_21_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_21_xdata, plot_21_ydata = min_max_decimate(plot_21_xdata, plot_21_ydata, raw_plot_bins)
         
-        avg_cur_21 = round(sum((raw_current[start_21:stop_21])/(stop_21-start_21)),2)
-        stdev_21 = round(st.stdev((raw_current[start_21:stop_21])),2)
-        avg_V_21 = round(sum((raw_voltage[start_21:stop_21])/(stop_21-start_21)),2)
+        cur_mean_21, cur_stdev_21, cur_count_21 = data_stats(raw_current[start_21:stop_21])          # Function #2.46
+        avg_cur_21 = round(cur_mean_21,2)
+        stdev_21 = round(cur_stdev_21,2)
+        avg_V_21 = round(data_stats(raw_voltage[start_21:stop_21])[0],2)          # Function #2.46
             
         ax[2,2].scatter(plot_21_xdata, plot_21_ydata, s=5, alpha=0.75, color = "b")
         
@@ -1104,7 +1577,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax12=ax[2,2].twinx()
         
-        ax12.scatter(plot_21_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
+        ax12.scatter(plot_21_V_xdata, plot_21_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax12.set_ylim(-100,100)
         
@@ -1117,12 +1590,15 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         plot_3_ydata = raw_current[start_3:stop_3]
         xdata_3 = x_data_index_master[start_3:stop_3]
-        plot_3_xdata = [element / acquisition_rate for element in xdata_3]
+        plot_3_xdata = time_axis(xdata_3, acquisition_rate)
         plot_3_V_ydata = raw_voltage[start_3:stop_3]
+        plot_3_V_xdata, plot_3_V_ydata = min_max_decimate(plot_3_xdata, plot_3_V_ydata, raw_plot_bins)        # Function #5.4
+        plot_3_xdata, plot_3_ydata = min_max_decimate(plot_3_xdata, plot_3_ydata, raw_plot_bins)
         
-        avg_cur_3 = round(sum((raw_current[start_3:stop_3])/(stop_3-start_3)),2)
-        stdev_3 = round(st.stdev((raw_current[start_3:stop_3])),2)
-        avg_V_3 = round(sum((raw_voltage[start_3:stop_3])/(stop_3-start_3)),2)
+        cur_mean_3, cur_stdev_3, cur_count_3 = data_stats(raw_current[start_3:stop_3])          # Function #2.46
+        avg_cur_3 = round(cur_mean_3,2)
+        stdev_3 = round(cur_stdev_3,2)
+        avg_V_3 = round(data_stats(raw_voltage[start_3:stop_3])[0],2)          # Function #2.46
             
         ax[3,2].scatter(plot_3_xdata, plot_3_ydata, s=5, alpha=0.75, color = "b")
         
@@ -1140,7 +1616,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
         
         ax13=ax[3,2].twinx()
         
-        ax13.scatter(plot_3_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
+        ax13.scatter(plot_3_V_xdata, plot_3_V_ydata, s=2, alpha=0.75, color = "r")
         
         ax13.set_ylim(-100,100)
         
@@ -1157,7 +1633,7 @@ def plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_mast
 
 
 """6. Index when voltages switch"""
-def voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike):
+def voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike, switch_scan_block_size = 65536):
     """
         This function scans through the voltage watching for a change which would indicate a capacitance spike. When there is a change the function 
         saves the index to (current_switch_index) and then jumps a user defined amount of data (dp_after_spike) and comtimues scanning for voltage 
@@ -1168,30 +1644,51 @@ def voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate
         The location for the initial voltage value is set here (initial_v)
         (initial_v) is then updated after every switch detection, the new voltage value is taken at the (dp_after_spike) location.
         
+        The scan is done with numpy in blocks of (switch_scan_block_size) datapoints instead of one datapoint at a time. Each block is compared against
+        the current (initial_v) all at once and the first datapoint outside of the threshold is taken as the switch, so the index's are exactly the
+        same as stepping through the voltage one datapoint at a time.
+
         1. current_switch_index, list of the capacitance spike index's
-    
+
         Updated: BS - 01/11/2022
     """
     initial_v = int(np.mean(raw_voltage[500:1000]))
-    
+
     current_switch_index = []
     loop = len(raw_voltage)
+    block_size = max(int(dp_after_spike), switch_scan_block_size)
     i = 0
     while i < loop:
-        if raw_voltage[i] > initial_v + voltage_switch_threshold or raw_voltage[i] < initial_v - voltage_switch_threshold:
-            current_switch_index.append(i)
-            initial_v = np.mean(raw_voltage[i+(dp_after_spike):i+(dp_after_spike)+500]) #sets the initial to two seconds into the current 
-            i = i + (dp_after_spike) # skips ahead time_after_spike seconds
-        else: i += 1
-    
+        voltage_block = raw_voltage[i:i + block_size]
+        outside_threshold = np.flatnonzero((voltage_block > initial_v + voltage_switch_threshold) | (voltage_block < initial_v - voltage_switch_threshold))
+        if len(outside_threshold) == 0:
+            i = i + len(voltage_block) # no switch in this block, move on to the next one
+            continue
+        i = i + int(outside_threshold[0])
+        current_switch_index.append(i)
+        initial_v = np.mean(raw_voltage[i+(dp_after_spike):i+(dp_after_spike)+500]) #sets the initial to two seconds into the current
+        if np.isnan(initial_v): break # no voltage left after the skip to set a new initial, nothing else can be detected
+        i = i + (dp_after_spike) # skips ahead time_after_spike seconds
+
     return(current_switch_index)
 
 
 """"7. Parse current data into its oscilating states with the current switch index"""
+SWITCH_TABLE_DTYPE = np.dtype([('index', np.int64), ('polarity', 'U4'), ('cap_offset', np.int64), ('cap_length', np.int64), ('cond_index', np.int64), 
+                               ('cond_length', np.int64), ('cond_current_mean', np.float64), ('cond_voltage_mean', np.float64), ('voltage', np.float64)])       # one row per voltage switch
+
 def parse_current_from_v_switchs(current_switch_index, raw_current, raw_voltage, acquisition_rate, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold, cond_datapoints):
     """
         This function takes the (current_switch_index) and the (raw_current) list and parses up the (raw_current) data for each capacitance spike from the (current_switch_index)
-        The function organizes the positive, negative, and zero applied potential capacitance spikes into their respective tuples, along with index tuples
+        Every switch becomes one row of a switch table (SWITCH_TABLE_DTYPE), a numpy structured array with one column per field:
+            index, the voltage switch index
+            polarity, "pos", "neg" or "zero" ("" if the voltage is right on the threshold)
+            cap_offset, cap_length, where the capacitance spike is in (raw_current), raw_current[cap_offset:cap_offset + cap_length] (abs it to get the spike)
+            cond_index, cond_length, where the conductance window is in (raw_current) and (raw_voltage)
+            cond_current_mean, cond_voltage_mean, means of the conductance window, used by function #7.5
+            voltage, mean of the 1000 voltage values after (voltage_sorting)
+        The spike and conductance data are not copied, they are offsets into (raw_current), so the table stays small however long the spikes are.
+        Use switch_table[switch_table['polarity'] == "pos"] (or "neg", "zero") to get one polarity, and function #7.05 to get the spike data as a 2-D array.
         
         (cap_data_backstep) is a user defined value that sets the number of datapoints to backstep from the voltage switch so that the start of the capacitance spikes are fully collected.
         (data_per_cap_spike) is a user defined value that sets the amount of data to hold for each capacitance spike, aka the amount of data that will be fit later on
@@ -1199,277 +1696,442 @@ def parse_current_from_v_switchs(current_switch_index, raw_current, raw_voltage,
         
         * might want to make (voltage_sorting) location a user defined value *
         
-        1. cap_spikes, list of all capacitance spike current values
-        2. pos_caps, list of all capacitance spike current values from positive applied voltages
-        3. pos_caps_index, list of all capacitance spike index values from positive applied voltages
-        4. neg_caps, list of all capacitance spike current values from negative applied voltages
-        5. neg_caps_index, list of all capacitance spike index values from negative applied voltages
-        6. zero_caps, list of all capacitance spike discharge current values from zero applied voltages
-        7. zero_caps_index, list of all capacitance spike discharge index values from zero applied voltages
+        All switches are parsed at once, the window means come from function #7.45 and the polarity of every switch is found with one comparison.
+        Windows that reach past the end of the data are cut short, same as a slice.
+        
+        1. switch_table, numpy structured array (SWITCH_TABLE_DTYPE), one row per voltage switch
         
         Updated: BS - 01/11/2022
         Updated: BS - 02/07/2022 -- added an if statement to break the loop if the (last_index) goes past the length of the (raw_data)
     """
-    cap_spikes = []
-    pos_caps = []
-    pos_caps_index = []
-    zero_caps = []
-    zero_caps_index = []
-    neg_caps = []
-    neg_caps_index = []
-    pos_cond_current = []
-    pos_cond_current_index = []
-    neg_cond_current = []
-    neg_cond_current_index =  []
-    zero_cond_current = []
-    zero_cond_current_index = []
-    pos_cond_master = []
-    neg_cond_master = []
-    zero_cond_master = []
-    all_cond_index = []
-    
-    # global first_index
-    # global last_index
-    
-    for l in range(len(current_switch_index)): # loop through the switch index to separate oscilating current
-        first_int_index = current_switch_index[l] # 
-        first_index = int(first_int_index - cap_data_backstep) # index includes 100 datapints bepore voltage indexed current spike
-        last_index = int(first_int_index + data_per_cap_spike) # last index is one second after voltage switch
-        if last_index > len(raw_voltage): break
-        current_values = raw_current[first_index:last_index]
-        current_values = np.abs(current_values) # this might not work
-        cond_current_values = raw_current[last_index:last_index + cond_datapoints]
-        cond_mean = sum(cond_current_values)/len(cond_current_values)
-        cap_spikes.append(current_values)
-        voltage_sorting = first_int_index + 10        # grabbing a stable voltage (THIS MAY NEED TO BE A USER DEFINED VARIEBLE!?!?!)
-        voltage_temp = raw_voltage[voltage_sorting:voltage_sorting + 1000]
-        voltage = sum(voltage_temp)/len(voltage_temp)
-        if raw_voltage[voltage_sorting] > voltage_switch_threshold:
-            current_values = np.abs(current_values)
-            pos_caps.append(current_values)
-            pos_caps_index.append(first_int_index)
-            pos_cond_current.append(cond_current_values)
-            pos_cond_current_index.append(last_index)
-            pos_cond_master.append((cond_mean, cond_current_values, last_index, voltage))
-        if raw_voltage[voltage_sorting] < -voltage_switch_threshold:
-            current_values = np.abs(current_values)
-            neg_caps.append(current_values)
-            neg_caps_index.append(first_int_index)
-            neg_cond_current.append(cond_current_values)
-            neg_cond_current_index.append(last_index)
-            neg_cond_master.append((cond_mean, cond_current_values, last_index, voltage))
-        if raw_voltage[voltage_sorting] > -voltage_switch_threshold and raw_voltage[voltage_sorting]< voltage_switch_threshold:
-            current_values = np.abs(current_values)
-            zero_caps.append(current_values)
-            zero_caps_index.append(first_int_index)
-            zero_cond_current.append(cond_current_values)
-            zero_cond_current_index.append(last_index)
-            zero_cond_master.append((cond_mean, cond_current_values, last_index, voltage))
-        all_cond_index.append(last_index)
-    
-    return(cap_spikes, pos_caps, pos_caps_index, neg_caps, neg_caps_index, zero_caps, zero_caps_index, all_cond_index, pos_cond_master, neg_cond_master, zero_cond_master)
+    current_switch_index = np.asarray(current_switch_index, dtype = np.int64)
+    first_indexs = (current_switch_index - cap_data_backstep).astype(np.int64)     # index includes 100 datapints bepore voltage indexed current spike
+    last_indexs = (current_switch_index + data_per_cap_spike).astype(np.int64)      # last index is one second after voltage switch
+    
+    in_data = np.flatnonzero(last_indexs > len(raw_voltage))      # stop at the first switch whose spike runs past the end of the data
+    number_of_switches = in_data[0] if len(in_data) else len(current_switch_index)
+    
+    switch_table = np.zeros(number_of_switches, dtype = SWITCH_TABLE_DTYPE)
+    switch_table['index'] = current_switch_index[:number_of_switches]
+    switch_table['cap_offset'] = first_indexs[:number_of_switches]
+    switch_table['cap_length'] = last_indexs[:number_of_switches] - first_indexs[:number_of_switches]
+    switch_table['cond_index'] = last_indexs[:number_of_switches]
+    switch_table['cond_length'] = np.minimum(switch_table['cond_index'] + int(cond_datapoints), len(raw_current)) - switch_table['cond_index']
+    switch_table['cond_current_mean'] = window_means(raw_current, switch_table['cond_index'], cond_datapoints)       # Function #7.45
+    switch_table['cond_voltage_mean'] = window_means(raw_voltage, switch_table['cond_index'], cond_datapoints)
+    
+    voltage_sorting = switch_table['index'] + 10        # grabbing a stable voltage (THIS MAY NEED TO BE A USER DEFINED VARIEBLE!?!?!)
+    switch_table['voltage'] = window_means(raw_voltage, voltage_sorting, 1000)
+    sorting_voltage = np.asarray(raw_voltage[voltage_sorting], dtype = np.float64)
+    switch_table['polarity'][sorting_voltage > voltage_switch_threshold] = "pos"
+    switch_table['polarity'][sorting_voltage < -voltage_switch_threshold] = "neg"
+    switch_table['polarity'][(sorting_voltage > -voltage_switch_threshold) & (sorting_voltage < voltage_switch_threshold)] = "zero"
+    
+    return(switch_table)
+
+
+def switch_table_index(switch_table, polarity):
+    """
+        1. index's of the voltage switches of one (polarity) ("pos", "neg" or "zero") in the switch table of function #7
+    """
+    return(switch_table['index'][switch_table['polarity'] == polarity])
+
+
+"""7.05 Gather windows"""
+def gather_windows(raw_data, first_indexs, window_length):
+    """
+        This function collects the windows raw_data[first_index:first_index + window_length] for every index in (first_indexs) into one 2-D float64 array
+        (one row per window). Windows that are fully inside the data are taken from a strided view of (raw_data) (np.lib.stride_tricks.sliding_window_view)
+        with one fancy index, so there is no python loop over the windows. Values outside the data are NaN.
+        Function #9.12 gets the data of a block of capacitance spikes with it.
+        
+        1. windows, 2-D numpy array (len(first_indexs), window_length)
+    """
+    window_length = int(window_length)
+    first_indexs = np.asarray(first_indexs, dtype = np.int64)
+    windows = np.full((len(first_indexs), window_length), np.nan)
+    if window_length == 0 or len(first_indexs) == 0:
+        return(windows)
+    
+    inside = (first_indexs >= 0) & (first_indexs + window_length <= len(raw_data))
+    if np.any(inside) and window_length <= len(raw_data):
+        windows[inside] = np.lib.stride_tricks.sliding_window_view(raw_data, window_length)[first_indexs[inside]]
+    for i in np.flatnonzero(~inside):
+        data_start = max(first_indexs[i], 0)
+        data_stop = min(first_indexs[i] + window_length, len(raw_data))
+        if data_stop > data_start:
+            windows[i, data_start - first_indexs[i]:data_stop - first_indexs[i]] = raw_data[data_start:data_stop]
+    
+    return(windows)
+
+
+"""7.1 Parse the current around a single voltage switch"""
+def parse_one_switch(first_int_index, raw_current, raw_voltage, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold, cond_datapoints):
+    """
+        This function collects everything function #7 needs from one voltage switch (first_int_index). It is used by function #7 and by the
+        streaming functions (#7.6) so that both give the same values. Slices are converted to native byte order, so (raw_current) and (raw_voltage)
+        can be memory mapped fields (function #2.1).
+
+        1. polarity, "pos", "neg" or "zero" from the voltage 10 datapoints after the switch (None if it is right on the threshold)
+        2. first_int_index, the voltage switch index
+        3. current_values, absolute value of the capacitance spike current (from (cap_data_backstep) before the switch to (data_per_cap_spike) after it)
+        4. cond_mean, mean of the conductance current
+        5. cond_current_values, (cond_datapoints) of current right after the capacitance spike
+        6. last_index, index of the first conductance current value
+        7. voltage, mean of the 1000 voltage values after (voltage_sorting)
+        8. cond_point, (index, current mean, voltage mean) of the conductance data, used by function #7.5 for the conductance fits
+    """
+    first_index = int(first_int_index - cap_data_backstep) # index includes 100 datapints bepore voltage indexed current spike
+    last_index = int(first_int_index + data_per_cap_spike) # last index is one second after voltage switch
+    current_values = np.abs(np.asarray(raw_current[first_index:last_index], dtype = np.float64))
+    cond_current_values = np.asarray(raw_current[last_index:last_index + cond_datapoints], dtype = np.float64)
+    cond_mean = np.mean(cond_current_values)
+    cond_voltage_values = np.asarray(raw_voltage[last_index:last_index + cond_datapoints], dtype = np.float64)
+    cond_voltage_mean = np.mean(cond_voltage_values)
+    cond_point = (last_index + cond_datapoints, cond_mean, cond_voltage_mean)
+    voltage_sorting = first_int_index + 10        # grabbing a stable voltage (THIS MAY NEED TO BE A USER DEFINED VARIEBLE!?!?!)
+    voltage_temp = np.asarray(raw_voltage[voltage_sorting:voltage_sorting + 1000], dtype = np.float64)
+    voltage = np.mean(voltage_temp)
+    polarity = None
+    if voltage_temp[0] > voltage_switch_threshold:
+        polarity = "pos"
+    if voltage_temp[0] < -voltage_switch_threshold:
+        polarity = "neg"
+    if voltage_temp[0] > -voltage_switch_threshold and voltage_temp[0] < voltage_switch_threshold:
+        polarity = "zero"
+    
+    return(polarity, first_int_index, current_values, cond_mean, cond_current_values, last_index, voltage, cond_point)
 
 
 """7.25 Plotting All Applied Voltage and Current"""
-def plotting_all_applied_voltage_and_current(pos_caps_index, neg_caps_index, zero_caps_index, raw_current, raw_voltage, acquisition_rate, pos_time, neg_time, zero_time, analysis_title, path_to_save, analysis_folder_name, plots_folder_name, raw_data_plots_folder_name):
-    
+def plotting_all_applied_voltage_and_current(pos_caps_index, neg_caps_index, zero_caps_index, raw_current, raw_voltage, acquisition_rate, pos_time, neg_time, zero_time, analysis_title, path_to_save, analysis_folder_name, plots_folder_name, raw_data_plots_folder_name, PLOT_DPI, number_of_plot_workers = 1, render_plots = True):
+    """
+        This function plots and saves the current and voltage of every zero, positive and negative voltage window, one plot per window.
+        Each window is a plot job for function #24.3, which renders them with a reused figure (function #24), across (number_of_plot_workers) processes.
+        With (render_plots) = False nothing is plotted.
+    """
+    x_data_index_master = sample_index(raw_current)
+    
+    def plot_jobs():
+        for label, file_label, caps_index, window_time in [("Zero", "zero", zero_caps_index, zero_time), ("Pos", "pos", pos_caps_index, pos_time), ("Neg", "neg", neg_caps_index, neg_time)]:
+            window_first_indexs = np.asarray(caps_index, dtype = np.int64) + acquisition_rate
+            window_length = window_time*acquisition_rate - acquisition_rate
+            cur_means, cur_stdevs, cur_counts = window_stats(raw_current, window_first_indexs, window_length)          # Function #2.47
+            V_means, V_stdevs, V_counts = window_stats(raw_voltage, window_first_indexs, window_length)                # Function #2.47
+            
+            for i in range(len(caps_index)):
+                
+                start_1 = caps_index[i]
+                stop_1 = start_1 + (window_time*acquisition_rate)
+                
+                plot_1_ydata = raw_current[start_1:stop_1]
+                xdata_1 = x_data_index_master[start_1:stop_1]
+                plot_1_xdata = time_axis(xdata_1, acquisition_rate)
+                plot_1_V_ydata = raw_voltage[start_1:stop_1]
+                time = int(plot_1_xdata[0])
+                
+                # the first second after the switch is left out, the current sum is still divided by the whole window as before
+                avg_cur_1 = round(cur_means[i]*cur_counts[i]/(stop_1-start_1),2)
+                stdev_1 = round(cur_stdevs[i],2)
+                avg_V_1 = round(V_means[i]*V_counts[i]/(stop_1-(start_1+acquisition_rate)),2)
+                
+                max_y_val = avg_cur_1+500
+                min_y_val = avg_cur_1-500
+                
+                payload = {'x': plot_1_xdata, 'current': np.asarray(plot_1_ydata, dtype = np.float64), 'voltage': np.asarray(plot_1_V_ydata, dtype = np.float64), 'ylim': (min_y_val, max_y_val), 
+                           'title': f" {label} Voltage at {time}sec\n {analysis_title} ", 
+                           'text': f" Average Current = {avg_cur_1} pA\n Current STDEV = {stdev_1} pA\n Applied Voltage = {avg_V_1} mV"}
+                
+                yield ('voltage_window', payload, os.path.join(path_to_save, analysis_folder_name[0], plots_folder_name[0], raw_data_plots_folder_name[0], f"{file_label}_raw_data_at_{time}_seconds"))
+    
+    render_plot_jobs(plot_jobs(), PLOT_DPI, number_of_plot_workers, render_plots)         # Function #24.3
     
-    for i in range(len(zero_caps_index)):
-        
-        start_1 = zero_caps_index[i]
-        stop_1 = start_1 + (zero_time*acquisition_rate)
-        
-        plot_1_ydata = raw_current[start_1:stop_1]
-        xdata_1 = x_data_index_master[start_1:stop_1]
-        plot_1_xdata = [element / acquisition_rate for element in xdata_1]
-        plot_1_V_ydata = raw_voltage[start_1:stop_1]
-        time = int(plot_1_xdata[0])
+    return()
+
+
+"""7.5 Conductance calculations"""
+def conductance_calculation(switch_table, cond_datapoints, time_steps, conductance_plot_data, result_cache = None):
+    """
+        The conductance of each voltage cycle is found from the conductance window means in the switch table of function #7 (function #7.51) and
+        is broken into time chunks (function #7.52). With a (result_cache) from function #2.5 the per-cycle conductance is loaded from the cache
+        when it has already been found for the same switch table.
         
-        avg_cur_1 = round(sum((raw_current[(start_1+acquisition_rate):stop_1])/(stop_1-start_1)),2)
-        stdev_1 = round(st.stdev((raw_current[(start_1+acquisition_rate):stop_1])),2)
-        avg_V_1 = round(sum((raw_voltage[(start_1+acquisition_rate):stop_1])/(stop_1-(start_1+acquisition_rate))),2)
+        1. time_chunks, conductance time chunks of this file (function #7.52)
+        2. end_cond, conductance values from the end of this file
+    """
+    last_indexs = (switch_table['cond_index'] + cond_datapoints).tolist()
+    data_for_cond_calc = list(zip(last_indexs, switch_table['cond_current_mean'].tolist(), switch_table['cond_voltage_mean'].tolist()))     # conductance window means from function #7
     
-        fig,ax = plt.subplots(figsize=(8,4))
-        
-        ax.scatter(plot_1_xdata, plot_1_ydata, s=5, alpha=0.75, color = "b")
-        
-        max_y_val = avg_cur_1+500
-        min_y_val = avg_cur_1-500
+    slope = cached_stage(result_cache, "conductance_slopes", (switch_table, cond_datapoints), conductance_slopes, data_for_cond_calc)     # Function #7.51 (through function #2.54)
+    time_chunks, end_cond = conductance_time_chunks(slope, time_steps, conductance_plot_data)       # Function #7.52
+    
+    return(time_chunks, end_cond)
+
+
+"""7.45 Window means"""
+def window_means(raw_data, first_indexs, window_length):
+    """
+        This function finds the mean of (raw_data) in every window [first_index, first_index + window_length) with one np.add.reduceat call, in place of
+        a python sum() over each window. The window starts and ends are interleaved ([s0, e0, s1, e1, ...]) so every other reduceat sum is a window sum.
+        Windows that run past the end of (raw_data) are cut short, like a slice would be.
         
-        ax.set_ylim(min_y_val,max_y_val)
+        1. means, numpy array with the mean of each window
+    """
+    window_length = int(window_length)
+    first_indexs = np.asarray(first_indexs, dtype = np.int64)
+    window_ends = np.minimum(first_indexs + window_length, len(raw_data))
+    means = np.full(len(first_indexs), np.nan)
+    
+    inside = (first_indexs < window_ends) & (window_ends < len(raw_data))      # reduceat can not take an index equal to len(raw_data)
+    if np.any(inside):
+        window_edges = np.empty(2*np.count_nonzero(inside), dtype = np.int64)
+        window_edges[0::2] = first_indexs[inside]
+        window_edges[1::2] = window_ends[inside]
+        window_sums = np.add.reduceat(raw_data, window_edges, dtype = np.float64)[0::2]
+        means[inside] = window_sums / (window_ends[inside] - first_indexs[inside])
+    for i in np.flatnonzero(~inside & (first_indexs < window_ends)):
+        means[i] = np.mean(raw_data[first_indexs[i]:window_ends[i]], dtype = np.float64)
+    
+    return(means)
+
+
+"""7.51 Conductance from each voltage cycle"""
+def conductance_slopes(data_for_cond_calc):
+    """
+        This function fits a line to the (voltage mean, current mean) of every 4 conductance windows (one voltage cycle). The slope of each line is the 
+        conductance of that voltage cycle. All the cycles are fit at once with the closed form least squares slope, sum((x - x_mean)*(y - y_mean)) / sum((x - x_mean)**2),
+        which is the slope scipy.stats.linregress gives. A cycle where all 4 voltages are the same has no slope (NaN).
+        The last group of 4 is only used when there is at least one more window after it, same as before.
         
-        ax.set_title(f" Zero Voltage at {time}sec\n {analysis_title} ", size=12, weight='bold') #Title
-        ax.set_xlabel('Seconds')
-        ax.set_ylabel('Current (pA)')
+        (data_for_cond_calc) is a list of (index, current mean, voltage mean) for each conductance window, from function #7.5 or #7.1
         
-        anchored_text = AnchoredText(f" Average Current = {avg_cur_1} pA\n Current STDEV = {stdev_1} pA\n Applied Voltage = {avg_V_1} mV", loc=9)
-        ax.add_artist(anchored_text)
+        1. slope, list of the conductance of each voltage cycle
+    """
+    number_of_cycles = max(0, (len(data_for_cond_calc) - 1)//4)
+    if number_of_cycles == 0:
+        return([])
+    
+    cond_data = np.asarray(data_for_cond_calc[:number_of_cycles*4], dtype = np.float64)
+    x_fit_data = cond_data[:, 2].reshape(number_of_cycles, 4)
+    y_fit_data = cond_data[:, 1].reshape(number_of_cycles, 4)
+    
+    x_centered = x_fit_data - x_fit_data.mean(axis = 1, keepdims = True)
+    y_centered = y_fit_data - y_fit_data.mean(axis = 1, keepdims = True)
+    x_x = np.sum(x_centered * x_centered, axis = 1)
+    x_y = np.sum(x_centered * y_centered, axis = 1)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        slope = np.where(x_x > 0, x_y / x_x, np.nan)
+    
+    return(slope.tolist())
+
+
+"""7.52 Chunk conductance into time steps"""
+def conductance_time_chunks(slope, time_steps, conductance_plot_data):
+    """
+        This function breaks the conductance of each voltage cycle (slope) into (time_steps) chunks for the global trend plots, and takes the
+        last (conductance_plot_data) cycles for the final conductance vs pH plot.
         
-        ax2=ax.twinx()
+        1. time_chunks, list of (slope) chunks
+        2. end_cond, list of the conductance values from the end of the run
+    """
+    def chunks(lst, n):
+        """Yield successive n-sized chunks from lst."""
+        for i in range(0, len(lst), n):
+            yield lst[i:i + n]
+    global chunk_size        
+    chunk_size = (int(len(slope)/time_steps))
+    if chunk_size == 1: 
+        chunk_size = 2
+    time_chunks = list(chunks(slope, chunk_size))
+    end_temp = len(slope) - conductance_plot_data
+    end_cond = list(slope[end_temp:-1])
+
+    return(time_chunks, end_cond)
+
+
+"""7.6 Streaming switch detection state"""
+def new_switch_state(raw_voltage):
+    """
+        This function starts the switch detection state that the streaming functions (#7.61) carry from one block of data to the next.
+        The first (initial_v) is taken the same way as function #6 (mean of datapoints 500 to 1000).
+
+        1. switch_state, dictionary with the scan 'position', the current 'initial_v', and 'done' (True once nothing else can be detected)
+    """
+    initial_v = int(np.mean(np.asarray(raw_voltage[500:1000], dtype = np.float64)))
+    switch_state = {'position': 0, 'initial_v': initial_v, 'done': False}
+
+    return(switch_state)
+
+
+"""7.61 Streaming switch detection and parsing"""
+def advance_switch_windows(raw_current, raw_voltage, switch_state, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, block_size, final = True):
+    """
+        This function does function #6 and function #7 together, one block of (block_size) datapoints at a time, and yields each voltage switch as
+        it is found. (raw_current) and (raw_voltage) should be memory mapped fields (function #2.1), only the block being scanned and the windows
+        around each switch (which can run past the end of the block) are read into RAM, so the memory used does not depend on the length of the recording.
+
+        (switch_state) from function #7.6 is updated as the data is scanned, so the scan can be continued later on the same or on a longer file.
+        (final) = False is for files that are still being written: a switch is only yielded once all of the data it needs is in the file, and
+        the scan stops there until there is more data.
+
+        The switches and the values yielded are identical to functions #6 and #7 on the whole file.
+
+        yields the tuple from function #7.1 for every switch:
+            (polarity, first_int_index, current_values, cond_mean, cond_current_values, last_index, voltage, cond_point)
+    """
+    loop = len(raw_voltage)
+    i = switch_state['position']
+    initial_v = switch_state['initial_v']
+    block_size = max(int(dp_after_spike), block_size)
+    while not switch_state['done'] and i < loop:
+        voltage_block = np.asarray(raw_voltage[i:i + block_size], dtype = np.float64)
+        outside_threshold = np.flatnonzero((voltage_block > initial_v + voltage_switch_threshold) | (voltage_block < initial_v - voltage_switch_threshold))
+        if len(outside_threshold) == 0:
+            i = i + len(voltage_block)
+            switch_state['position'] = i
+            continue
+        switch = i + int(outside_threshold[0])
+        last_index = int(switch + data_per_cap_spike)
+        data_needed = max(switch + dp_after_spike + 500, last_index + cond_datapoints, switch + 10 + 1000)
+        if not final and data_needed > loop:
+            switch_state['position'] = switch # come back to this switch when there is more data
+            return
+        if last_index > loop: # same as the break in function #7
+            switch_state['done'] = True
+            return
+
+        yield parse_one_switch(switch, raw_current, raw_voltage, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold, cond_datapoints)     # Function #7.1
+
+        initial_v = np.mean(np.asarray(raw_voltage[switch+(dp_after_spike):switch+(dp_after_spike)+500], dtype = np.float64))
+        i = switch + (dp_after_spike)
+        switch_state['initial_v'] = initial_v
+        switch_state['position'] = i
+        if np.isnan(initial_v):
+            switch_state['done'] = True
+
+    if final:
+        switch_state['done'] = True
+
+
+"""7.62 Streaming a .bin file"""
+def stream_switch_windows(path_to_file, file_name, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, block_size = 1048576):
+    """
+        This function memory maps the .bin file (function #2.1) and yields every voltage switch with its capacitance spike and conductance windows
+        (function #7.61) without loading the recording.
+
+        yields (polarity, first_int_index, current_values, cond_mean, cond_current_values, last_index, voltage, cond_point) for every switch
+    """
+    raw_data = open_bin_data_memmap(path_to_file, file_name)
+    raw_current = raw_data['current']
+    raw_voltage = raw_data['voltage']
+    switch_state = new_switch_state(raw_voltage)
+
+    yield from advance_switch_windows(raw_current, raw_voltage, switch_state, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, block_size)
+
+
+"""7.63 Streaming conductance"""
+def stream_conductance(switch_windows):
+    """
+        This function takes the switches from function #7.61 or #7.62 as they come and yields the conductance of each voltage cycle as soon as it
+        can be calculated. Only the last 5 conductance points are held, the slopes are the same as function #7.51 on the full list.
+
+        yields the conductance (slope) of each voltage cycle
+    """
+    cond_points = []
+    for switch_window in switch_windows:
+        cond_points.append(switch_window[7])
+        if len(cond_points) == 5:
+            yield conductance_slopes(cond_points)[0]       # Function #7.51
+            cond_points = cond_points[4:]
+
+
+"""7.64 Streaming conductance calculations"""
+def streaming_conductance_calculation(path_to_file, file_name, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, time_steps, conductance_plot_data, block_size = 1048576):
+    """
+        This function is the streaming version of functions #6, #7 and #7.5. The .bin file is read in blocks (function #7.62) and the conductance is
+        calculated as the file is read (function #7.63), so the whole recording is never held in RAM. The capacitance spike windows are not kept,
+        only their index's.
+
+        1. time_chunks, same as function #7.5
+        2. end_cond, same as function #7.5
+        3. pos_caps_index, index's of the positive voltage switches
+        4. neg_caps_index, index's of the negative voltage switches
+        5. zero_caps_index, index's of the zero voltage switches
+    """
+    pos_caps_index = []
+    neg_caps_index = []
+    zero_caps_index = []
+
+    def sort_switch_index(switch_windows):
+        for switch_window in switch_windows:
+            if switch_window[0] == "pos":
+                pos_caps_index.append(switch_window[1])
+            if switch_window[0] == "neg":
+                neg_caps_index.append(switch_window[1])
+            if switch_window[0] == "zero":
+                zero_caps_index.append(switch_window[1])
+            yield switch_window
+
+    switch_windows = stream_switch_windows(path_to_file, file_name, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, block_size)        # Function #7.62
+    slope = list(stream_conductance(sort_switch_index(switch_windows)))        # Function #7.63
+    time_chunks, end_cond = conductance_time_chunks(slope, time_steps, conductance_plot_data)       # Function #7.52
+
+    return(time_chunks, end_cond, pos_caps_index, neg_caps_index, zero_caps_index)
+
+
+"""7.65 Following a .bin file while it is being written"""
+def follow_bin_file(path_to_file, file_name, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, acquisition_rate, poll_seconds = 1, idle_seconds = 60, block_size = 1048576):
+    """
+        This function follows a .bin file that the LabView program is still writing and yields the conductance of each voltage cycle as soon as the
+        data for it has been written. Every (poll_seconds) the file is checked, if it grew it is memory mapped again (function #2.1, a partly written
+        last sample is left off) and only the new data is scanned: the switch detection state (function #7.6) and the last conductance points are kept
+        from one poll to the next, so nothing is scanned twice.
         
-        ax2.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
+        Once the file has not grown for (idle_seconds) the run is taken to be over, the end of the file is scanned the same way function #7.64 does,
+        and the function returns. The conductance values are the same as function #7.64 on the finished file.
         
-        ax2.set_ylim(-100,100)
+        yields (seconds, conductance) for every voltage cycle, seconds is the time of the last conductance window of the cycle
+    """
+    bin_file_path = os.path.join(path_to_file, file_name + ".bin")
+    switch_state = None
+    cond_points = []
+    file_size = -1
+    last_growth = time.monotonic()
+    final = False
+    
+    while True:
+        new_file_size = os.path.getsize(bin_file_path) if os.path.exists(bin_file_path) else 0
+        if new_file_size != file_size:
+            file_size = new_file_size
+            last_growth = time.monotonic()
+        elif time.monotonic() - last_growth > idle_seconds:
+            final = True
+        
+        if file_size >= 1000 * BIN_SAMPLE_DTYPE.itemsize:
+            raw_data = open_bin_data_memmap(path_to_file, file_name)        # Function #2.1
+            if switch_state is None:
+                switch_state = new_switch_state(raw_data['voltage'])        # Function #7.6
+            for switch_window in advance_switch_windows(raw_data['current'], raw_data['voltage'], switch_state, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, block_size, final):        # Function #7.61
+                cond_points.append(switch_window[7])
+                if len(cond_points) == 5:
+                    yield (cond_points[-1][0] / acquisition_rate, conductance_slopes(cond_points)[0])       # Function #7.51
+                    cond_points = cond_points[4:]
+            del raw_data
+        
+        if final or (switch_state is not None and switch_state['done']):
+            return
+        time.sleep(poll_seconds)
+
+
+"""7.75 Plotting global conductance vs time vs pH trends"""
+def plotting_global_conductance_trends(cond_time_chunks_master, pHs, time_steps_in_minutes_for_legends, total_voltage_cycle_time, longest_run, path_to_save, analysis_folder_name, plots_folder_name, global_conductance_trends_folder, PLOT_DPI):
+    """
+            
         
-        ax2.set_ylabel('Voltage (mV)', color = "r")
-    
-        
-        plt.savefig(os.path.join(path_to_save, analysis_folder_name[0], plots_folder_name[0], raw_data_plots_folder_name[0], f"zero_raw_data_at_{time}_seconds"), dpi = PLOT_DPI, bbox_inches = 'tight')
-        plt.close()
-    
-    for i in range(len(pos_caps_index)):
-        
-        start_1 = pos_caps_index[i]
-        stop_1 = start_1 + (pos_time*acquisition_rate)
-        
-        plot_1_ydata = raw_current[start_1:stop_1]
-        xdata_1 = x_data_index_master[start_1:stop_1]
-        plot_1_xdata = [element / acquisition_rate for element in xdata_1]
-        plot_1_V_ydata = raw_voltage[start_1:stop_1]
-        time = int(plot_1_xdata[0])
-        
-        avg_cur_1 = round(sum((raw_current[(start_1+acquisition_rate):stop_1])/(stop_1-start_1)),2)
-        stdev_1 = round(st.stdev((raw_current[(start_1+acquisition_rate):stop_1])),2)
-        avg_V_1 = round(sum((raw_voltage[(start_1+acquisition_rate):stop_1])/(stop_1-(start_1+acquisition_rate))),2)
-    
-        fig,ax = plt.subplots(figsize=(8,4))
-        
-        ax.scatter(plot_1_xdata, plot_1_ydata, s=5, alpha=0.75, color = "b")
-        
-        max_y_val = avg_cur_1+500
-        min_y_val = avg_cur_1-500
-        
-        ax.set_ylim(min_y_val,max_y_val)
-        
-        ax.set_title(f" Pos Voltage at {time}sec\n {analysis_title} ", size=12, weight='bold') #Title
-        ax.set_xlabel('Seconds')
-        ax.set_ylabel('Current (pA)')
-        
-        anchored_text = AnchoredText(f" Average Current = {avg_cur_1} pA\n Current STDEV = {stdev_1} pA\n Applied Voltage = {avg_V_1} mV", loc=9)
-        ax.add_artist(anchored_text)
-        
-        ax2=ax.twinx()
-        
-        ax2.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
-        
-        ax2.set_ylim(-100,100)
-        
-        ax2.set_ylabel('Voltage (mV)', color = "r")
-    
-        
-        plt.savefig(os.path.join(path_to_save, analysis_folder_name[0], plots_folder_name[0], raw_data_plots_folder_name[0], f"pos_raw_data_at_{time}_seconds"), dpi = PLOT_DPI, bbox_inches = 'tight')
-        plt.close()
-    
-    for i in range(len(neg_caps_index)):
-        
-        start_1 = neg_caps_index[i]
-        stop_1 = start_1 + (neg_time*acquisition_rate)
-        
-        plot_1_ydata = raw_current[start_1:stop_1]
-        xdata_1 = x_data_index_master[start_1:stop_1]
-        plot_1_xdata = [element / acquisition_rate for element in xdata_1]
-        plot_1_V_ydata = raw_voltage[start_1:stop_1]
-        time = int(plot_1_xdata[0])
-        
-        avg_cur_1 = round(sum((raw_current[(start_1+acquisition_rate):stop_1])/(stop_1-start_1)),2)
-        stdev_1 = round(st.stdev((raw_current[(start_1+acquisition_rate):stop_1])),2)
-        avg_V_1 = round(sum((raw_voltage[(start_1+acquisition_rate):stop_1])/(stop_1-(start_1+acquisition_rate))),2)
-    
-        fig,ax = plt.subplots(figsize=(8,4))
-        
-        ax.scatter(plot_1_xdata, plot_1_ydata, s=5, alpha=0.75, color = "b")
-        
-        max_y_val = avg_cur_1+500
-        min_y_val = avg_cur_1-500
-        
-        ax.set_ylim(min_y_val,max_y_val)
-        
-        ax.set_title(f" Neg Voltage at {time}sec\n {analysis_title} ", size=12, weight='bold') #Title
-        ax.set_xlabel('Seconds')
-        ax.set_ylabel('Current (pA)')
-        
-        anchored_text = AnchoredText(f" Average Current = {avg_cur_1} pA\n Current STDEV = {stdev_1} pA\n Applied Voltage = {avg_V_1} mV", loc=9)
-        ax.add_artist(anchored_text)
-        
-        ax2=ax.twinx()
-        
-        ax2.scatter(plot_1_xdata, plot_1_V_ydata, s=2, alpha=0.75, color = "r")
-        
-        ax2.set_ylim(-100,100)
-        
-        ax2.set_ylabel('Voltage (mV)', color = "r")
-    
-        
-        plt.savefig(os.path.join(path_to_save, analysis_folder_name[0], plots_folder_name[0], raw_data_plots_folder_name[0], f"neg_raw_data_at_{time}_seconds"), dpi = PLOT_DPI, bbox_inches = 'tight')
-        plt.close()
-    
-    return()
-
-
-"""7.5 Conductance calculations"""
-def conductance_calculation(all_cond_index, pos_cond_master, neg_cond_master, zero_cond_master, raw_current, raw_voltage, cond_datapoints, time_steps, conductance_plot_data):
-    
-    global data_for_cond_calc_master
-    data_for_cond_calc_master = []
-    data_for_cond_calc = []
-    
-    for i in range(len(all_cond_index)):
-        first_index = all_cond_index[i]
-        last_index = first_index + cond_datapoints
-        current_values = raw_current[first_index:last_index]
-        current_mean = sum(current_values)/len(current_values)
-        voltage_values = raw_voltage[first_index:last_index]
-        voltage_mean = sum(voltage_values)/len(voltage_values)
-        data_for_cond_calc.append((last_index, current_mean, voltage_mean))
-    
-    data_for_cond_calc_master.append(data_for_cond_calc)
-    
-    slope = []
-    k = 0
-    
-    while (k+4) < len(data_for_cond_calc):
-        data_master_temp_1 = data_for_cond_calc[k]
-        data_master_temp_2 = data_for_cond_calc[k+1]
-        data_master_temp_3 = data_for_cond_calc[k+2]
-        data_master_temp_4 = data_for_cond_calc[k+3]
-        k = k + 4
-        #global x_fit_data
-        x_fit_data = [data_master_temp_1[2], data_master_temp_2[2], data_master_temp_3[2], data_master_temp_4[2]]
-        #global y_fit_data
-        y_fit_data = [data_master_temp_1[1], data_master_temp_2[1], data_master_temp_3[1], data_master_temp_4[1]]
-        
-        #global fit_data
-        fit_data = scipy.stats.linregress(x_fit_data, y_fit_data, alternative='two-sided')
-        # scipy.stats.linregress information = https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.linregress.html
-        
-        slope.append(fit_data[0])
-    
-    def chunks(lst, n):
-        """Yield successive n-sized chunks from lst."""
-        for i in range(0, len(lst), n):
-            yield lst[i:i + n]
-    global chunk_size        
-    chunk_size = (int(len(slope)/time_steps))
-    if chunk_size == 1: 
-        chunk_size = 2
-    time_chunks = list(chunks(slope, chunk_size))
-    cond_time_chunks_master.append(time_chunks)
-    end_temp = len(slope) - conductance_plot_data
-    end_cond = list(slope[end_temp:-1])
-    end_cond_master.append(end_cond)
-    
-    return(cond_time_chunks_master, end_cond_master)
-
-
-"""7.75 Plotting global conductance vs time vs pH trends"""
-def plotting_global_conductance_trends(cond_time_chunks_master, pHs, time_steps_in_minutes_for_legends, total_voltage_cycle_time, longest_run, path_to_save, analysis_folder_name, plots_folder_name, global_conductance_trends_folder, PLOT_DPI):
-    """
-            
-        
-        Updated: BS 02/21/2022 - reformatted to use loops so that the plotting can handle any number of pHs and any time parsing
-    """
-    # global data_master
-    data_master = []
+        Updated: BS 02/21/2022 - reformatted to use loops so that the plotting can handle any number of pHs and any time parsing
+    """
+    # global data_master
+    data_master = []
     
     for i in range(len(cond_time_chunks_master)):       # loop through the pHs with (i)
         data_temp = cond_time_chunks_master[i]
@@ -1480,8 +2142,7 @@ def plotting_global_conductance_trends(cond_time_chunks_master, pHs, time_steps_
             elif len(data_temp[n]) < 1:
                 data_packet_temp.append([0,0]) 
                 continue
-            data_chunk_mean_temp = (sum(data_temp[n])/len(data_temp[n]))
-            data_chunk_stdev_temp = st.stdev(data_temp[n])
+            data_chunk_mean_temp, data_chunk_stdev_temp, data_chunk_count_temp = data_stats(data_temp[n])          # Function #2.46
             data_packet_temp.append([data_chunk_mean_temp, data_chunk_stdev_temp])
         data_master.append(data_packet_temp)
     
@@ -1735,8 +2396,7 @@ def plotting_the_final_G_v_pH(pHs, end_cond_master, path_to_save, analysis_folde
     
     for i in range(len(end_cond_master)):
         data_temp = end_cond_master[i]
-        data_mean_temp = (sum(data_temp)/len(data_temp))
-        data_stdev_temp = st.stdev(data_temp)
+        data_mean_temp, data_stdev_temp, data_count_temp = data_stats(data_temp)          # Function #2.46
         data_mean.append(data_mean_temp)
         data_stdev.append(data_stdev_temp)
         
@@ -1759,15 +2419,16 @@ def plotting_the_final_G_v_pH(pHs, end_cond_master, path_to_save, analysis_folde
 
 
 """8. Fitting Capacitance Spikes with lmfit double exponential"""
-def fitting_cap_spikes_w_lmfit_double_exp(pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, time_steps, data_per_cap_spike):
+def fitting_cap_spikes_w_lmfit_double_exp(pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, time_steps, data_per_cap_spike, number_of_fit_workers = 1, fit_chunk_size = 64, fit_backend = 'lmfit', warm_start = False, keep_fit_curves = True, result_cache = None):
     """
         This function takes the capacitance spike index's (pos_cap_index, neg_caps_index) and fits the eponential like decay with a DOUBLE exponential equation using the open source lmfit funtion.
         (lmfit DOI: 10.5281/zenodo.5570790)
         
         The fit parameters, variables, and a log of each fit performace are saved. Several other parameters and variables are also saved. 
         
-        1. lmfit_parameters, cpntains a tuple of lists that contain all the fit determined variables for each fit (pos_fast_tau, pos_fast_ab, pos_slow_tau, pos_slow_ab, neg_fast_tau, neg_fast_ab, neg_slow_tau, neg_slow_ab, pos_intercept, neg_intercept)
-        2. lmfit_cap_varieables, contains a tuple that stores the fit determined variables along with an index and other values that anayze the fit performance (a, k1, b, k2, c, lmfit_y_data, fitting_x_data, cap_index, cap_data, fit_one, fit_two, timing_index)
+        1. lmfit_parameters, cpntains a tuple of arrays that contain all the fit determined variables for each fit (pos_fast_tau, pos_fast_ab, pos_slow_tau, pos_slow_ab, neg_fast_tau, neg_fast_ab, neg_slow_tau, neg_slow_ab, pos_intercept, neg_intercept)
+        2. lmfit_cap_varieables, (spike_table, fit_curves) from function #8.5, one table row per spike with the fit determined variables, index, polarity and fit residual, 
+            the fit curves are in one flat buffer (use function #8.55 to get the data, fit and x values of one spike)
         3. double_lmfit_log_master, contains a list of the fit performance log
         4. lmfit_cap_varieables_master, contains #3 but for all files (master for ALL double lmfit fits) 
         5. lmfit_double_exp_10min_windows_master, chops the experiment time into 6 sections, then finds the average of each parameter in each section so that the analysis can be broken up and displayed in 10 minute chuncks
@@ -1775,342 +2436,756 @@ def fitting_cap_spikes_w_lmfit_double_exp(pos_caps_index, neg_caps_index, raw_cu
             * might want to make the number of section that the data is broken up into a used defined value *
         6. ratios, list of calculated ratios between fit parameter values (pos_tau_ratio, pos_ab_ratio, neg_tau_ratio, neg_ab_ratio)
         
+        The larger of k1 and k2 is stored as the fast tau (with its scalar), same as before, now picked for all spikes at once from the spike table columns.
+        
+        With (number_of_fit_workers) greater than 1 the spike fits are done by function #8.3, in chunks of (fit_chunk_size) spikes across a pool of processes.
+        The fit results are the same, only the time it takes changes.
+        (fit_backend) picks the fitting routine, 'lmfit' or 'scipy' (see function #8.1).
+        With (warm_start) on, each fit starts from the last converged fit of the same polarity (see function #8.15).
+        The total number of function evaluations and the fitting time are printed, function #9.2 compares them with and without warm starts.
+        With (keep_fit_curves) = False only the fit determined variables and index's are kept, the fit curves are remade by function #8.55 when plotted.
+        With a (result_cache) from function #2.5 the fits are loaded from the cache when the same spikes were fit with the same settings before.
+        
         Updated: BS - 01/11/2022
         Updated: BS - 02/09/2022 - added the user defined value for the number of time chuncks the fitting variables are parsed into (time_steps)
         Updated: BS - 02/21/2022 - reduced the lines of code when parsing for the last X minute plotting with a loop to make the variable. Same variable, new creation method
     """
-    def monoExp(x, m, k, h):
-        return m * np.exp(-(x * (1/k))) + h
-    
-    def _2exponential(x, a, k1, b, k2, c):
-        return a * np.exp(-(x * (1/k1))) + b * np.exp(-(x * (1/k2))) + c
-    
-    def power_fitting_lmfit(params,x,y):
-        a = params['a']
-        k1 = params['k1']
-        b = params['b']
-        k2 = params['k2']
-        c = params['c']
-        y_fit = a * np.exp(-(x * (1/k1))) + b * np.exp(-(x * (1/k2))) + c
-        return y_fit-y
+    params = double_exp_fit_parameters()
     
-    params = Parameters()
+    pos_cap_index_neg_cap_index = np.concatenate((np.asarray(pos_caps_index, dtype = np.int64), np.asarray(neg_caps_index, dtype = np.int64)))
+    cap_data_first_indexs = (pos_cap_index_neg_cap_index + fit_offset).tolist()
+    polarities = ['pos']*len(pos_caps_index) + ['neg']*len(neg_caps_index)
     
-    params.add('a', value = 14000, vary = True, min= 1.0, max= 40000)
-    params.add('k1', value = 20, vary = True, min= 1.0, max= 1000)
-    params.add('b', value = 10000, vary = True, min= 1.0, max= 40000)
-    params.add('k2', value = 40, vary = True, min= 1.0, max= 1000)
-    params.add('c', value = 400, vary = True, min= 1.0, max= 5000)
+    fit_start_time = time.perf_counter()
+    fit_inputs = (np.asarray(cap_data_first_indexs, dtype = np.int64), polarities, data_per_cap_spike, fit_backend, warm_start)
+    if number_of_fit_workers > 1:
+        fitted_values = cached_stage(result_cache, "double_exp_fits_with_residual_norm", fit_inputs, fit_cap_spikes_double_exp_parallel, raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, params, number_of_fit_workers, fit_chunk_size, fit_backend, warm_start)       # Function #8.3 (through function #2.54)
+    else:
+        fitted_values = cached_stage(result_cache, "double_exp_fits_with_residual_norm", fit_inputs, fit_cap_spike_series_double_exp, raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, params, fit_backend, warm_start)       # Function #8.15 (through function #2.54)
+    print(f"double exp fits: {len(fitted_values)} spikes, {sum([fitted[6] for fitted in fitted_values])} function evals, {time.perf_counter() - fit_start_time:.2f} s (warm start = {warm_start})")
     
-    pos_cap_index_neg_cap_index = []
-    lmfit_cap_varieables = []
     double_lmfit_log_master = []
-    fast_tau = []
-    slow_tau = []
-    fast_ab = []
-    slow_ab = []
-    intercept = []
-    
-    pos_cap_index_neg_cap_index.extend(pos_caps_index)
-    pos_cap_index_neg_cap_index.extend(neg_caps_index)
-    
-    for o in range(len(pos_cap_index_neg_cap_index)):
-        cap_index = pos_cap_index_neg_cap_index[o]
-        cap_data_first_index = cap_index + fit_offset
-        cap_data_last_index = cap_data_first_index + data_per_cap_spike       # should this be aquisition_rate or the user defined value of how much to fit?
-        cap_data = abs(raw_current[cap_data_first_index:cap_data_last_index])
-        timing_index = x_data_index_master[cap_data_first_index:cap_data_last_index]
-        fitting_x_data = np.linspace(0, len(cap_data), num = len(cap_data), endpoint = True)
-    
-        fitted_params = minimize(power_fitting_lmfit, params, args=(fitting_x_data,cap_data), method='least_squares')
+    for o in range(len(fitted_values)):
         # logging.warning(f'error in lmfit double exp fit # {o}, run #{count}')
-        
-        a = fitted_params.params['a'].value
-        k1 = fitted_params.params['k1'].value
-        b = fitted_params.params['b'].value
-        k2 = fitted_params.params['k2'].value
-        c = fitted_params.params['c'].value
-        
-        fit_log = fit_report(fitted_params)
         double_lmfit_log_master.append(f"double lmfit number {o}")
-        double_lmfit_log_master.append(fit_log)
-        
-        lmfit_y_data = _2exponential(fitting_x_data, a, k1, b, k2, c)
-        fit_one = monoExp(fitting_x_data, a, k1, c)
-        fit_two = monoExp(fitting_x_data, b, k2, c)
-        
-        if k1 > k2:
-            fast_tau.append(k1)
-            fast_ab.append(a)
-            slow_ab.append(b)
-            slow_tau.append(k2)
-        if k2 > k1:
-            fast_tau.append(k2)
-            fast_ab.append(b)
-            slow_ab.append(a)
-            slow_tau.append(k1)
-        
-        intercept.append(c)
-        
-        lmfit_cap_var_temp = [a, k1, b, k2, c, lmfit_y_data, fitting_x_data, cap_index, cap_data, fit_one, fit_two, timing_index]
-        lmfit_cap_varieables.append(lmfit_cap_var_temp)
+        double_lmfit_log_master.append(fitted_values[o][5])
     
-    # double fit data manipulation
-    len_of_pos_caps = len(pos_caps_index)
+    spike_table, fit_curves = make_spike_table(raw_current, pos_cap_index_neg_cap_index, polarities, cap_data_first_indexs, data_per_cap_spike, fitted_values, DOUBLE_EXP_SPIKE_DTYPE, keep_fit_curves)        # Function #8.5
     
-    pos_fast_tau = fast_tau[0:len_of_pos_caps]   
-    pos_fast_ab = fast_ab[0:len_of_pos_caps]   
-    pos_slow_tau = slow_tau[0:len_of_pos_caps]   
-    pos_slow_ab = slow_ab[0:len_of_pos_caps]   
-    pos_intercept = intercept[0:len_of_pos_caps]
+    # double fit data manipulation
+    pos = spike_table['polarity'] == "pos"
+    neg = spike_table['polarity'] == "neg"
+    
+    pos_fast_tau = spike_table['fast_tau'][pos]
+    pos_fast_ab = spike_table['fast_ab'][pos]
+    pos_slow_tau = spike_table['slow_tau'][pos]
+    pos_slow_ab = spike_table['slow_ab'][pos]
+    pos_intercept = spike_table['c'][pos]
     # pos_data_packet = [pos_fast_tau, pos_slow_tau]
     
-    pos_tau_ratio = []
-    pos_ab_ratio = []
-    pos_tau_ratio = [i / j for i, j in zip(pos_fast_tau, pos_slow_tau)]
-    pos_ab_ratio = [i / j for i, j in zip(pos_fast_ab, pos_slow_ab)]
-    
-    neg_fast_tau = fast_tau[len_of_pos_caps:]   
-    neg_fast_ab = fast_ab[len_of_pos_caps:]   
-    neg_slow_tau = slow_tau[len_of_pos_caps:]   
-    neg_slow_ab = slow_ab[len_of_pos_caps:] 
-    neg_intercept = intercept[len_of_pos_caps:] 
+    neg_fast_tau = spike_table['fast_tau'][neg]
+    neg_fast_ab = spike_table['fast_ab'][neg]
+    neg_slow_tau = spike_table['slow_tau'][neg]
+    neg_slow_ab = spike_table['slow_ab'][neg]
+    neg_intercept = spike_table['c'][neg]
     global tau_data_packet
     tau_data_packet = [pos_fast_tau, pos_slow_tau, neg_fast_tau, neg_slow_tau]
     
-    neg_tau_ratio = []
-    neg_ab_ratio = []
-    neg_tau_ratio = [i / j for i, j in zip(neg_fast_tau, neg_slow_tau)]
-    neg_ab_ratio = [i / j for i, j in zip(neg_fast_ab, neg_slow_ab)]
+    ratios = [pos_fast_tau / pos_slow_tau, pos_fast_ab / pos_slow_ab, neg_fast_tau / neg_slow_tau, neg_fast_ab / neg_slow_ab]
     
-    ratios = []
-    ratios = [pos_tau_ratio, pos_ab_ratio, neg_tau_ratio, neg_ab_ratio]
-    
-    lmfit_double_exp_10min_windows_temp = []
-    i = 0
-    n = time_steps
-    for i in range(len(tau_data_packet)):
-        temp_data = tau_data_packet[i]
-        double_fit_temp = []
-        double_fit_chunks = np.array_split(temp_data, n)
-        for t in range(len(double_fit_chunks)):
-            current_date = double_fit_chunks[t]
-            if len(current_date) == 1: 
-                mean = current_date[0]
-                stdev = 0
-                double_fit_temp.append([current_date, mean, stdev])
-                continue
-            mean = sum(current_date)/len(current_date)
-            stdev = st.stdev(current_date)
-            double_fit_temp.append([current_date, mean, stdev])
-        lmfit_double_exp_10min_windows_temp.append(double_fit_temp)
-        
+    lmfit_double_exp_10min_windows_temp = [time_chunk_stats(temp_data, time_steps) for temp_data in tau_data_packet]        # Function #8.6
     lmfit_double_exp_10min_windows_master.append(lmfit_double_exp_10min_windows_temp)
     
     lmfit_params_temp = [pos_fast_tau, pos_fast_ab, pos_slow_tau, pos_slow_ab, neg_fast_tau, neg_fast_ab, neg_slow_tau, neg_slow_ab, pos_intercept, neg_intercept]
     lmfit_parameters.append(lmfit_params_temp)
     
+    lmfit_cap_varieables = (spike_table, fit_curves)
     lmfit_cap_varieables_master.append(lmfit_cap_varieables)
         
     return(lmfit_parameters, lmfit_cap_varieables, double_lmfit_log_master, lmfit_cap_varieables_master, lmfit_double_exp_10min_windows_master, ratios)
 
 
-"""9. Fitting Capacitance Spikes with lmfit single exponential"""
-def fitting_cap_spikes_w_lmfit_single_exp(pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, time_steps):
+"""8.05 Double exponential model and starting parameters"""
+def double_exp_residual(params, x, y):
+    a = params['a']
+    k1 = params['k1']
+    b = params['b']
+    k2 = params['k2']
+    c = params['c']
+    y_fit = a * np.exp(-(x * (1/k1))) + b * np.exp(-(x * (1/k2))) + c
+    return y_fit-y
+
+def double_exp_fit_parameters():
     """
-        This function takes the capacitance spike index's (pos_cap_index, neg_caps_index) and fits the eponential like decay with a SINGLE exponential equation using the open source lmfit funtion.
-        (lmfit DOI: 10.5281/zenodo.5570790)
-        
-        The fit parameters, variables, and a log of each fit performace are saved. Several other parameters and variables are also saved. 
-        
-        1. lmfit_single_exp_fit_parameters, contains a tuple of lists that contain all the fit determined variables for each fit (pos_m, pos_k, pos_h, neg_m, neg_k, neg_h)
-        2. lmfit_single_exp_fit_cap_varieables, contains a tuple that stores the fit determined variables along with an index and other values that anayze the fit performance (m, k, h, lmfit_y_data, fitting_x_data, cap_index, cap_data, timing_index)
-        3. lmfit_single_exp_fit_log_master, contains a list of the fit performance log
-        4. lmfit_single_exp_fit_cap_varieables_master, contains #3 but for all files (master for ALL double lmfit fits) 
-        5. lmfit_single_exp_10min_windows_master, chops the experiment time into 6 sections, then finds the average of each parameter in each section so that the analysis can be broken up and displayed in 10 minute chuncks
-            (pos_single_fit_tau_chunk_master, neg_single_fit_tau_chunk_master)    
-            * might want to make the number of section that the data is broken up into a used defined value *
+        Starting values and limits for the double exponential fits (function #8). These are made at the top level (not inside function #8) so the 
+        worker processes of function #8.3 can use them.
         
-        Updated: BS - 01/11/2022
-        Updated: BS - 02/09/2022 - added the user defined value for the number of time chuncks the fitting variables are parsed into (time_steps)
+        1. params, lmfit Parameters (a, k1, b, k2, c)
     """
-    def monoExp(x, m, k, h):
-        return m * np.exp(-(x * (1/k))) + h
-    
-    def power_fitting_lmfit(params,x,y):
-        m = params['m']
-        k = params['k']
-        h = params['h']
-        y_fit = m * np.exp(-(x * (1/k))) + h
-        return y_fit-y
-    
     params = Parameters()
     
-    params.add('m', value = 20000, vary = True, min= 1.0, max= 40000)
-    params.add('k', value = 40, vary = True, min= 1.0, max= 5000)
-    params.add('h', value = 400, vary = True, min= 1.0, max= 5000)
-    pos_cap_index_neg_cap_index = []
-    lmfit_single_exp_fit_cap_varieables = []
-    lmfit_single_exp_fit_log_master = []
-    # global m_data
-    m_data = []
-    
-    k_data = []
-    intercept = []
-    
-    pos_cap_index_neg_cap_index.extend(pos_caps_index)
-    pos_cap_index_neg_cap_index.extend(neg_caps_index)
+    params.add('a', value = 14000, vary = True, min= 1.0, max= 40000)
+    params.add('k1', value = 20, vary = True, min= 1.0, max= 1000)
+    params.add('b', value = 10000, vary = True, min= 1.0, max= 40000)
+    params.add('k2', value = 40, vary = True, min= 1.0, max= 1000)
+    params.add('c', value = 400, vary = True, min= 1.0, max= 5000)
     
-    for o in range(len(pos_cap_index_neg_cap_index)):
-        cap_index = pos_cap_index_neg_cap_index[o]
-        cap_data_first_index = cap_index + fit_offset
-        cap_data_last_index = cap_data_first_index + acquisition_rate
-        cap_data = abs(raw_current[cap_data_first_index:cap_data_last_index])
-        timing_index = x_data_index_master[cap_data_first_index:cap_data_last_index]
-        fitting_x_data = np.linspace(0, len(cap_data), num = len(cap_data), endpoint = True)
-        
-        fitted_params = minimize(power_fitting_lmfit, params, args=(fitting_x_data,cap_data,), method='least_squares')
-        # logging.warning(f'error in lmfit single exp fit # {o}, run #{i}')
+    return(params)
+
+
+"""8.06 Double exponential model for scipy, with its analytic Jacobian"""
+def double_exp_residual_scipy(fit_values, x, y):
+    a, k1, b, k2, c = fit_values
+    return a * np.exp(-(x * (1/k1))) + b * np.exp(-(x * (1/k2))) + c - y
+
+def double_exp_jacobian_scipy(fit_values, x, y):
+    """
+        Partial derivatives of a*exp(-x/k1) + b*exp(-x/k2) + c with respect to (a, k1, b, k2, c), one column per variable.
+        Given to scipy.optimize.least_squares so it does not have to estimate them with extra function evaluations.
+    """
+    a, k1, b, k2, c = fit_values
+    exp_one = np.exp(-(x * (1/k1)))
+    exp_two = np.exp(-(x * (1/k2)))
+    jacobian = np.empty((len(x), 5))
+    jacobian[:, 0] = exp_one
+    jacobian[:, 1] = a * exp_one * x / (k1**2)
+    jacobian[:, 2] = exp_two
+    jacobian[:, 3] = b * exp_two * x / (k2**2)
+    jacobian[:, 4] = 1.0
+    return jacobian
+
+
+"""8.1 Double exponential fit of one capacitance spike"""
+def fit_one_cap_spike_double_exp(cap_data, params, fit_backend = 'lmfit'):
+    """
+        Fits one capacitance spike (cap_data, already abs) with the double exponential of function #8.05.
         
-        m = fitted_params.params['m'].value
-        k = fitted_params.params['k'].value
-        h = fitted_params.params['h'].value
+        fit_backend = 'lmfit', fit with lmfit.minimize (method = 'least_squares') like it has always been done.
+        fit_backend = 'scipy', call scipy.optimize.least_squares directly with the same starting values and limits (from params) and the analytic 
+            Jacobian of function #8.06. No lmfit Parameters lookups per evaluation and no numerical derivatives, so it is faster. The fit log is a
+            short summary in place of the full lmfit fit report.
         
-        fit_log = fit_report(fitted_params)
-        lmfit_single_exp_fit_log_master.append(f"single mlfit number {o}")
-        lmfit_single_exp_fit_log_master.append(fit_log)
+        1. (a, k1, b, k2, c, fit_log, nfev, success), fit determined variables, the fit report, number of function evaluations and if the fit converged
+    """
+    fitting_x_data = np.linspace(0, len(cap_data), num = len(cap_data), endpoint = True)
+    
+    if fit_backend == 'scipy':
+        names = ('a', 'k1', 'b', 'k2', 'c')
+        starting_values = [params[name].value for name in names]
+        lower_limits = [params[name].min for name in names]
+        upper_limits = [params[name].max for name in names]
+        cap_data = np.asarray(cap_data, dtype = np.float64)
+        fitted = least_squares(double_exp_residual_scipy, starting_values, jac = double_exp_jacobian_scipy, bounds = (lower_limits, upper_limits), args = (fitting_x_data, cap_data))
+        a, k1, b, k2, c = fitted.x
+        fit_log = (f"[[Fit Statistics]]\n    # fitting method   = least_squares (scipy, analytic Jacobian)\n    # function evals   = {fitted.nfev}\n"
+                   f"    # data points      = {len(cap_data)}\n    # variables        = 5\n    chi-square         = {2*fitted.cost}\n    success            = {fitted.success}\n"
+                   f"[[Variables]]\n" + "".join([f"    {name}: {value}\n" for name, value in zip(names, fitted.x)]))
+        return(a, k1, b, k2, c, fit_log, fitted.nfev, fitted.success)
+    
+    fitted_params = minimize(double_exp_residual, params, args=(fitting_x_data,cap_data), method='least_squares')
+    
+    a = fitted_params.params['a'].value
+    k1 = fitted_params.params['k1'].value
+    b = fitted_params.params['b'].value
+    k2 = fitted_params.params['k2'].value
+    c = fitted_params.params['c'].value
+    fit_log = fit_report(fitted_params)
+    
+    return(a, k1, b, k2, c, fit_log, fitted_params.nfev, fitted_params.success)
+
+
+"""8.12 Warm start parameters"""
+def warm_start_parameters(params, previous_fit):
+    """
+        Makes a copy of the starting parameters (params) with the starting values replaced by the values of a previous fit (previous_fit, dict of 
+        name: value). The values are kept inside the limits of (params). Works for the single and double exponential parameters.
         
-        lmfit_y_data = monoExp(fitting_x_data, m, k, h)
+        1. warm_params, lmfit Parameters
+    """
+    warm_params = params.copy()
+    for name, value in previous_fit.items():
+        warm_params[name].value = min(max(value, warm_params[name].min), warm_params[name].max)
+    return(warm_params)
+
+FIT_TIME_CONSTANT_NAMES = ('k1', 'k2', 'k')      # the taus of the double and single exponential fits
+
+def fit_diverged(fit_values, params, success):
+    """
+        A fit is called diverged when the solver did not converge (success), a value is not a finite number, or a time constant (FIT_TIME_CONSTANT_NAMES)
+        ended up on one of its limits in (params). The scalars and intercepts are not checked against their limits, a good fit can settle on one
+        (c or h at its minimum when the current decays to about 0). A diverged fit is not used to start the next fit.
         
-        m_data.append(m)
-        k_data.append(k)
-        intercept.append(h)
+        1. True/False
+    """
+    for name, value in zip(params.keys(), fit_values):
+        if not np.isfinite(value):
+            return(True)
+        if name in FIT_TIME_CONSTANT_NAMES and (np.isclose(value, params[name].min) or np.isclose(value, params[name].max)):
+            return(True)
+    return(not success)
+
+
+"""8.15 Double exponential fits of a series of capacitance spikes"""
+def fit_cap_spike_series_double_exp(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, params, fit_backend = 'lmfit', warm_start = False):
+    """
+        Fits the spikes that start at (cap_data_first_indexs) one after the other with function #8.1.
         
-        lmfit_cap_var_temp = [m, k, h, lmfit_y_data, fitting_x_data, cap_index, cap_data, timing_index]
-        lmfit_single_exp_fit_cap_varieables.append(lmfit_cap_var_temp)
-    
-    
-    len_of_pos_caps = len(pos_caps_index)
-    # len_of_neg_caps = len(neg_caps_index)
-    
-    pos_m = m_data[0:len_of_pos_caps]   
-    pos_k = k_data[0:len_of_pos_caps]   
-    pos_h = intercept[0:len_of_pos_caps]   
-    
-    neg_m = m_data[len_of_pos_caps:]   
-    neg_k = k_data[len_of_pos_caps:]   
-    neg_h = intercept[len_of_pos_caps:]   
-    
-    lmfit_params_temp = [pos_m, pos_k, pos_h, neg_m, neg_k, neg_h]
-    lmfit_single_exp_fit_parameters.append(lmfit_params_temp)
-    
-    n = time_steps       # might want to make this a user defined variable
-    pos_single_fit_tau_chunk_master = []
-    single_fit_tau_temp_temp = []
-    pos_single_fit_tau_chuncks = np.array_split(pos_k, n)
-    for t in range(len(pos_single_fit_tau_chuncks)):
-        current_date = pos_single_fit_tau_chuncks[t]
-        if len(current_date) == 1: 
-            mean = current_date[0]
-            stdev = 0
-            single_fit_tau_temp = [current_date, mean, stdev]
-            single_fit_tau_temp_temp.append(single_fit_tau_temp)
-            continue
-        mean = sum(current_date)/len(current_date)
-        stdev = st.stdev(current_date)
-        single_fit_tau_temp = [current_date, mean, stdev]
-        single_fit_tau_temp_temp.append(single_fit_tau_temp)
-    pos_single_fit_tau_chunk_master.append(single_fit_tau_temp_temp)
-    
-    neg_single_fit_tau_chunk_master = []
-    single_fit_tau_temp_temp = []
-    neg_single_fit_tau_chuncks = np.array_split(neg_k, n)
-    for t in range(len(neg_single_fit_tau_chuncks)):
-        current_date = neg_single_fit_tau_chuncks[t]
-        if len(current_date) == 1: 
-            mean = current_date[0]
-            stdev = 0
-            single_fit_tau_temp = [current_date, mean, stdev]
-            single_fit_tau_temp_temp.append(single_fit_tau_temp)
-            continue
-        mean = sum(current_date)/len(current_date)
-        stdev = st.stdev(current_date)
-        single_fit_tau_temp = [current_date, mean, stdev]
-        single_fit_tau_temp_temp.append(single_fit_tau_temp)
-    neg_single_fit_tau_chunk_master.append(single_fit_tau_temp_temp)
-    
-    lmfit_single_exp_10min_windows_temp = [pos_single_fit_tau_chunk_master, neg_single_fit_tau_chunk_master]
-    lmfit_single_exp_10min_windows_master.append(lmfit_single_exp_10min_windows_temp)
-    
-    lmfit_single_exp_fit_cap_varieables_master.append(lmfit_single_exp_fit_cap_varieables)
+        With (warm_start) on, each fit starts from the converged values of the last fit with the same polarity ('pos'/'neg' from (polarities)),
+        spikes of one polarity decay almost the same way so the solver needs fewer iterations. When a warm started fit diverges (function #8.12)
+        the spike is fit again from the default starting values in (params). The function evaluations of both tries are counted.
+        The residual norm of each fit (function #8.57) is found here while the spike data is at hand, so it is kept even when the fit curves are not.
         
-    return(lmfit_single_exp_fit_parameters, lmfit_single_exp_fit_cap_varieables, lmfit_single_exp_fit_log_master, lmfit_single_exp_fit_cap_varieables_master, lmfit_single_exp_10min_windows_master)
+        1. fitted_values, list of (a, k1, b, k2, c, fit_log, nfev, success, residual_norm) in the same order as (cap_data_first_indexs)
+    """
+    fitted_values = []
+    previous_fit = {}
+    for first_index, polarity in zip(cap_data_first_indexs, polarities):
+        cap_data = np.abs(raw_current[first_index:first_index + data_per_cap_spike])
+        if warm_start and polarity in previous_fit:
+            fitted = fit_one_cap_spike_double_exp(cap_data, warm_start_parameters(params, previous_fit[polarity]), fit_backend)       # Function #8.1
+            if fit_diverged(fitted[:5], params, fitted[7]):
+                warm_nfev = fitted[6]
+                fitted = fit_one_cap_spike_double_exp(cap_data, params, fit_backend)
+                fitted = fitted[:6] + (fitted[6] + warm_nfev, fitted[7])
+        else:
+            fitted = fit_one_cap_spike_double_exp(cap_data, params, fit_backend)
+        
+        if warm_start and not fit_diverged(fitted[:5], params, fitted[7]):
+            previous_fit[polarity] = dict(zip(params.keys(), fitted[:5]))
+        fitted_values.append(fitted + (fit_residual_norm(dict(zip(params.keys(), fitted[:5])), cap_data),))       # Function #8.57
+    
+    return(fitted_values)
 
 
-"""10. Ploting lmfit Single Exp fit Cap Spikes and lmfits Fits"""
-def plotting_lmfit_single_exp_caps_and_fits(lmfit_single_exp_fit_cap_varieables, raw_current, acquisition_rate, raw_current_data_seen, path_to_save, analysis_folder_name, plots_folder_name, lmfit_single_fit_plots_folder_name, PLOT_DPI):
+"""8.2 Fit a chunk of capacitance spikes from shared memory"""
+def fit_cap_spike_chunk_double_exp(shared_memory_name, raw_current_length, cap_data_first_indexs, polarities, data_per_cap_spike, params, fit_backend = 'lmfit', warm_start = False):
     """
-        This function plots and saves the single exponential lmfit fit and the raw_current data to that the fit can be visually evaluated
-        Saves the plots to the (lmfit_single_fit_plots_folder_name) folder that was made earlier
-        
-        * for help with writing program : lmfit_cap_var_temp = [m, k, h, lmfit_y_data, fitting_x_data, cap_index, cap_data, timing_index] *
+        Worker for function #8.3. Attaches to the shared memory block that holds raw_current (no copy is sent to the worker), and fits every
+        spike that starts at an index in (cap_data_first_indexs) with function #8.15. Warm starts (if on) begin again at the start of each chunk.
         
-        Updated: BS - 01/11/2022
-        Updated: BS - 02/21/2022 - added the fit data to the legend
+        1. chunk_fitted_values, list of (a, k1, b, k2, c, fit_log, nfev, success, residual_norm) in the same order as (cap_data_first_indexs)
     """
+    shared_raw_current = shared_memory.SharedMemory(name = shared_memory_name)
+    try:
+        raw_current = np.ndarray((raw_current_length,), dtype = np.float64, buffer = shared_raw_current.buf)
+        chunk_fitted_values = fit_cap_spike_series_double_exp(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, params, fit_backend, warm_start)      # Function #8.15
+        del raw_current
+    finally:
+        shared_raw_current.close()
     
-    for i in range(len(lmfit_single_exp_fit_cap_varieables)):
-        index_data = lmfit_single_exp_fit_cap_varieables[i]
-        raw_current_y_index = index_data[5]
-        raw_current_y_start = raw_current_y_index - raw_current_data_seen
-        raw_current_y_end = raw_current_y_start + acquisition_rate
-        raw_current_y_data = abs(raw_current[raw_current_y_start:raw_current_y_end])
-        raw_current_x_data = x_data_index_master[raw_current_y_start:raw_current_y_end]
-        Scalar = int(index_data[0])
-        Tau = int(index_data[1])
-        Intercept = int(index_data[2])
-        all_exp_fit_x_data = index_data[7]
-        
-        single_exp_fit_y_data = index_data[3]
-        intercept = index_data[2]
-        
-        plot_x_lower_bound = index_data[5] - raw_current_data_seen
-        plot_x_upper_bound = (index_data[5] + (acquisition_rate*0.05))
-        
-        fig = plt.figure(figsize=(4,3))
-        ax = plt.gca()
-        ax.scatter(raw_current_x_data, raw_current_y_data, color = 'k', s = 2, label="data", zorder = 1)
-        ax.plot(all_exp_fit_x_data, single_exp_fit_y_data, '--', color = 'r', label="fit1", linewidth = 1, zorder = 2)
-        ax.hlines(y=intercept, xmin = plot_x_lower_bound, xmax = plot_x_upper_bound, linewidth=1, color='m', linestyles='--', label = "intercept")
-        ax.set_title(f" single fit #{i} ", size=12, weight='bold') #Title
-        ax.set_xlabel('Datapoints',  fontsize=12)
-        ax.set_ylabel('Current (pA)',  fontsize=12)
-        ax.legend()
-        # anchored_text = AnchoredText(f" scalar = {Scalar}\n tau = {Tau}\n intercept = {Intercept}", loc=2)
-        # ax.add_artist(anchored_text)
-        # ax.text(0.5, 0.5, f" scalar = {Scalar}\n tau = {Tau}\n intercept = {Intercept}",  fontsize=12)
-        ax.set_xlim(plot_x_lower_bound,plot_x_upper_bound)
-        
-        plt.savefig(os.path.join(path_to_save, analysis_folder_name[0], plots_folder_name[0], lmfit_single_fit_plots_folder_name[0], f"lmfit_single_exp_fit_#{i}"), dpi = PLOT_DPI, bbox_inches = 'tight')
-        plt.close()
+    return(chunk_fitted_values)
+
+
+"""8.3 Parallel double exponential fitting"""
+def fit_cap_spikes_double_exp_parallel(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, params, number_of_fit_workers, fit_chunk_size, fit_backend = 'lmfit', warm_start = False):
+    """
+        Spreads the double exponential spike fits of function #8 across a pool of (number_of_fit_workers) processes.
+        raw_current is copied once into a shared memory block, the workers (function #8.2) read their spikes straight from it. Each worker
+        gets a chunk of (fit_chunk_size) spike start indexs, so only the indexs and the fit results are passed between processes.
         
-    return(print('done plotting single exp lmfit fits'))
+        1. fitted_values, list of (a, k1, b, k2, c, fit_log, nfev, success, residual_norm) for every spike, in the same order as (cap_data_first_indexs)
+    """
+    raw_current_length = len(raw_current)
+    shared_raw_current = shared_memory.SharedMemory(create = True, size = max(raw_current_length, 1) * 8)
+    try:
+        shared_array = np.ndarray((raw_current_length,), dtype = np.float64, buffer = shared_raw_current.buf)
+        for chunk_start, chunk in bin_data_chunks(raw_current, 1048576):        # Function #2.2
+            shared_array[chunk_start:chunk_start + len(chunk)] = chunk
+        del shared_array
+        
+        index_chunks = [cap_data_first_indexs[i:i + fit_chunk_size] for i in range(0, len(cap_data_first_indexs), fit_chunk_size)]
+        polarity_chunks = [polarities[i:i + fit_chunk_size] for i in range(0, len(polarities), fit_chunk_size)]
+        number_of_chunks = len(index_chunks)
+        with ProcessPoolExecutor(max_workers = number_of_fit_workers) as executor:
+            chunk_results = executor.map(fit_cap_spike_chunk_double_exp, [shared_raw_current.name]*number_of_chunks, [raw_current_length]*number_of_chunks, index_chunks, 
+                                         polarity_chunks, [data_per_cap_spike]*number_of_chunks, [params]*number_of_chunks, [fit_backend]*number_of_chunks, [warm_start]*number_of_chunks)         # Function #8.2
+            fitted_values = [fitted for chunk_fitted_values in chunk_results for fitted in chunk_fitted_values]
+    finally:
+        shared_raw_current.close()
+        shared_raw_current.unlink()
+    
+    return(fitted_values)
 
 
-"""11. plotting lmfit Single Exp fit Cap Spike Variables"""
-def plotting_lmfit_single_fit_parameters(lmfit_single_exp_fit_parameters, path_to_save, analysis_folder_name, plots_folder_name, lmfit_single_fit_vals_plots_folder_name, total_voltage_cycle_time, PLOT_DPI):
+"""8.5 Spike tables"""
+DOUBLE_EXP_SPIKE_DTYPE = np.dtype([('index', np.int64), ('polarity', 'U4'), ('a', np.float64), ('k1', np.float64), ('b', np.float64), ('k2', np.float64), ('c', np.float64), 
+                                   ('fast_tau', np.float64), ('fast_ab', np.float64), ('slow_tau', np.float64), ('slow_ab', np.float64), ('residual_norm', np.float64), 
+                                   ('nfev', np.int64), ('data_offset', np.int64), ('curve_offset', np.int64), ('curve_length', np.int64)])       # one row per double exp fit
+SINGLE_EXP_SPIKE_DTYPE = np.dtype([('index', np.int64), ('polarity', 'U4'), ('m', np.float64), ('k', np.float64), ('h', np.float64), ('residual_norm', np.float64), 
+                                   ('nfev', np.int64), ('data_offset', np.int64), ('curve_offset', np.int64), ('curve_length', np.int64)])       # one row per single exp fit
+
+def make_spike_table(raw_current, cap_indexs, polarities, cap_data_first_indexs, data_per_cap_spike, fitted_values, spike_dtype, keep_fit_curves = True):
     """
-        This function plots all the fit variables from the single exponential lmfit analysis and saves them in the (lmfit_single_fit_vals_plots_folder_name) flder that was made earlier
+        This function puts the fits of functions #8.15 / #9.15 into a spike table, a numpy structured array with one column per field and one row per spike
+        (DOUBLE_EXP_SPIKE_DTYPE or SINGLE_EXP_SPIKE_DTYPE). This replaces the list of [a, k1, b, k2, c, lmfit_y_data, fitting_x_data, cap_index, cap_data, fit_one, fit_two, timing_index]
+        that was kept for every spike.
+            index, polarity, the voltage switch index and "pos"/"neg"
+            a, k1, b, k2, c (double) or m, k, h (single), fit determined variables
+            fast_tau, fast_ab, slow_tau, slow_ab (double only), the larger tau is called fast (same as before)
+            residual_norm, sqrt(sum((fit - data)**2)) of the fit, found with the fit (function #8.57)
+            nfev, number of function evaluations of the fit
+            data_offset, curve_length, the spike data is abs(raw_current[data_offset:data_offset + curve_length]), it is not copied
+            curve_offset, the fit curve is fit_curves[curve_offset:curve_offset + curve_length]
+        
+        The fit curves of all spikes are kept end to end in one flat float64 buffer (fit_curves). The x values and the single exponential parts of the double 
+        fit are not kept, function #8.55 makes them when they are needed.
+        With (keep_fit_curves) = False the fit curves are not made or kept (fit_curves = None), only the fit determined variables and index's are held and
+        function #8.55 makes a curve from the variables when a plot or save asks for it. Use this when there are too many spikes to hold every curve.
+        
+        1. spike_table, numpy structured array
+        2. fit_curves, 1-D numpy array with the fit curve of every spike, None if (keep_fit_curves) = False
+    """
+    spike_table = np.zeros(len(fitted_values), dtype = spike_dtype)
+    spike_table['index'] = cap_indexs
+    spike_table['polarity'] = polarities
+    fit_names = ('a', 'k1', 'b', 'k2', 'c') if 'k1' in spike_dtype.names else ('m', 'k', 'h')
+    if len(fitted_values):
+        fit_values = np.array([fitted[:len(fit_names)] for fitted in fitted_values], dtype = np.float64)
+        for column, name in enumerate(fit_names):
+            spike_table[name] = fit_values[:, column]
+        spike_table['nfev'] = [fitted[len(fit_names) + 1] for fitted in fitted_values]
+        spike_table['residual_norm'] = [fitted[len(fit_names) + 3] for fitted in fitted_values]
+    
+    if 'k1' in spike_dtype.names:
+        k1_is_fast = spike_table['k1'] > spike_table['k2']
+        spike_table['fast_tau'] = np.where(k1_is_fast, spike_table['k1'], spike_table['k2'])
+        spike_table['fast_ab'] = np.where(k1_is_fast, spike_table['a'], spike_table['b'])
+        spike_table['slow_tau'] = np.where(k1_is_fast, spike_table['k2'], spike_table['k1'])
+        spike_table['slow_ab'] = np.where(k1_is_fast, spike_table['b'], spike_table['a'])
+    
+    spike_table['data_offset'] = cap_data_first_indexs
+    spike_table['curve_length'] = np.minimum(spike_table['data_offset'] + int(data_per_cap_spike), len(raw_current)) - spike_table['data_offset']
+    spike_table['curve_offset'] = np.cumsum(spike_table['curve_length']) - spike_table['curve_length']
+    
+    if not keep_fit_curves:
+        return(spike_table, None)
+    
+    fit_curves = np.empty(int(np.sum(spike_table['curve_length'])))
+    for i in range(len(spike_table)):
+        fit_curves[spike_table['curve_offset'][i]:spike_table['curve_offset'][i] + spike_table['curve_length'][i]] = exp_fit_curves(spike_fit_params(spike_table, i), int(spike_table['curve_length'][i]))[0]        # Functions #8.54 and #8.56
+    
+    return(spike_table, fit_curves)
+
+
+"""8.54 Exp fit curves"""
+def exp_fit_curves(fit_params, curve_length):
+    """
+        This function makes the fit curve of one spike from its fit determined variables (fit_params), a dictionary with a, k1, b, k2, c of a double
+        fit or m, k, h of a single fit, on the x values the fit was done on (np.linspace(0, curve_length, curve_length)).
         
-        Updated: BS - 01/11/2022
-        Updated: BS - 02/09/2022 - making the x-axid units into seconds for all variable plots
+        1. fit_y_data, the fit curve
+        2. fit_parts, [fit_one, fit_two] the two single exponentials of a double fit ([] for a single fit)
     """
+    fitting_x_data = np.linspace(0, curve_length, num = curve_length, endpoint = True)
     
-    master = lmfit_single_exp_fit_parameters[0]
-    # global pos_tau
-    pos_tau = master[1]
+    if 'k1' in fit_params:
+        fit_parts = [fit_params['a'] * np.exp(-(fitting_x_data * (1/fit_params['k1']))) + fit_params['c'], fit_params['b'] * np.exp(-(fitting_x_data * (1/fit_params['k2']))) + fit_params['c']]
+        fit_y_data = fit_params['a'] * np.exp(-(fitting_x_data * (1/fit_params['k1']))) + fit_params['b'] * np.exp(-(fitting_x_data * (1/fit_params['k2']))) + fit_params['c']
+    else:
+        fit_parts = []
+        fit_y_data = fit_params['m'] * np.exp(-(fitting_x_data * (1/fit_params['k']))) + fit_params['h']
     
-    neg_tau = master[4]
+    return(fit_y_data, fit_parts)
+
+
+"""8.55 Spike table curves"""
+def spike_table_curves(spike_table, fit_curves, raw_current, i):
+    """
+        This function gets everything the plots need for spike (i) of a spike table from function #8.5. The spike data is read from (raw_current) and
+        the fit curve from (fit_curves), the rest is made from the fit determined variables. With (fit_curves) = None the fit curve is made from the 
+        variables too.
+        
+        1. fitting_x_data, x values the fit was done on (np.linspace(0, len, len))
+        2. cap_data, abs of the spike current
+        3. timing_index, index's of the spike in (raw_current)
+        4. fit_y_data, the fit curve
+        5. fit_parts, [fit_one, fit_two] the two single exponentials of a double fit ([] for a single fit)
+    """
+    spike = spike_table[i]
+    data_offset = int(spike['data_offset'])
+    curve_length = int(spike['curve_length'])
+    cap_data = np.abs(np.asarray(raw_current[data_offset:data_offset + curve_length], dtype = np.float64))
+    timing_index = sample_index(raw_current)[data_offset:data_offset + curve_length]
+    fitting_x_data = np.linspace(0, curve_length, num = curve_length, endpoint = True)
+    
+    fit_y_data, fit_parts = exp_fit_curves(spike_fit_params(spike_table, i), curve_length)        # Function #8.54
+    if fit_curves is not None:
+        fit_y_data = fit_curves[int(spike['curve_offset']):int(spike['curve_offset']) + curve_length]
+    
+    return(fitting_x_data, cap_data, timing_index, fit_y_data, fit_parts)
+
+
+"""8.56 Spike fit variables"""
+def spike_fit_params(spike_table, i):
+    """
+        This function gets the fit determined variables of spike (i) of a spike table from function #8.5, a, k1, b, k2, c for a double fit or m, k, h
+        for a single fit. It is what function #8.54 needs to make the fit curve, and all a plot job needs to send instead of the curves.
+        
+        1. fit_params, dictionary of the fit determined variables
+    """
+    fit_names = ('a', 'k1', 'b', 'k2', 'c') if 'k1' in spike_table.dtype.names else ('m', 'k', 'h')
+    
+    return({name: float(spike_table[name][i]) for name in fit_names})
+
+
+"""8.57 Fit residual norm"""
+def fit_residual_norm(fit_params, cap_data):
+    """
+        This function finds how far the fit with the fit determined variables (fit_params, same as function #8.54) is from the spike data (cap_data,
+        already abs) it was fit to, the norm of the residual sqrt(sum((fit - data)**2)). The fit curve is only made for this and not kept.
+        
+        1. residual_norm, float
+    """
+    fit_y_data = exp_fit_curves(fit_params, len(cap_data))[0]       # Function #8.54
+    
+    return(float(np.sqrt(np.sum((fit_y_data - cap_data)**2))))
+
+
+"""8.6 Time chunk stats"""
+def time_chunk_stats(values, time_steps):
+    """
+        Breaks (values) into (time_steps) chunks (np.array_split) and finds the mean and sample standard deviation of each chunk.
+        A chunk with one value has a standard deviation of 0.
+        
+        1. chunk_stats, list of [chunk, mean, stdev] for each chunk
+    """
+    chunk_stats = []
+    for chunk in np.array_split(np.asarray(values, dtype = np.float64), time_steps):
+        if len(chunk) == 1:
+            chunk_stats.append([chunk, chunk[0], 0])
+            continue
+        chunk_stats.append([chunk, *data_stats(chunk)[:2]])          # Function #2.46
+    
+    return(chunk_stats)
+
+
+"""9. Fitting Capacitance Spikes with lmfit single exponential"""
+def fitting_cap_spikes_w_lmfit_single_exp(pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, time_steps, warm_start = False, fit_mode = 'lmfit', keep_fit_curves = True, result_cache = None):
+    """
+        This function takes the capacitance spike index's (pos_cap_index, neg_caps_index) and fits the eponential like decay with a SINGLE exponential equation using the open source lmfit funtion.
+        (lmfit DOI: 10.5281/zenodo.5570790)
+        
+        The fit parameters, variables, and a log of each fit performace are saved. Several other parameters and variables are also saved. 
+        
+        1. lmfit_single_exp_fit_parameters, contains a tuple of arrays that contain all the fit determined variables for each fit (pos_m, pos_k, pos_h, neg_m, neg_k, neg_h)
+        2. lmfit_single_exp_fit_cap_varieables, (spike_table, fit_curves) from function #8.5, one table row per spike with the fit determined variables, index, polarity and fit residual, 
+            the fit curves are in one flat buffer (use function #8.55 to get the data, fit and x values of one spike)
+        3. lmfit_single_exp_fit_log_master, contains a list of the fit performance log
+        4. lmfit_single_exp_fit_cap_varieables_master, contains #3 but for all files (master for ALL double lmfit fits) 
+        5. lmfit_single_exp_10min_windows_master, chops the experiment time into 6 sections, then finds the average of each parameter in each section so that the analysis can be broken up and displayed in 10 minute chuncks
+            (pos_single_fit_tau_chunk_master, neg_single_fit_tau_chunk_master)    
+            * might want to make the number of section that the data is broken up into a used defined value *
+        
+        With (warm_start) on, each fit starts from the last converged fit of the same polarity (see function #9.15).
+        (fit_mode) 'fast' uses the closed form estimate of function #9.12 in place of the lmfit fits, 'seeded' starts each lmfit fit from it.
+        With (keep_fit_curves) = False only the fit determined variables and index's are kept, the fit curves are remade by function #8.55 when plotted.
+        With a (result_cache) from function #2.5 the fits are loaded from the cache when the same spikes were fit with the same settings before.
+        
+        Updated: BS - 01/11/2022
+        Updated: BS - 02/09/2022 - added the user defined value for the number of time chuncks the fitting variables are parsed into (time_steps)
+    """
+    params = single_exp_fit_parameters()
+    
+    pos_cap_index_neg_cap_index = np.concatenate((np.asarray(pos_caps_index, dtype = np.int64), np.asarray(neg_caps_index, dtype = np.int64)))
+    cap_data_first_indexs = (pos_cap_index_neg_cap_index + fit_offset).tolist()
+    polarities = ['pos']*len(pos_caps_index) + ['neg']*len(neg_caps_index)
+    
+    fit_start_time = time.perf_counter()
+    fit_inputs = (np.asarray(cap_data_first_indexs, dtype = np.int64), polarities, acquisition_rate, warm_start, fit_mode)
+    fitted_values = cached_stage(result_cache, "single_exp_fits_with_residual_norm", fit_inputs, fit_cap_spike_series_single_exp, raw_current, cap_data_first_indexs, polarities, acquisition_rate, params, warm_start, fit_mode)       # Function #9.15 (through function #2.54)
+    print(f"single exp fits: {len(fitted_values)} spikes, {sum([fitted[4] for fitted in fitted_values])} function evals, {time.perf_counter() - fit_start_time:.2f} s (warm start = {warm_start}, fit mode = {fit_mode})")
+    
+    lmfit_single_exp_fit_log_master = []
+    for o in range(len(fitted_values)):
+        # logging.warning(f'error in lmfit single exp fit # {o}, run #{i}')
+        lmfit_single_exp_fit_log_master.append(f"single mlfit number {o}")
+        lmfit_single_exp_fit_log_master.append(fitted_values[o][3])
+    
+    spike_table, fit_curves = make_spike_table(raw_current, pos_cap_index_neg_cap_index, polarities, cap_data_first_indexs, acquisition_rate, fitted_values, SINGLE_EXP_SPIKE_DTYPE, keep_fit_curves)        # Function #8.5
+    
+    pos = spike_table['polarity'] == "pos"
+    neg = spike_table['polarity'] == "neg"
+    
+    pos_m = spike_table['m'][pos]
+    pos_k = spike_table['k'][pos]
+    pos_h = spike_table['h'][pos]
+    
+    neg_m = spike_table['m'][neg]
+    neg_k = spike_table['k'][neg]
+    neg_h = spike_table['h'][neg]
+    
+    lmfit_params_temp = [pos_m, pos_k, pos_h, neg_m, neg_k, neg_h]
+    lmfit_single_exp_fit_parameters.append(lmfit_params_temp)
+    
+    n = time_steps       # might want to make this a user defined variable
+    pos_single_fit_tau_chunk_master = [time_chunk_stats(pos_k, n)]        # Function #8.6
+    neg_single_fit_tau_chunk_master = [time_chunk_stats(neg_k, n)]
+    
+    lmfit_single_exp_10min_windows_temp = [pos_single_fit_tau_chunk_master, neg_single_fit_tau_chunk_master]
+    lmfit_single_exp_10min_windows_master.append(lmfit_single_exp_10min_windows_temp)
+    
+    lmfit_single_exp_fit_cap_varieables = (spike_table, fit_curves)
+    lmfit_single_exp_fit_cap_varieables_master.append(lmfit_single_exp_fit_cap_varieables)
+        
+    return(lmfit_single_exp_fit_parameters, lmfit_single_exp_fit_cap_varieables, lmfit_single_exp_fit_log_master, lmfit_single_exp_fit_cap_varieables_master, lmfit_single_exp_10min_windows_master)
+
+
+"""9.05 Single exponential model and starting parameters"""
+def single_exp_residual(params, x, y):
+    m = params['m']
+    k = params['k']
+    h = params['h']
+    y_fit = m * np.exp(-(x * (1/k))) + h
+    return y_fit-y
+
+def single_exp_fit_parameters():
+    """
+        Starting values and limits for the single exponential fits (function #9).
+        
+        1. params, lmfit Parameters (m, k, h)
+    """
+    params = Parameters()
+    
+    params.add('m', value = 20000, vary = True, min= 1.0, max= 40000)
+    params.add('k', value = 40, vary = True, min= 1.0, max= 5000)
+    params.add('h', value = 400, vary = True, min= 1.0, max= 5000)
+    
+    return(params)
+
+
+"""9.1 Single exponential fit of one capacitance spike"""
+def fit_one_cap_spike_single_exp(cap_data, params):
+    """
+        Fits one capacitance spike (cap_data, already abs) with the single exponential of function #9.05.
+        
+        1. (m, k, h, fit_log, nfev, success), fit determined variables, the lmfit fit report, number of function evaluations and if the fit converged
+    """
+    fitting_x_data = np.linspace(0, len(cap_data), num = len(cap_data), endpoint = True)
+    fitted_params = minimize(single_exp_residual, params, args=(fitting_x_data,cap_data,), method='least_squares')
+    
+    m = fitted_params.params['m'].value
+    k = fitted_params.params['k'].value
+    h = fitted_params.params['h'].value
+    fit_log = fit_report(fitted_params)
+    
+    return(m, k, h, fit_log, fitted_params.nfev, fitted_params.success)
+
+
+"""9.12 Closed form single exponential estimates"""
+def single_exp_closed_form_block(cap_data_block):
+    """
+        Closed form (successive integration) estimate of m*exp(-x/k) + h for every row of (cap_data_block), all rows at once.
+        
+        The running integral of the decay, S(x), satisfies y = (m + h) - (1/k)*S(x) + (h/k)*x, which is linear in S and x. So a linear least squares 
+        fit of y against S and x (one small 2x2 solve per spike) gives k = -1/slope_S, h = k*slope_x and m = intercept - h with no iterations.
+        x is the same np.linspace(0, len, len) the lmfit fits use, and S is the trapezoid running integral over that x.
+        
+        1. m, k, h, numpy arrays with one value per row, NaN when a row does not look like a decay (slope_S >= 0 or the solve fails)
+    """
+    cap_data_block = np.asarray(cap_data_block, dtype = np.float64)
+    number_of_points = cap_data_block.shape[1]
+    fitting_x_data = np.linspace(0, number_of_points, num = number_of_points, endpoint = True)
+    dx = fitting_x_data[1] - fitting_x_data[0] if number_of_points > 1 else 1.0
+    
+    running_integral = np.zeros_like(cap_data_block)
+    np.cumsum((cap_data_block[:, 1:] + cap_data_block[:, :-1]) * (dx/2), axis = 1, out = running_integral[:, 1:])
+    
+    y_centered = cap_data_block - cap_data_block.mean(axis = 1, keepdims = True)
+    s_centered = running_integral - running_integral.mean(axis = 1, keepdims = True)
+    x_centered = fitting_x_data - fitting_x_data.mean()
+    
+    s_s = np.einsum('ij,ij->i', s_centered, s_centered)
+    s_x = s_centered @ x_centered
+    x_x = x_centered @ x_centered
+    s_y = np.einsum('ij,ij->i', s_centered, y_centered)
+    x_y = y_centered @ x_centered
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        determinant = s_s*x_x - s_x**2
+        slope_s = (s_y*x_x - x_y*s_x) / determinant
+        slope_x = (x_y*s_s - s_y*s_x) / determinant
+        intercept = cap_data_block.mean(axis = 1) - slope_s*running_integral.mean(axis = 1) - slope_x*fitting_x_data.mean()
+        k = -1/slope_s
+        h = k*slope_x
+        m = intercept - h
+    
+    not_a_decay = ~(np.isfinite(k) & (slope_s < 0) & np.isfinite(m) & np.isfinite(h))
+    m[not_a_decay] = np.nan
+    k[not_a_decay] = np.nan
+    h[not_a_decay] = np.nan
+    
+    return(m, k, h)
+
+def estimate_single_exp_closed_form(raw_current, cap_data_first_indexs, data_per_cap_spike, spikes_per_block = 256):
+    """
+        Runs the closed form estimate (single_exp_closed_form_block) over all spikes that start at (cap_data_first_indexs), (spikes_per_block) 
+        spikes at a time so the spike data in RAM stays small. Spikes that run past the end of raw_current (shorter than data_per_cap_spike) 
+        are done on their own.
+        
+        1. m, k, h, numpy arrays with one value per spike (NaN where the estimate failed)
+    """
+    cap_data_first_indexs = np.asarray(cap_data_first_indexs, dtype = np.int64)
+    m = np.full(len(cap_data_first_indexs), np.nan)
+    k = np.full(len(cap_data_first_indexs), np.nan)
+    h = np.full(len(cap_data_first_indexs), np.nan)
+    
+    full_spikes = np.flatnonzero(cap_data_first_indexs + data_per_cap_spike <= len(raw_current))
+    short_spikes = np.flatnonzero(cap_data_first_indexs + data_per_cap_spike > len(raw_current))
+    for block_start in range(0, len(full_spikes), spikes_per_block):
+        block_spikes = full_spikes[block_start:block_start + spikes_per_block]
+        cap_data_block = np.abs(gather_windows(raw_current, cap_data_first_indexs[block_spikes], data_per_cap_spike))        # Function #7.05
+        m[block_spikes], k[block_spikes], h[block_spikes] = single_exp_closed_form_block(cap_data_block)
+    for spike in short_spikes:
+        cap_data = np.abs(np.asarray(raw_current[cap_data_first_indexs[spike]:], dtype = np.float64))
+        if len(cap_data) > 2:
+            block_m, block_k, block_h = single_exp_closed_form_block(cap_data[None, :])
+            m[spike], k[spike], h[spike] = block_m[0], block_k[0], block_h[0]
+    
+    return(m, k, h)
+
+
+"""9.15 Single exponential fits of a series of capacitance spikes"""
+def fit_cap_spike_series_single_exp(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, params, warm_start = False, fit_mode = 'lmfit'):
+    """
+        Same as function #8.15, for the single exponential fits of function #9.1.
+        
+        fit_mode = 'lmfit', full lmfit fit of every spike (with warm starts if (warm_start) is on)
+        fit_mode = 'fast', closed form estimate of every spike (function #9.12), vectorized over all spikes with no lmfit fits. The values are 
+            kept inside the limits in (params). Spikes where the estimate fails are fit with lmfit.
+        fit_mode = 'seeded', full lmfit fit of every spike that starts from its closed form estimate, (warm_start) is not used
+        
+        1. fitted_values, list of (m, k, h, fit_log, nfev, success, residual_norm) in the same order as (cap_data_first_indexs)
+    """
+    if fit_mode in ('fast', 'seeded'):
+        estimated_m, estimated_k, estimated_h = estimate_single_exp_closed_form(raw_current, cap_data_first_indexs, data_per_cap_spike)       # Function #9.12
+    
+    fitted_values = []
+    previous_fit = {}
+    for o, (first_index, polarity) in enumerate(zip(cap_data_first_indexs, polarities)):
+        cap_data = np.abs(raw_current[first_index:first_index + data_per_cap_spike])
+        if fit_mode in ('fast', 'seeded') and np.isfinite(estimated_k[o]):
+            estimate = warm_start_parameters(params, {'m': estimated_m[o], 'k': estimated_k[o], 'h': estimated_h[o]})
+            if fit_mode == 'fast':
+                fit_log = f"closed form single exp estimate (successive integration)\n    m: {estimate['m'].value}\n    k: {estimate['k'].value}\n    h: {estimate['h'].value}\n"
+                fitted = (estimate['m'].value, estimate['k'].value, estimate['h'].value, fit_log, 0, True)
+            else:
+                fitted = fit_one_cap_spike_single_exp(cap_data, estimate)       # Function #9.1
+                if fit_diverged(fitted[:3], params, fitted[5]):
+                    seeded_nfev = fitted[4]
+                    fitted = fit_one_cap_spike_single_exp(cap_data, params)
+                    fitted = fitted[:4] + (fitted[4] + seeded_nfev, fitted[5])
+            fitted_values.append(fitted + (fit_residual_norm(dict(zip(params.keys(), fitted[:3])), cap_data),))       # Function #8.57
+            continue
+        
+        if warm_start and polarity in previous_fit:
+            fitted = fit_one_cap_spike_single_exp(cap_data, warm_start_parameters(params, previous_fit[polarity]))       # Function #9.1
+            if fit_diverged(fitted[:3], params, fitted[5]):
+                warm_nfev = fitted[4]
+                fitted = fit_one_cap_spike_single_exp(cap_data, params)
+                fitted = fitted[:4] + (fitted[4] + warm_nfev, fitted[5])
+        else:
+            fitted = fit_one_cap_spike_single_exp(cap_data, params)
+        
+        if warm_start and not fit_diverged(fitted[:3], params, fitted[5]):
+            previous_fit[polarity] = dict(zip(params.keys(), fitted[:3]))
+        fitted_values.append(fitted + (fit_residual_norm(dict(zip(params.keys(), fitted[:3])), cap_data),))       # Function #8.57
+    
+    return(fitted_values)
+
+
+"""9.2 Warm start savings"""
+def warm_start_report(pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, data_per_cap_spike, fit_backend = 'lmfit'):
+    """
+        Fits every capacitance spike twice with the double exponential (function #8.15) and the single exponential (function #9.15), once from the 
+        default starting values and once with warm starts, and prints how many function evaluations and how much time the warm starts save.
+        Nothing is added to the master lists, this is only for checking the savings on a file.
+        
+        1. warm_start_savings, list of [fit name, cold function evals, warm function evals, cold seconds, warm seconds] for the double and single exp fits
+    """
+    cap_data_first_indexs = [cap_index + fit_offset for cap_index in list(pos_caps_index) + list(neg_caps_index)]
+    polarities = ['pos']*len(pos_caps_index) + ['neg']*len(neg_caps_index)
+    
+    warm_start_savings = []
+    for fit_name in ("double exp", "single exp"):
+        fit_counts = []
+        for warm_start in (False, True):
+            fit_start_time = time.perf_counter()
+            if fit_name == "double exp":
+                fitted_values = fit_cap_spike_series_double_exp(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, double_exp_fit_parameters(), fit_backend, warm_start)
+                nfev = sum([fitted[6] for fitted in fitted_values])
+            else:
+                fitted_values = fit_cap_spike_series_single_exp(raw_current, cap_data_first_indexs, polarities, acquisition_rate, single_exp_fit_parameters(), warm_start)
+                nfev = sum([fitted[4] for fitted in fitted_values])
+            fit_counts.extend([nfev, time.perf_counter() - fit_start_time])
+        cold_nfev, cold_time, warm_nfev, warm_time = fit_counts
+        warm_start_savings.append([fit_name, cold_nfev, warm_nfev, cold_time, warm_time])
+        print(f"{fit_name} fits: function evals {cold_nfev} -> {warm_nfev} ({100*(1 - warm_nfev/max(cold_nfev, 1)):.1f}% fewer), "
+              f"time {cold_time:.2f} s -> {warm_time:.2f} s ({100*(1 - warm_time/max(cold_time, 1e-12)):.1f}% less)")
+    
+    return(warm_start_savings)
+
+
+"""10. Ploting lmfit Single Exp fit Cap Spikes and lmfits Fits"""
+def plotting_lmfit_single_exp_caps_and_fits(lmfit_single_exp_fit_cap_varieables, raw_current, acquisition_rate, raw_current_data_seen, path_to_save, analysis_folder_name, plots_folder_name, lmfit_single_fit_plots_folder_name, PLOT_DPI, number_of_plot_workers = 1, render_plots = True):
+    """
+        This function plots and saves the single exponential lmfit fit and the raw_current data to that the fit can be visually evaluated
+        Saves the plots to the (lmfit_single_fit_plots_folder_name) folder that was made earlier
+        
+        * for help with writing program : lmfit_single_exp_fit_cap_varieables = (spike_table, fit_curves) from function #8.5 *
+        
+        Updated: BS - 01/11/2022
+        Updated: BS - 02/21/2022 - added the fit data to the legend
+        
+        Each spike is a plot job for function #24.3, which renders them with a reused figure (function #24), across (number_of_plot_workers) processes.
+        With (render_plots) = False nothing is plotted.
+    """
+    x_data_index_master = sample_index(raw_current)
+    spike_table = lmfit_single_exp_fit_cap_varieables[0]
+    
+    def plot_jobs():
+        for i in range(len(spike_table)):
+            data_offset = int(spike_table['data_offset'][i])
+            timing_index = x_data_index_master[data_offset:data_offset + int(spike_table['curve_length'][i])]
+            raw_current_y_index = int(spike_table['index'][i])
+            raw_current_y_start = raw_current_y_index - raw_current_data_seen
+            raw_current_y_end = raw_current_y_start + acquisition_rate
+            raw_current_y_data = abs(raw_current[raw_current_y_start:raw_current_y_end])
+            raw_current_x_data = x_data_index_master[raw_current_y_start:raw_current_y_end]
+            Scalar = int(spike_table['m'][i])
+            Tau = int(spike_table['k'][i])
+            Intercept = int(spike_table['h'][i])
+            all_exp_fit_x_data = timing_index
+            
+            intercept = spike_table['h'][i]
+            
+            plot_x_lower_bound = raw_current_y_index - raw_current_data_seen
+            plot_x_upper_bound = (raw_current_y_index + (acquisition_rate*0.05))
+            
+            payload = {'data_x': raw_current_x_data, 'data_y': raw_current_y_data, 'fit_x': all_exp_fit_x_data, 'fit_params': spike_fit_params(spike_table, i), 
+                       'intercept': intercept, 'xlim': (plot_x_lower_bound, plot_x_upper_bound), 'title': f" single fit #{i} "}        # Function #8.56
+            # anchored_text = AnchoredText(f" scalar = {Scalar}\n tau = {Tau}\n intercept = {Intercept}", loc=2)
+            
+            yield ('single_fit', payload, os.path.join(path_to_save, analysis_folder_name[0], plots_folder_name[0], lmfit_single_fit_plots_folder_name[0], f"lmfit_single_exp_fit_#{i}"))
+    
+    render_plot_jobs(plot_jobs(), PLOT_DPI, number_of_plot_workers, render_plots)         # Function #24.3
+    
+    return(print('done plotting single exp lmfit fits'))
+
+
+"""11. plotting lmfit Single Exp fit Cap Spike Variables"""
+def plotting_lmfit_single_fit_parameters(lmfit_single_exp_fit_parameters, path_to_save, analysis_folder_name, plots_folder_name, lmfit_single_fit_vals_plots_folder_name, total_voltage_cycle_time, PLOT_DPI):
+    """
+        This function plots all the fit variables from the single exponential lmfit analysis and saves them in the (lmfit_single_fit_vals_plots_folder_name) flder that was made earlier
+        
+        Updated: BS - 01/11/2022
+        Updated: BS - 02/09/2022 - making the x-axid units into seconds for all variable plots
+    """
+    
+    master = lmfit_single_exp_fit_parameters[0]
+    # global pos_tau
+    pos_tau = master[1]
+    
+    neg_tau = master[4]
     
     pos_ab = master[0]
     
@@ -2358,60 +3433,53 @@ def plotting_total_single_lmfit_tau_trends(lmfit_single_exp_10min_windows_master
 
 
 """13. Ploting lmfit Double Exp fit Cap Spikes and lmfits Fits"""
-def plotting_lmfit_double_exp_caps_and_fits(lmfit_parameters, lmfit_cap_varieables, fit_log_master, raw_current, acquisition_rate, raw_current_data_seen, path_to_save, analysis_folder_name, plots_folder_name, lmfit_double_fit_plots_folder_name, PLOT_DPI):
+def plotting_lmfit_double_exp_caps_and_fits(lmfit_parameters, lmfit_cap_varieables, fit_log_master, raw_current, acquisition_rate, raw_current_data_seen, path_to_save, analysis_folder_name, plots_folder_name, lmfit_double_fit_plots_folder_name, PLOT_DPI, number_of_plot_workers = 1, render_plots = True):
     """
         This function plots the double exponential lmfit fit and the raw_current data to that the fit can be visually evaluated
         Saves the plots to the (lmfit_double_fit_plots_folder_name) folder that was made earlier
         
-        * for help with writing program : lmfit_cap_var_temp = [m, k, h, lmfit_y_data, fitting_x_data, cap_index, cap_data, timing_index] *
+        * for help with writing program : lmfit_cap_varieables = (spike_table, fit_curves) from function #8.5 *
         
         Updated: BS - 01/11/2022
         Updated: BS - 02/21/2022 - added the fit data to the legend of the plots 
-    """
-    for i in range(len(lmfit_cap_varieables)):
-        index_data = lmfit_cap_varieables[i]
-        # double_fit_data = index_data[5]
-        raw_current_y_index = index_data[7]
-        raw_current_y_start = raw_current_y_index - raw_current_data_seen
-        raw_current_y_end = raw_current_y_start + acquisition_rate
-        raw_current_y_data = abs(raw_current[raw_current_y_start:raw_current_y_end])
-        raw_current_x_data = x_data_index_master[raw_current_y_start:raw_current_y_end]
-        
-        Scalar_a = int(index_data[0])
-        Tau_k1 = int(index_data[1])
-        Scalar_b = int(index_data[2])
-        Tau_k2 = int(index_data[3])
-        Intercept = int(index_data[4])
-        
-        all_exp_fit_x_data = index_data[11]
-        
-        double_exp_fit_y_data = index_data[5]
-        first_exp_fit_y_data = index_data[9]
-        second_exp_fit_y_data = index_data[10]
-        intercept = index_data[4]
-        
-        plot_x_lower_bound = index_data[7] - raw_current_data_seen
-        plot_x_upper_bound = (index_data[7] + (acquisition_rate*0.05))
-        
-        fig = plt.figure(figsize=(8,4))
-        ax = plt.gca()
-        ax.scatter(raw_current_x_data, raw_current_y_data, color = 'k', s = 2, label="data", zorder = 1)
-        ax.plot(all_exp_fit_x_data, first_exp_fit_y_data, '--', color = 'b', label="fit1", linewidth = 1)
-        ax.plot(all_exp_fit_x_data, second_exp_fit_y_data, '--', color = 'g', label="fit2", linewidth = 1)
-        ax.plot(all_exp_fit_x_data, double_exp_fit_y_data, '--', color = 'r', label="double fit", linewidth = 1)
-        ax.hlines(y=intercept, xmin = plot_x_lower_bound, xmax = plot_x_upper_bound, linewidth=1, color='m', linestyles='--', label = "intercept")
-        ax.set_title(f" double fit #{i} ", size=12, weight='bold') #Title
-        ax.set_xlabel('Datapoints')
-        ax.set_ylabel('Current (pA)')
-        ax.legend()
-        anchored_text = AnchoredText(f"scalar a = {Scalar_a}\n tau 1 = {Tau_k1}\n scalar b = {Scalar_b}\n tau 2 = {Tau_k2}\n intercept = {Intercept}", loc=2)
-        ax.add_artist(anchored_text)
-        # ax.text(0.5, 0.5, f"scalar a = {Scalar_a}\n tau 1 = {Tau_k1}\n scalar b = {Scalar_b}\n tau 2 = {Tau_k2}\n intercept = {Intercept}", fontsize=12)
-        ax.set_xlim(plot_x_lower_bound,plot_x_upper_bound)
-        
-        plt.savefig(os.path.join(path_to_save, analysis_folder_name[0], plots_folder_name[0], lmfit_double_fit_plots_folder_name[0], f"lmfit_double_exp_fit_#{i}"), dpi = PLOT_DPI, bbox_inches = 'tight')
-        plt.close()
         
+        Each spike is a plot job for function #24.3, which renders them with a reused figure (function #24), across (number_of_plot_workers) processes.
+        With (render_plots) = False nothing is plotted.
+    """
+    x_data_index_master = sample_index(raw_current)
+    spike_table = lmfit_cap_varieables[0]
+    
+    def plot_jobs():
+        for i in range(len(spike_table)):
+            data_offset = int(spike_table['data_offset'][i])
+            timing_index = x_data_index_master[data_offset:data_offset + int(spike_table['curve_length'][i])]
+            raw_current_y_index = int(spike_table['index'][i])
+            raw_current_y_start = raw_current_y_index - raw_current_data_seen
+            raw_current_y_end = raw_current_y_start + acquisition_rate
+            raw_current_y_data = abs(raw_current[raw_current_y_start:raw_current_y_end])
+            raw_current_x_data = x_data_index_master[raw_current_y_start:raw_current_y_end]
+            
+            Scalar_a = int(spike_table['a'][i])
+            Tau_k1 = int(spike_table['k1'][i])
+            Scalar_b = int(spike_table['b'][i])
+            Tau_k2 = int(spike_table['k2'][i])
+            Intercept = int(spike_table['c'][i])
+            
+            all_exp_fit_x_data = timing_index
+            
+            intercept = spike_table['c'][i]
+            
+            plot_x_lower_bound = raw_current_y_index - raw_current_data_seen
+            plot_x_upper_bound = (raw_current_y_index + (acquisition_rate*0.05))
+            
+            payload = {'data_x': raw_current_x_data, 'data_y': raw_current_y_data, 'fit_x': all_exp_fit_x_data, 'fit_params': spike_fit_params(spike_table, i),         # Function #8.56
+                       'intercept': intercept, 'xlim': (plot_x_lower_bound, plot_x_upper_bound), 
+                       'title': f" double fit #{i} ", 'text': f"scalar a = {Scalar_a}\n tau 1 = {Tau_k1}\n scalar b = {Scalar_b}\n tau 2 = {Tau_k2}\n intercept = {Intercept}"}
+            
+            yield ('double_fit', payload, os.path.join(path_to_save, analysis_folder_name[0], plots_folder_name[0], lmfit_double_fit_plots_folder_name[0], f"lmfit_double_exp_fit_#{i}"))
+    
+    render_plot_jobs(plot_jobs(), PLOT_DPI, number_of_plot_workers, render_plots)         # Function #24.3
+    
     return(print('done plotting double exp lmfit fits'))
 
 
@@ -2909,204 +3977,1168 @@ def saving_conductance_calulations(cond_time_chunks_master, path_to_save, analys
     np.save(os.path.join(path_to_save, analysis_folder_name[0], npy_file_folder_name[0], "all_conducntance_caluculations.npy"), cond_time_chunks_master)
     
     return('done saving conductance stuff')
-    
-#%%
 
-#....................DATA INPUT..................
-"""USER INPUT REQUIRED""" # assign the path/location of data to be analyzed, the common tag of the data, and the tag at the end of the saved data folder
-
-path = "ENTER FILE PATH"
 
-save_path = "ENTER SAVE PATH"     # this is the path for the master folder
+"""24. Headless plot renderer"""
+def new_plot_renderer(plot_type):
+    """
+        This function makes one figure for a type of plot that is saved over and over: 'voltage_window' (function #7.25), 'single_fit' (function #10) 
+        or 'double_fit' (function #13). The figure is made on an Agg canvas directly, not through pyplot, so no window is opened and it works on a 
+        computer with no display no matter what backend pyplot is using.
+        
+        The same figure is used for every plot of that type, function #24.1 only changes the data, title, text and limits of the artists that are
+        already on it before each save, instead of making and closing a new figure for every spike or window.
+        
+        1. renderer, dictionary with the 'plot_type', the 'figure' and its artists
+    """
+    renderer = {'plot_type': plot_type}
+    
+    if plot_type == 'voltage_window':
+        figure = Figure(figsize=(8,4))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        renderer['current'] = ax.scatter([], [], s=5, alpha=0.75, color = "b")
+        renderer['title'] = ax.set_title("", size=12, weight='bold')
+        ax.set_xlabel('Seconds')
+        ax.set_ylabel('Current (pA)')
+        renderer['text'] = AnchoredText("", loc=9)
+        ax.add_artist(renderer['text'])
+        ax2 = ax.twinx()
+        renderer['voltage'] = ax2.scatter([], [], s=2, alpha=0.75, color = "r")
+        ax2.set_ylim(-100,100)
+        ax2.set_ylabel('Voltage (mV)', color = "r")
+        renderer['ax2'] = ax2
+    
+    else:
+        figure = Figure(figsize=(8,4) if plot_type == 'double_fit' else (4,3))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        renderer['data'] = ax.scatter([], [], color = 'k', s = 2, label="data", zorder = 1)
+        if plot_type == 'double_fit':
+            renderer['fit_parts'] = [ax.plot([], [], '--', color = 'b', label="fit1", linewidth = 1)[0], ax.plot([], [], '--', color = 'g', label="fit2", linewidth = 1)[0]]
+            renderer['fit'] = ax.plot([], [], '--', color = 'r', label="double fit", linewidth = 1)[0]
+            ax.set_xlabel('Datapoints')
+            ax.set_ylabel('Current (pA)')
+        else:
+            renderer['fit_parts'] = []
+            renderer['fit'] = ax.plot([], [], '--', color = 'r', label="fit1", linewidth = 1, zorder = 2)[0]
+            ax.set_xlabel('Datapoints',  fontsize=12)
+            ax.set_ylabel('Current (pA)',  fontsize=12)
+        renderer['intercept'] = ax.hlines(y=0, xmin = 0, xmax = 1, linewidth=1, color='m', linestyles='--', label = "intercept")
+        renderer['title'] = ax.set_title("", size=12, weight='bold')
+        ax.legend()
+        if plot_type == 'double_fit':
+            renderer['text'] = AnchoredText("", loc=2)
+            ax.add_artist(renderer['text'])
+    
+    renderer['figure'] = figure
+    renderer['ax'] = ax
+    
+    return(renderer)
 
-common_name = ("ENTER COMMON TITLE")
-file_tag = ("ENTER FILE TAG TO ADD TO SAVE FOLDERS")
-pH_in_label = (1, 2)         # numbers corrispond to the groups of numbers ex. BS_p130_GvpH1_pH3-51_3_1302 === (2,3) === pH 3.51
-logger_name = common_name
-logger_name += file_tag
-PLOT_DPI = 180      
 
-parameter_master = []
-lmfit_parameters = []
-lmfit_cap_varieables_master = []
-lmfit_single_exp_fit_cap_varieables_master = []
-lmfit_single_exp_fit_parameters = []
-lmfit_double_exp_10min_windows_master = []
-lmfit_single_exp_10min_windows_master = []
-cond_time_chunks_master = []
-end_cond_master = []
-pH_time_steps = []
+"""24.1 Render a plot with a reused figure"""
+def render_plot(renderer, payload, save_file_path, PLOT_DPI):
+    """
+        This function puts the data of one plot (payload) on the figure of function #24 and saves it to (save_file_path).
+        
+        (payload) is a dictionary with only what changes from one plot to the next:
+            'voltage_window': x (seconds), current, voltage, ylim, title, text
+            'single_fit' / 'double_fit': data_x, data_y, fit_x, fit_params, intercept, xlim, title, text (double only)
+        A fit plot gets only the fit determined variables of the spike (fit_params, function #8.56), the fit curve and the two single exponentials 
+        of a double fit are made here by function #8.54, so the curves are not made in the main process and sent to the plot workers.
+        The axis limits that pyplot would have found on its own are set from the data, with the same 5% margins.
+    """
+    def with_margins(low, high):
+        margin = (high - low) * 0.05
+        return(low - margin, high + margin)
+    
+    ax = renderer['ax']
+    renderer['title'].set_text(payload['title'])
+    if 'text' in renderer:
+        renderer['text'].txt.set_text(payload['text'])
+    
+    if renderer['plot_type'] == 'voltage_window':
+        x = np.asarray(payload['x'], dtype = np.float64)
+        renderer['current'].set_offsets(np.column_stack((x, np.asarray(payload['current'], dtype = np.float64))))
+        renderer['voltage'].set_offsets(np.column_stack((x, np.asarray(payload['voltage'], dtype = np.float64))))
+        ax.set_xlim(*with_margins(x[0], x[-1]))
+        renderer['ax2'].set_xlim(ax.get_xlim())
+        ax.set_ylim(*payload['ylim'])
+    
+    else:
+        data_y = np.asarray(payload['data_y'], dtype = np.float64)
+        renderer['data'].set_offsets(np.column_stack((np.asarray(payload['data_x'], dtype = np.float64), data_y)))
+        fit_y_data, fit_parts = exp_fit_curves(payload['fit_params'], len(payload['fit_x']))        # Function #8.54
+        renderer['fit'].set_data(payload['fit_x'], fit_y_data)
+        for fit_part_line, fit_part in zip(renderer['fit_parts'], fit_parts):
+            fit_part_line.set_data(payload['fit_x'], fit_part)
+        renderer['intercept'].set_segments([[(payload['xlim'][0], payload['intercept']), (payload['xlim'][1], payload['intercept'])]])
+        ax.set_xlim(*payload['xlim'])
+        
+        y_values = [data_y, fit_y_data, np.array([payload['intercept']], dtype = np.float64)] + fit_parts
+        y_values = np.concatenate(y_values)
+        y_values = y_values[np.isfinite(y_values)]
+        if len(y_values):
+            ax.set_ylim(*with_margins(y_values.min(), y_values.max()))
+    
+    renderer['figure'].savefig(save_file_path, dpi = PLOT_DPI, bbox_inches = 'tight')
 
-global_conductance_trends_folder = [f"global_conductance_trends_{file_tag}"]
 
-try:
-    os.mkdir(os.path.join(save_path, global_conductance_trends_folder[0]))    # makes a folder to save everything in (master folder)
-except OSError as error:
-    print(error)
+"""24.2 Render a chunk of plot jobs"""
+def render_plot_chunk(plot_jobs, PLOT_DPI):
+    """
+        This function renders plot jobs, (plot_type, payload, save_file_path), one at a time as they come, making one figure for each plot type (function #24) and reusing it
+        for every job of that type (function #24.1). It is what each worker process of function #24.3 runs.
+        
+        1. number_of_plots, number of plots saved
+    """
+    renderers = {}
+    number_of_plots = 0
+    for plot_type, payload, save_file_path in plot_jobs:
+        if plot_type not in renderers:
+            renderers[plot_type] = new_plot_renderer(plot_type)        # Function #24
+        render_plot(renderers[plot_type], payload, save_file_path, PLOT_DPI)        # Function #24.1
+        number_of_plots += 1
+    
+    return(number_of_plots)
 
-plots_folder_name = ["plot_files"]
-raw_data_plots_folder_name = ["raw_data_plots"]
-noise_plot_folder_name = ["noise_plots"]
-double_fit_plots_folder_name = ["double_fit_plots"]
-fit_vals_plots_folder_name = ["fit_vals_plots"]
-npy_file_folder_name = ["data_sets"]
-lmfit_double_fit_plots_folder_name = ["lmfit_double_exp caps_and_fits"]
-lmfit_double_fit_vals_plots_folder_name = ["lmfit_double_exp_fit_variables"]
-lmfit_single_fit_plots_folder_name = ["lmfit_single_exp_caps_and_fits"]
-lmfit_single_fit_vals_plots_folder_name = ["lmfit_single_exp_fit_variables"]
 
-files_to_analyze, save_file_names, pHs = list_of_files(path, common_name, file_tag, pH_in_label)         # Function #1
+"""24.3 Plot job queue"""
+def render_plot_jobs(plot_jobs, PLOT_DPI, number_of_plot_workers = 1, render_plots = True, plot_chunk_size = 16):
+    """
+        This function saves every plot in (plot_jobs), an iterable of (plot_type, payload, save_file_path). Only the payload of a plot (the fit
+        variables and the slice of raw data it shows) is passed to the workers, never the full recording.
+        
+        With (number_of_plot_workers) greater than 1 the jobs are put into chunks of (plot_chunk_size) and rendered by a pool of processes
+        (function #24.2), no more than two chunks per worker are waiting at a time so the payloads of all the plots are never held at once.
+        With 1 the plots are rendered one after the other in this process. With (render_plots) = False nothing is rendered.
+        
+        1. number_of_plots, number of plots saved
+    """
+    if not render_plots:
+        return(0)
+    if number_of_plot_workers <= 1:
+        return(render_plot_chunk(plot_jobs, PLOT_DPI))        # Function #24.2
+    
+    def collect(done):
+        return(sum([future.result() for future in done]))
+    
+    number_of_plots = 0
+    pending = set()
+    plot_chunk = []
+    with ProcessPoolExecutor(max_workers = number_of_plot_workers) as executor:
+        for plot_job in plot_jobs:
+            plot_chunk.append(plot_job)
+            if len(plot_chunk) < plot_chunk_size:
+                continue
+            if len(pending) >= 2 * number_of_plot_workers:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                number_of_plots += collect(done)
+            pending.add(executor.submit(render_plot_chunk, plot_chunk, PLOT_DPI))        # Function #24.2
+            plot_chunk = []
+        if plot_chunk:
+            pending.add(executor.submit(render_plot_chunk, plot_chunk, PLOT_DPI))
+        done, pending = wait(pending)
+        number_of_plots += collect(done)
+    
+    return(number_of_plots)
 
-# test = [1]
-for i in range(len(files_to_analyze)):
-# for i in range(len(test)):
-    # global count
-    count = i
-    analysis_title = files_to_analyze[i]
-    # logger_name = analysis_title
-    raw_current, raw_voltage, x_data_index_master = open_bin_data(path, analysis_title)         # Function #2
-    acquisition_rate, gain, bessel_filter = read_text_file(path, analysis_title)        # Function #3
 
-    """USER INPUT REQUIRED""" #assign the path/location for the analysis to be saved
-    save_file_folder_name = save_file_names[i]
+"""16. Analyze one pH file"""
+def analyze_pH_file(path_to_file, file_name, path_to_save, save_file_folder_name, *, pos_time, neg_time, zero_time, time_steps_seconds, conductance_final_plot_data_seconds, voltage_switch_threshold, seconds_after_spike, cap_data_backstep_seconds, data_per_cap_spike_seconds, cond_data_location_seconds, fit_offset, raw_current_data_seen, memory_map_bin_files, streaming_mode, number_of_fit_workers = 1, fit_backend = 'lmfit', warm_start_fits = False, single_exp_fit_mode = 'lmfit', keep_fit_curves = True, result_cache_folder = None, result_cache_size_limit_mb = 2048, hash_bin_file_contents = False, number_of_plot_workers = 1, render_plots = True, stage_reports = False, trace_stage_memory = False, PLOT_DPI = 180):
+    """
+        This function runs the conductance analysis of one pH file (functions #2 - #7.64) with the user inputs from the DATA INPUT section.
+        Every file is independent of the others, so function #17 can run this function for many files at the same time in separate processes.
+        The user defined values that are in seconds are turned into datapoints here with the acquisition rate of this file.
+        The settings after (save_file_folder_name) can only be given by name (ANALYSIS_SETTING_NAMES, function #17).
+        
+        The fitting and plotting steps of each spike and voltage window (functions #5.5 - #5.75, #7.25 and #8 - #14, #21 - #22) are not run here, they
+        were all turned off in the main loop. Function #26 runs them on the switch table of function #7 (switch_table_index) for the benchmark.
+        With a (result_cache_folder) the switch index's, switch table and conductance are saved there (functions #2.5 - #2.54) and loaded back
+        the next time this file is analyzed with the same settings, so only the stages whose settings changed are run again.
+        With (stage_reports) on every numbered function is timed (function #19.1) and the report is saved as stage_report.json in the save folder of this file.
+        (PLOT_DPI) is the resolution of the plots of this file, it is passed to the plotting functions so the worker processes of function #17 use it too.
+        
+        1. time_chunks, conductance time chunks of this file (same as one entry of cond_time_chunks_master)
+        2. end_cond, conductance values from the end of this file (same as one entry of end_cond_master)
+        3. time_steps, number of time steps in this file
+    """
+    analysis_title = file_name
+    stage_report = new_stage_report(analysis_title, trace_stage_memory) if stage_reports else None        # Function #19
+    raw_current, raw_voltage, x_data_index_master = timed_stage(stage_report, "2. open_bin_data", None, open_bin_data, path_to_file, analysis_title, memory_map_bin_files or streaming_mode)         # Function #2
+    acquisition_rate, gain, bessel_filter = timed_stage(stage_report, "3. read_text_file", None, read_text_file, path_to_file, analysis_title)        # Function #3
     
-    make_save_folders(save_path, save_file_folder_name, plots_folder_name, raw_data_plots_folder_name, noise_plot_folder_name, double_fit_plots_folder_name, fit_vals_plots_folder_name, npy_file_folder_name, lmfit_double_fit_plots_folder_name, lmfit_double_fit_vals_plots_folder_name, lmfit_single_fit_plots_folder_name, lmfit_single_fit_vals_plots_folder_name)        # Function #4
+    timed_stage(stage_report, "4. make_save_folders", None, make_save_folders, path_to_save, save_file_folder_name, plots_folder_name, raw_data_plots_folder_name, noise_plot_folder_name, double_fit_plots_folder_name, fit_vals_plots_folder_name, npy_file_folder_name, lmfit_double_fit_plots_folder_name, lmfit_double_fit_vals_plots_folder_name, lmfit_single_fit_plots_folder_name, lmfit_single_fit_vals_plots_folder_name)        # Function #4
     
-    # plotting_raw_data(raw_current, raw_voltage, x_data_index_master, acquisition_rate, analysis_title, save_path, save_file_folder_name, plots_folder_name, raw_data_plots_folder_name)
+    total_voltage_cycle_time = pos_time + neg_time + (zero_time*2)
+    time_steps = int(round(((len(raw_voltage)/acquisition_rate)/time_steps_seconds),0))         # used for global trend plotting
+    conductance_plot_data = int(conductance_final_plot_data_seconds/total_voltage_cycle_time)
+    dp_after_spike = seconds_to_datapoints(seconds_after_spike, acquisition_rate)         # Function #2.41
+    cap_data_backstep = (cap_data_backstep_seconds * acquisition_rate)
+    data_per_cap_spike = seconds_to_datapoints(data_per_cap_spike_seconds, acquisition_rate)
+    cond_datapoints = seconds_to_datapoints(cond_data_location_seconds, acquisition_rate)
+    result_cache = make_result_cache(result_cache_folder, result_cache_size_limit_mb, path_to_file, analysis_title, hash_bin_file_contents)        # Function #2.5
     
-    # plot_all_raw_data_on_one_subplot(raw_current, raw_voltage, x_data_index_master, acquisition_rate, analysis_title, save_path, save_file_folder_name, plots_folder_name, raw_data_plots_folder_name)
+    if streaming_mode:
+        time_chunks, end_cond = timed_stage(stage_report, "7.64 streaming_conductance_calculation", lambda result: len(result[2]) + len(result[3]) + len(result[4]), streaming_conductance_calculation, path_to_file, analysis_title, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, time_steps, conductance_plot_data)[:2]        # Function #7.64
+    else:
+        current_switch_index = timed_stage(stage_report, "6. voltage_switch_index", len, cached_stage, result_cache, "voltage_switch_index", (voltage_switch_threshold, acquisition_rate, dp_after_spike), voltage_switch_index, raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike)        # Function #6 (through function #2.54)
+        
+        switch_table = timed_stage(stage_report, "7. parse_current_from_v_switchs", len, cached_stage, result_cache, "switch_table", (np.asarray(current_switch_index, dtype = np.int64), cap_data_backstep, data_per_cap_spike, voltage_switch_threshold, cond_datapoints), parse_current_from_v_switchs, current_switch_index, raw_current, raw_voltage, acquisition_rate, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold, cond_datapoints)        # Function #7 (through function #2.54)
+        
+        time_chunks, end_cond = timed_stage(stage_report, "7.5 conductance_calculation", None, conductance_calculation, switch_table, cond_datapoints, time_steps, conductance_plot_data, result_cache)
     
-    # create_error_log_file(analysis_title, pHs, save_path, save_file_folder_name, logger_name)       # Function #5
+    save_stage_report(stage_report, os.path.join(path_to_save, save_file_folder_name[0], "stage_report.json"))        # Function #19.2
+    print(f"done analyzing {analysis_title}")
     
-    pos_time = 3        # enter amount of time spent applying positive voltege
-    neg_time = 3        # enter amount of time spent applying negative voltege
-    zero_time = 10      # enter amount of time spent applying zero voltege
-    total_voltage_cycle_time = pos_time + neg_time + (zero_time*2)       # input the total time it takes to complete one voltage cycle: 3 + 10 + 3 + 10 = 26 seconds
-    longest_run = 0       # enter which run was your longest to help with labeling, starts at 0.
+    return(time_chunks, end_cond, time_steps)
+
+
+"""17. Analyze all pH files, in parallel"""
+ANALYSIS_SETTING_NAMES = ('pos_time', 'neg_time', 'zero_time', 'time_steps_seconds', 'conductance_final_plot_data_seconds', 'voltage_switch_threshold', 'seconds_after_spike', 
+                          'cap_data_backstep_seconds', 'data_per_cap_spike_seconds', 'cond_data_location_seconds', 'fit_offset', 'raw_current_data_seen', 'memory_map_bin_files', 
+                          'streaming_mode', 'number_of_fit_workers', 'fit_backend', 'warm_start_fits', 'single_exp_fit_mode', 'keep_fit_curves', 'result_cache_folder', 
+                          'result_cache_size_limit_mb', 'hash_bin_file_contents', 'number_of_plot_workers', 'render_plots', 'stage_reports', 'trace_stage_memory', 'PLOT_DPI')      # settings of function #16, given to it by name
+
+def analyze_pH_files(path_to_file, files_to_analyze, path_to_save, save_file_names, analysis_settings, number_of_workers):
+    """
+        This function runs function #16 for every file in (files_to_analyze). With (number_of_workers) greater than 1 the files are handed out to a
+        pool of that many processes (concurrent.futures.ProcessPoolExecutor) so that several pH files are analyzed at the same time. With 1 the files
+        are analyzed one after the other in this process.
+        
+        The results are collected in the same order as (files_to_analyze) (pH order), no matter which file finishes first, so the global plots come
+        out the same either way.
+        
+        (analysis_settings) is a dictionary of the user inputs in ANALYSIS_SETTING_NAMES ({setting name: value}), they are passed to function #16 by name.
+        
+        1. cond_time_chunks_master, conductance time chunks for all files
+        2. end_cond_master, end conductance values for all files
+        3. pH_time_steps, number of time steps in each file
+    """
+    number_of_files = len(files_to_analyze)
+    file_arguments = [[path_to_file]*number_of_files, files_to_analyze, [path_to_save]*number_of_files, save_file_names]
+    analyze_with_settings = partial(analyze_pH_file, **{setting_name: analysis_settings[setting_name] for setting_name in ANALYSIS_SETTING_NAMES})
+    
+    if number_of_workers > 1:
+        with ProcessPoolExecutor(max_workers = number_of_workers) as executor:
+            pH_file_results = list(executor.map(analyze_with_settings, *file_arguments))         # map returns the results in the order of the files
+    else:
+        pH_file_results = list(map(analyze_with_settings, *file_arguments))
+    
+    cond_time_chunks_master = []
+    end_cond_master = []
+    pH_time_steps = []
+    for time_chunks, end_cond, time_steps in pH_file_results:
+        cond_time_chunks_master.append(time_chunks)
+        end_cond_master.append(end_cond)
+        pH_time_steps.append(time_steps)
+    
+    return(cond_time_chunks_master, end_cond_master, pH_time_steps)
+
+
+"""18. Analyze only the new or changed pH files"""
+RESULT_SETTING_NAMES = ('pos_time', 'neg_time', 'zero_time', 'time_steps_seconds', 'conductance_final_plot_data_seconds', 'voltage_switch_threshold', 'seconds_after_spike', 
+                        'cap_data_backstep_seconds', 'data_per_cap_spike_seconds', 'cond_data_location_seconds', 'fit_offset', 'fit_backend', 'warm_start_fits', 'single_exp_fit_mode')      # settings of function #16 that change its results, the others only change the speed, memory, plots or reports
+
+def analyze_pH_files_incremental(path_to_file, files_to_analyze, path_to_save, save_file_names, analysis_settings, number_of_workers, manifest_path):
+    """
+        This function runs function #17 on only the files in (files_to_analyze) that are new or have changed since the last run, and merges their results
+        with the saved results of the other files. What was analyzed is kept in a manifest file (manifest_path) in the save folder: the size and
+        modification time of each .bin and .txt file, the (analysis_settings) in RESULT_SETTING_NAMES it was analyzed with (by name), and its results from function #16.
+        
+        A file is analyzed again if it is not in the manifest, the size or modification time of its .bin or .txt file changed, or one of the settings
+        in RESULT_SETTING_NAMES changed. Settings that only change the speed, memory use, plots or reports (the number of workers, memory mapping,
+        streaming, the result cache, PLOT_DPI, ...) do not make the files be analyzed again.
+        Files that are no longer in (files_to_analyze) are dropped from the manifest.
+        
+        1. cond_time_chunks_master, conductance time chunks for all files (same as function #17)
+        2. end_cond_master, end conductance values for all files
+        3. pH_time_steps, number of time steps in each file
+    """
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'rb') as manifest_file:
+            manifest = pickle.load(manifest_file)
+    
+    result_settings = repr([(setting_name, analysis_settings[setting_name]) for setting_name in RESULT_SETTING_NAMES])
+    
+    file_stamps = {}
+    files_to_update = []
+    save_names_to_update = []
+    for file_name, save_file_name in zip(files_to_analyze, save_file_names):
+        bin_file_stat = os.stat(os.path.join(path_to_file, file_name + ".bin"))
+        txt_file_stat = os.stat(os.path.join(path_to_file, file_name + ".txt"))
+        file_stamps[file_name] = (bin_file_stat.st_size, bin_file_stat.st_mtime_ns, txt_file_stat.st_size, txt_file_stat.st_mtime_ns, result_settings)
+        if file_name not in manifest or manifest[file_name]['stamp'] != file_stamps[file_name]:
+            files_to_update.append(file_name)
+            save_names_to_update.append(save_file_name)
+    print(f"incremental analysis: {len(files_to_update)} new or changed files, {len(files_to_analyze) - len(files_to_update)} files loaded from {manifest_path}")
+    
+    if files_to_update:
+        pH_file_results = analyze_pH_files(path_to_file, files_to_update, path_to_save, save_names_to_update, analysis_settings, number_of_workers)        # Function #17
+        for file_name, time_chunks, end_cond, time_steps in zip(files_to_update, *pH_file_results):
+            manifest[file_name] = {'stamp': file_stamps[file_name], 'results': (time_chunks, end_cond, time_steps)}
+    
+    manifest = {file_name: manifest[file_name] for file_name in files_to_analyze}
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'wb') as manifest_file:
+        pickle.dump(manifest, manifest_file, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, manifest_path)
+    
+    cond_time_chunks_master = [manifest[file_name]['results'][0] for file_name in files_to_analyze]
+    end_cond_master = [manifest[file_name]['results'][1] for file_name in files_to_analyze]
+    pH_time_steps = [manifest[file_name]['results'][2] for file_name in files_to_analyze]
+    
+    return(cond_time_chunks_master, end_cond_master, pH_time_steps)
+
+
+"""19. Stage timing and memory report"""
+def new_stage_report(report_name, trace_memory = False):
+    """
+        This function starts a report of the time and memory each numbered function takes for one file (or for the global steps), filled in by
+        function #19.1 and written out by function #19.2. With (trace_memory) on, the peak Python memory of each stage is found with tracemalloc,
+        which makes the stages a lot slower, so it is off by default.
+        
+        1. stage_report, dictionary with the (report_name), (trace_memory) and a list of the stages run so far
+    """
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
     
-    time_steps_seconds = 52           #used for global trend plotting, must be a multiple of 26 seconds (156 = 2.6 minutes, 312 = slightly above 5 minutes (5.2 min), 624 = slightly above ten minutes)
+    return({'name': report_name, 'trace_memory': trace_memory, 'stages': []})
+
+
+def peak_rss_mb():
+    """
+        1. peak_rss, largest resident memory of this process so far in MB (None where the resource module is missing, Windows)
+    """
+    if resource is None:
+        return(None)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
     
-    time_steps = int(round(((len(raw_voltage)/acquisition_rate)/time_steps_seconds),0))         # used for global trend plotting
+    return(max_rss / 1024**2 if sys.platform == 'darwin' else max_rss / 1024)         # bytes on macOS, kB on Linux
+
+
+"""19.1 Run a stage and time it"""
+def timed_stage(stage_report, stage_name, stage_items, stage_function, *args, **kwargs):
+    """
+        This function runs stage_function(*args, **kwargs) and adds its wall time, CPU time, peak memory and item count to (stage_report).
+        With (stage_report) = None the stage is only run.
+        
+        The CPU time includes worker processes that have finished by the end of the stage (the fit and plot pools of functions #8.3 and #24.3).
+        (stage_items) is the number of things the stage handled (switches, spikes, fits, plots), or a function that finds it from the result, or None.
+        
+        1. result, what stage_function returned
+    """
+    if stage_report is None:
+        return(stage_function(*args, **kwargs))
+    
+    if stage_report['trace_memory']:
+        tracemalloc.reset_peak()
+    start_times = os.times()
+    start_wall = time.perf_counter()
+    result = stage_function(*args, **kwargs)
+    wall_seconds = time.perf_counter() - start_wall
+    stop_times = os.times()
+    cpu_seconds = sum(stop_times[:4]) - sum(start_times[:4])         # user + system, this process and finished children
+    
+    stage_report['stages'].append({'stage': stage_name, 
+                                   'wall_seconds': wall_seconds, 
+                                   'cpu_seconds': cpu_seconds, 
+                                   'peak_rss_mb': peak_rss_mb(), 
+                                   'peak_traced_mb': tracemalloc.get_traced_memory()[1] / 1024**2 if stage_report['trace_memory'] else None, 
+                                   'items': stage_items(result) if callable(stage_items) else stage_items})
+    
+    return(result)
+
+
+"""19.2 Save a stage report"""
+def save_stage_report(stage_report, report_path):
+    """
+        This function writes (stage_report) to the JSON file (report_path), with the total wall and CPU time of all its stages.
+        
+        1. report_path
+    """
+    if stage_report is None:
+        return(None)
+    stage_report['total_wall_seconds'] = sum([stage['wall_seconds'] for stage in stage_report['stages']])
+    stage_report['total_cpu_seconds'] = sum([stage['cpu_seconds'] for stage in stage_report['stages']])
     
-    pH_time_steps.append(time_steps)
+    temp_path = f"{report_path}.tmp"
+    with open(temp_path, 'w') as report_file:
+        json.dump(stage_report, report_file, indent = 2)
+    os.replace(temp_path, report_path)
     
-    time_steps_in_minutes_for_legends = time_steps_seconds/60
+    return(report_path)
+
+
+"""20. Stage report summary"""
+def stage_report_summary(report_paths):
+    """
+        This function reads the stage reports of function #19.2 in (report_paths) (reports that are missing are skipped) and prints a table with the
+        total time of each stage summed over all the reports, the slowest stages first, and the total of each report.
+        
+        1. summary_rows, list of [stage, number of reports, wall seconds, CPU seconds, largest peak RSS in MB, items] for each stage
+    """
+    stage_reports = []
+    for report_path in report_paths:
+        if os.path.exists(report_path):
+            with open(report_path) as report_file:
+                stage_reports.append(json.load(report_file))
+    
+    stage_totals = {}
+    for stage_report in stage_reports:
+        for stage in stage_report['stages']:
+            totals = stage_totals.setdefault(stage['stage'], [stage['stage'], 0, 0.0, 0.0, None, None])
+            totals[1] += 1
+            totals[2] += stage['wall_seconds']
+            totals[3] += stage['cpu_seconds']
+            if stage['peak_rss_mb'] is not None:
+                totals[4] = max(totals[4] or 0, stage['peak_rss_mb'])
+            if stage['items'] is not None:
+                totals[5] = (totals[5] or 0) + stage['items']
+    summary_rows = sorted(stage_totals.values(), key = lambda totals: totals[2], reverse = True)
+    
+    print(f"{'stage':<40}{'runs':>6}{'wall (s)':>12}{'CPU (s)':>12}{'peak RSS (MB)':>15}{'items':>10}")
+    for stage, runs, wall_seconds, cpu_seconds, peak_rss, items in summary_rows:
+        print(f"{stage:<40}{runs:>6}{wall_seconds:>12.2f}{cpu_seconds:>12.2f}{'' if peak_rss is None else f'{peak_rss:.0f}':>15}{'' if items is None else items:>10}")
+    for stage_report in stage_reports:
+        print(f"{stage_report['name']:<40}{len(stage_report['stages']):>6}{stage_report['total_wall_seconds']:>12.2f}{stage_report['total_cpu_seconds']:>12.2f}")
+    
+    return(summary_rows)
+
+
+"""25. Synthetic recording"""
+def synthetic_recording_segments(duration_seconds, acquisition_rate, pos_time = 3, neg_time = 3, zero_time = 10, applied_voltage = 100, conductance = 10, spike_amplitudes = (14000, 3000), spike_taus = (0.002, 0.02), current_noise = 5, voltage_noise = 0.05, seed = 0):
+    """
+        This function makes a synthetic recording that follows the voltage cycle of the experiments: (pos_time) seconds at +(applied_voltage) mV,
+        (zero_time) seconds at 0 mV, (neg_time) seconds at -(applied_voltage) mV and (zero_time) seconds at 0 mV, repeated for (duration_seconds).
+        The current is (conductance) nS times the voltage (pA), with a double exponential capacitance spike at every voltage switch
+        (spike_amplitudes in pA, spike_taus in seconds, the sign follows the voltage step) and gaussian noise on the current and the voltage.
+        
+        The recording is made one voltage segment at a time, so long recordings never have to be held in RAM.
+        
+        yields (raw_current, raw_voltage) of each voltage segment, numpy arrays in pA and mV
+    """
+    rng = np.random.default_rng(seed)
+    voltage_cycle = [(applied_voltage, pos_time), (0, zero_time), (-applied_voltage, neg_time), (0, zero_time)]
+    samples_left = int(duration_seconds * acquisition_rate)
+    previous_voltage = 0
+    segment = 0
+    while samples_left > 0:
+        voltage, segment_time = voltage_cycle[segment % len(voltage_cycle)]
+        segment_samples = min(int(segment_time * acquisition_rate), samples_left)
+        spike_time = np.arange(segment_samples) / acquisition_rate
+        voltage_step = voltage - previous_voltage
+        cap_spike = np.sign(voltage_step) * (spike_amplitudes[0] * np.exp(-spike_time / spike_taus[0]) + spike_amplitudes[1] * np.exp(-spike_time / spike_taus[1]))
+        
+        raw_current = conductance * voltage + cap_spike + rng.normal(0, current_noise, segment_samples)
+        raw_voltage = voltage + rng.normal(0, voltage_noise, segment_samples)
+        yield (raw_current, raw_voltage)
+        
+        previous_voltage = voltage
+        samples_left -= segment_samples
+        segment += 1
+
+
+"""25.1 Write a synthetic .bin/.txt pair"""
+def write_synthetic_recording(path_to_file, file_name, duration_seconds, acquisition_rate, **synthetic_settings):
+    """
+        This function writes the synthetic recording of function #25 as (file_name).bin, big-endian 64 bit current and voltage values one after the
+        other (what function #2 reads), and the (file_name).txt metadata file that function #3 reads the acquisition rate from.
+        The files are not written again if they are already there with the right size.
+        
+        (synthetic_settings) are passed on to function #25.
+        
+        1. file_name
+    """
+    bin_file_path = os.path.join(path_to_file, file_name + ".bin")
+    bin_file_size = int(duration_seconds * acquisition_rate) * BIN_SAMPLE_DTYPE.itemsize
+    if not (os.path.exists(bin_file_path) and os.path.getsize(bin_file_path) == bin_file_size and os.path.exists(os.path.join(path_to_file, file_name + ".txt"))):
+        with open(bin_file_path, 'wb') as bin_file:
+            for raw_current, raw_voltage in synthetic_recording_segments(duration_seconds, acquisition_rate, **synthetic_settings):         # Function #25
+                raw_data = np.empty(len(raw_current), dtype = BIN_SAMPLE_DTYPE)
+                raw_data['current'] = raw_current
+                raw_data['voltage'] = raw_voltage
+                raw_data.tofile(bin_file)
+        
+        with open(os.path.join(path_to_file, file_name + ".txt"), 'w') as metadata_file:
+            metadata_file.writelines([f"{file_name}\n", f"Acquisition Rate (Hz): {acquisition_rate}\n", "Synthetic recording (function #25)\n", "Axopatch Gain: 1\n"] + ["\n"]*6 + ["Bessel Filter: none\n"])
+    
+    return(file_name)
+
+
+"""26. Benchmark"""
+def run_benchmark(benchmark_folder, durations_seconds, acquisition_rates, pos_time, neg_time, zero_time, time_steps_seconds, conductance_final_plot_data_seconds, voltage_switch_threshold, seconds_after_spike, cap_data_backstep_seconds, data_per_cap_spike_seconds, cond_data_location_seconds, fit_offset, number_of_fit_workers = 1, fit_backend = 'lmfit', single_exp_fit_mode = 'lmfit', include_fits = True, include_plots = False, number_of_plot_workers = 1, raw_current_data_seen = 100, trace_memory = False, PLOT_DPI = 180):
+    """
+        This function times each stage of the analysis on synthetic recordings (functions #25 - #25.1) of every length in (durations_seconds) at every
+        rate in (acquisition_rates), so speedups can be measured on the same data every time. The recordings are saved in (benchmark_folder) and
+        reused by later runs. Each stage is timed with function #19.1: opening the file (#2, #3), the voltage switches (#6), the switch table (#7), the
+        conductance (#7.5), the streaming conductance (#7.64), the fits (#8, #9) with (include_fits), and the per window and per spike plots
+        (#7.25, #13, #10) with (include_plots), saved at (PLOT_DPI). Nothing is cached.
+        
+        The report of each recording is saved as benchmark_<file name>.json in (benchmark_folder) (function #19.2) and the wall time of every stage
+        is printed for every recording.
+        
+        1. benchmark_reports, list of the stage reports of every recording
+    """
+    benchmark_reports = []
+    for acquisition_rate in acquisition_rates:
+        for duration_seconds in durations_seconds:
+            file_name = f"synthetic_GvpH1_pH7-00_{duration_seconds}s_{acquisition_rate}Hz"
+            stage_report = new_stage_report(file_name, trace_memory)        # Function #19
+            timed_stage(stage_report, "25.1 write_synthetic_recording", None, write_synthetic_recording, benchmark_folder, file_name, duration_seconds, acquisition_rate, pos_time = pos_time, neg_time = neg_time, zero_time = zero_time)        # Function #25.1
+            
+            raw_current, raw_voltage, x_data_index_master = timed_stage(stage_report, "2. open_bin_data", None, open_bin_data, benchmark_folder, file_name)         # Function #2
+            acquisition_rate, gain, bessel_filter = timed_stage(stage_report, "3. read_text_file", None, read_text_file, benchmark_folder, file_name)        # Function #3
+            
+            total_voltage_cycle_time = pos_time + neg_time + (zero_time*2)
+            time_steps = max(int(round(((len(raw_voltage)/acquisition_rate)/time_steps_seconds),0)), 1)
+            conductance_plot_data = int(conductance_final_plot_data_seconds/total_voltage_cycle_time)
+            dp_after_spike = seconds_to_datapoints(seconds_after_spike, acquisition_rate)         # Function #2.41
+            cap_data_backstep = (cap_data_backstep_seconds * acquisition_rate)
+            data_per_cap_spike = seconds_to_datapoints(data_per_cap_spike_seconds, acquisition_rate)
+            cond_datapoints = seconds_to_datapoints(cond_data_location_seconds, acquisition_rate)
+            
+            current_switch_index = timed_stage(stage_report, "6. voltage_switch_index", len, voltage_switch_index, raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike)        # Function #6
+            switch_table = timed_stage(stage_report, "7. parse_current_from_v_switchs", len, parse_current_from_v_switchs, current_switch_index, raw_current, raw_voltage, acquisition_rate, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold, cond_datapoints)        # Function #7
+            pos_caps_index = switch_table_index(switch_table, "pos")
+            neg_caps_index = switch_table_index(switch_table, "neg")
+            zero_caps_index = switch_table_index(switch_table, "zero")
+            timed_stage(stage_report, "7.5 conductance_calculation", None, conductance_calculation, switch_table, cond_datapoints, time_steps, conductance_plot_data)        # Function #7.5
+            timed_stage(stage_report, "7.64 streaming_conductance_calculation", lambda result: len(result[2]) + len(result[3]) + len(result[4]), streaming_conductance_calculation, benchmark_folder, file_name, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, time_steps, conductance_plot_data)        # Function #7.64
+            
+            if include_fits:
+                double_exp_fits = timed_stage(stage_report, "8. fitting_cap_spikes_w_lmfit_double_exp", lambda result: len(result[1][0]), fitting_cap_spikes_w_lmfit_double_exp, pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, time_steps, data_per_cap_spike, number_of_fit_workers, fit_backend = fit_backend)          # Function #8
+                single_exp_fits = timed_stage(stage_report, "9. fitting_cap_spikes_w_lmfit_single_exp", lambda result: len(result[1][0]), fitting_cap_spikes_w_lmfit_single_exp, pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, time_steps, fit_mode = single_exp_fit_mode)         # Function #9
+            
+            if include_plots:
+                save_file_folder_name = [f"{file_name}_benchmark"]
+                make_save_folders(benchmark_folder, save_file_folder_name, plots_folder_name, raw_data_plots_folder_name, noise_plot_folder_name, double_fit_plots_folder_name, fit_vals_plots_folder_name, npy_file_folder_name, lmfit_double_fit_plots_folder_name, lmfit_double_fit_vals_plots_folder_name, lmfit_single_fit_plots_folder_name, lmfit_single_fit_vals_plots_folder_name)        # Function #4
+                timed_stage(stage_report, "7.25 plotting_all_applied_voltage_and_current", len(pos_caps_index) + len(neg_caps_index) + len(zero_caps_index), plotting_all_applied_voltage_and_current, pos_caps_index, neg_caps_index, zero_caps_index, raw_current, raw_voltage, acquisition_rate, pos_time, neg_time, zero_time, file_name, benchmark_folder, save_file_folder_name, plots_folder_name, raw_data_plots_folder_name, PLOT_DPI, number_of_plot_workers)        # Function #7.25
+                if include_fits:
+                    timed_stage(stage_report, "13. plotting_lmfit_double_exp_caps_and_fits", len(double_exp_fits[1][0]), plotting_lmfit_double_exp_caps_and_fits, double_exp_fits[0], double_exp_fits[1], double_exp_fits[2], raw_current, acquisition_rate, raw_current_data_seen, benchmark_folder, save_file_folder_name, plots_folder_name, lmfit_double_fit_plots_folder_name, PLOT_DPI, number_of_plot_workers)         # Function #13
+                    timed_stage(stage_report, "10. plotting_lmfit_single_exp_caps_and_fits", len(single_exp_fits[1][0]), plotting_lmfit_single_exp_caps_and_fits, single_exp_fits[1], raw_current, acquisition_rate, raw_current_data_seen, benchmark_folder, save_file_folder_name, plots_folder_name, lmfit_single_fit_plots_folder_name, PLOT_DPI, number_of_plot_workers)         # Function #10
+            
+            del raw_current, raw_voltage, x_data_index_master
+            save_stage_report(stage_report, os.path.join(benchmark_folder, f"benchmark_{file_name}.json"))        # Function #19.2
+            benchmark_reports.append(stage_report)
     
-    conductance_final_plot_data_seconds = 312         # input the number of seconds of data to use from the end of each pH run for the "final" conductance plot, must be a multiple of 26 seconds (312 = slightly above 5 minutes, 624 = slightly above ten minutes)
-    conductance_plot_data = int(conductance_final_plot_data_seconds/total_voltage_cycle_time)
+    stage_names = list(dict.fromkeys([stage['stage'] for stage_report in benchmark_reports for stage in stage_report['stages']]))
+    print(f"{'stage (wall seconds)':<48}" + "".join([f"{stage_report['name'].split('_', 3)[-1]:>18}" for stage_report in benchmark_reports]))
+    for stage_name in stage_names:
+        stage_times = [sum([stage['wall_seconds'] for stage in stage_report['stages'] if stage['stage'] == stage_name]) for stage_report in benchmark_reports]
+        print(f"{stage_name:<48}" + "".join([f"{stage_time:>18.3f}" for stage_time in stage_times]))
     
-    voltage_switch_threshold = 5        # input value theat will be used to signal a voltage switch (example: applied_voltage +/- voltage_switch_threshold = 100 +/- 5 = (105 or 95), (5 or-5), (-95 or -105))
+    return(benchmark_reports)
+
+
+"""27. Reference voltage switch index"""
+def reference_voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike):
+    """
+        The original one datapoint at a time loop of function #6, kept so function #28 can check the fast version against it. Do not speed this up.
+        
+        1. current_switch_index, list of the capacitance spike index's
+    """
+    initial_v = int(np.mean(raw_voltage[500:1000]))
     
-    seconds_after_spike = 2         # input the amount of time for the index to jump forward after detecting a voltage change (cap. spike) AND the location for the voltage values to use for the detection of the next switch
-    dp_after_spike = (seconds_after_spike * acquisition_rate)
+    current_switch_index = []
+    loop = len(raw_voltage)
+    i = 0
+    while i < loop:
+        if raw_voltage[i] > initial_v + voltage_switch_threshold or raw_voltage[i] < initial_v - voltage_switch_threshold:
+            current_switch_index.append(i)
+            initial_v = np.mean(raw_voltage[i+(dp_after_spike):i+(dp_after_spike)+500]) #sets the initial to two seconds into the current 
+            i = i + (dp_after_spike) # skips ahead time_after_spike seconds
+        else: i += 1
     
-    cap_data_backstep_seconds = 0.01        # input value for the number of seconds to backstep when collecting capacitance spike current_values (for function #7)
-    cap_data_backstep = (cap_data_backstep_seconds * acquisition_rate)
+    return(current_switch_index)
+
+
+"""27.1 Reference switch sorting"""
+def reference_parse_current_from_v_switchs(current_switch_index, raw_current, raw_voltage, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold):
+    """
+        The original loop of function #7 that sorts the voltage switches into positive, negative and zero, kept for function #28.
+        Only the index's are kept, the spike data and conductance windows are not.
+        
+        1. pos_caps_index, list of the positive voltage switch index's
+        2. neg_caps_index, list of the negative voltage switch index's
+        3. zero_caps_index, list of the zero voltage switch index's
+        4. all_cond_index, list of the first index of every conductance window
+    """
+    pos_caps_index = []
+    neg_caps_index = []
+    zero_caps_index = []
+    all_cond_index = []
     
-    data_per_cap_spike_seconds = 1          # input the mount of data to include fit with the exponential decay
-    data_per_cap_spike = (data_per_cap_spike_seconds * acquisition_rate)
+    for l in range(len(current_switch_index)): # loop through the switch index to separate oscilating current
+        first_int_index = current_switch_index[l]
+        last_index = int(first_int_index + data_per_cap_spike) # last index is one second after voltage switch
+        if last_index > len(raw_voltage): break
+        voltage_sorting = first_int_index + 10        # grabbing a stable voltage
+        if raw_voltage[voltage_sorting] > voltage_switch_threshold:
+            pos_caps_index.append(first_int_index)
+        if raw_voltage[voltage_sorting] < -voltage_switch_threshold:
+            neg_caps_index.append(first_int_index)
+        if raw_voltage[voltage_sorting] > -voltage_switch_threshold and raw_voltage[voltage_sorting]< voltage_switch_threshold:
+            zero_caps_index.append(first_int_index)
+        all_cond_index.append(last_index)
     
-    cond_data_location_seconds = 1        # amount of data to use for the time chunked conductance calculations. starts where cap spike data ends and goes for this user defined duration
-    cond_datapoints = (cond_data_location_seconds * acquisition_rate)
+    return(pos_caps_index, neg_caps_index, zero_caps_index, all_cond_index)
+
+
+"""27.2 Reference conductance calculations"""
+def reference_conductance_calculation(all_cond_index, raw_current, raw_voltage, cond_datapoints, time_steps, conductance_plot_data):
+    """
+        The original window sums and scipy.stats.linregress loop of function #7.5, kept for function #28. Nothing is added to the master lists.
+        
+        1. slope, list of the conductance of each voltage cycle
+        2. time_chunks, list of (slope) chunks
+        3. end_cond, list of the conductance values from the end of the run
+    """
+    from scipy.stats import linregress          # only this reference loop uses it, function #7.51 finds the same slopes with numpy
     
-    current_switch_index = voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike)        # Function #6
+    data_for_cond_calc = []
+    for i in range(len(all_cond_index)):
+        first_index = all_cond_index[i]
+        last_index = first_index + int(cond_datapoints)
+        current_values = raw_current[first_index:last_index]
+        current_mean = sum(current_values)/len(current_values)
+        voltage_values = raw_voltage[first_index:last_index]
+        voltage_mean = sum(voltage_values)/len(voltage_values)
+        data_for_cond_calc.append((last_index, current_mean, voltage_mean))
     
-    cap_spikes, pos_caps, pos_caps_index, neg_caps, neg_caps_index, zero_caps, zero_caps_index, all_cond_index, pos_cond_master, neg_cond_master, zero_cond_master = parse_current_from_v_switchs(current_switch_index, raw_current, raw_voltage, acquisition_rate, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold, cond_datapoints)        # Function #7
-
-    cond_time_chunks_master, end_cond_master = conductance_calculation(all_cond_index, pos_cond_master, neg_cond_master, zero_cond_master, raw_current, raw_voltage, cond_datapoints, time_steps, conductance_plot_data)
+    slope = []
+    k = 0
+    while (k+4) < len(data_for_cond_calc):
+        x_fit_data = [data_for_cond_calc[k + n][2] for n in range(4)]
+        y_fit_data = [data_for_cond_calc[k + n][1] for n in range(4)]
+        k = k + 4
+        fit_data = linregress(x_fit_data, y_fit_data, alternative='two-sided')
+        slope.append(fit_data[0])
     
-    # plotting_all_applied_voltage_and_current(pos_caps_index, neg_caps_index, zero_caps_index, raw_current, raw_voltage, acquisition_rate, pos_time, neg_time, zero_time, analysis_title, save_path, save_file_folder_name, plots_folder_name, raw_data_plots_folder_name)
+    chunk_size = (int(len(slope)/time_steps))
+    if chunk_size == 1: 
+        chunk_size = 2
+    time_chunks = [slope[i:i + chunk_size] for i in range(0, len(slope), chunk_size)]
+    end_temp = len(slope) - conductance_plot_data
+    end_cond = list(slope[end_temp:-1])
     
-    """USER INPUT REQUIRED""" # assign the number of points to remove in the current data starting from the voltage switch index, do this to handle repeating values when there is an overload during the cap. spike
-    fit_method = ('lm') # lm = Levenberg-Marquardt algorithm through scipy.optimize.leastsq
-    fit_offset = 50        # number of datapoints to move forward after voltage switch signal before fitting. (when cap spikes overload this is needed so that the oveload is not included in the fit)
-    number_of_fit_iteration = 1600
+    return(slope, time_chunks, end_cond)
+
+
+"""27.3 Reference double exponential fits"""
+def reference_double_exp_fits(cap_indexs, raw_current, fit_offset, data_per_cap_spike):
+    """
+        The original one spike at a time lmfit loop of function #8 (starting values, limits and least_squares fit of every spike), kept for function #28.
+        Only the fit determined variables are kept, nothing is added to the master lists. Do not speed this up.
+        
+        1. fitted_values, list of (a, k1, b, k2, c) for every spike in (cap_indexs)
+    """
+    def power_fitting_lmfit(params,x,y):
+        a = params['a']
+        k1 = params['k1']
+        b = params['b']
+        k2 = params['k2']
+        c = params['c']
+        y_fit = a * np.exp(-(x * (1/k1))) + b * np.exp(-(x * (1/k2))) + c
+        return y_fit-y
     
-    # lmfit_parameters, lmfit_cap_varieables, double_lmfit_log_master, lmfit_cap_varieables_master, lmfit_double_exp_10min_windows_master, ratios = fitting_cap_spikes_w_lmfit_double_exp(pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, time_steps, data_per_cap_spike)          # Function #8
+    params = Parameters()
     
-    # lmfit_single_exp_fit_parameters, lmfit_single_exp_fit_cap_varieables, lmfit_single_exp_fit_log_master, lmfit_single_exp_fit_cap_varieables_master, lmfit_single_exp_10min_windows_master = fitting_cap_spikes_w_lmfit_single_exp(pos_caps_index, neg_caps_index, raw_current, acquisition_rate, fit_offset, time_steps)         # Function #9
+    params.add('a', value = 14000, vary = True, min= 1.0, max= 40000)
+    params.add('k1', value = 20, vary = True, min= 1.0, max= 1000)
+    params.add('b', value = 10000, vary = True, min= 1.0, max= 40000)
+    params.add('k2', value = 40, vary = True, min= 1.0, max= 1000)
+    params.add('c', value = 400, vary = True, min= 1.0, max= 5000)
     
-    """USER INPUT REQUIRED""" 
-    raw_current_data_seen = 100         # assign the number of data points you want to see befor the capacitance spike (for plotting only)
+    fitted_values = []
+    for o in range(len(cap_indexs)):
+        cap_index = cap_indexs[o]
+        cap_data_first_index = cap_index + fit_offset
+        cap_data_last_index = cap_data_first_index + data_per_cap_spike
+        cap_data = abs(raw_current[cap_data_first_index:cap_data_last_index])
+        fitting_x_data = np.linspace(0, len(cap_data), num = len(cap_data), endpoint = True)
     
-    # plotting_lmfit_double_exp_caps_and_fits(lmfit_parameters, lmfit_cap_varieables, double_lmfit_log_master, raw_current, acquisition_rate, raw_current_data_seen, save_path, save_file_folder_name, plots_folder_name, lmfit_double_fit_plots_folder_name, PLOT_DPI)         # Function #13
-
-    # plotting_lmfit_double_fit_parameters(lmfit_parameters, ratios, save_path, save_file_folder_name, plots_folder_name, lmfit_double_fit_vals_plots_folder_name, PLOT_DPI)        # Function #14
+        fitted_params = minimize(power_fitting_lmfit, params, args=(fitting_x_data,cap_data), method='least_squares')
+        
+        a = fitted_params.params['a'].value
+        k1 = fitted_params.params['k1'].value
+        b = fitted_params.params['b'].value
+        k2 = fitted_params.params['k2'].value
+        c = fitted_params.params['c'].value
+        fitted_values.append((a, k1, b, k2, c))
+    
+    return(fitted_values)
 
-    # plotting_lmfit_single_exp_caps_and_fits(lmfit_single_exp_fit_cap_varieables, raw_current, acquisition_rate, raw_current_data_seen, save_path, save_file_folder_name, plots_folder_name, lmfit_single_fit_plots_folder_name, PLOT_DPI)         # Function #10
 
-    # plotting_lmfit_single_fit_parameters(lmfit_single_exp_fit_parameters, save_path, save_file_folder_name, plots_folder_name, lmfit_single_fit_vals_plots_folder_name, total_voltage_cycle_time, PLOT_DPI)         # Function #11
+"""27.4 Reference single exponential fits"""
+def reference_single_exp_fits(cap_indexs, raw_current, fit_offset, acquisition_rate):
+    """
+        The original one spike at a time lmfit loop of function #9 (one second of data after each spike), kept for function #28. Do not speed this up.
+        
+        1. fitted_values, list of (m, k, h) for every spike in (cap_indexs)
+    """
+    def power_fitting_lmfit(params,x,y):
+        m = params['m']
+        k = params['k']
+        h = params['h']
+        y_fit = m * np.exp(-(x * (1/k))) + h
+        return y_fit-y
     
-    # saving_double_lmfit_fitting_data(save_path, save_file_folder_name, npy_file_folder_name, lmfit_parameters, lmfit_cap_varieables, double_lmfit_log_master, lmfit_cap_varieables_master)      # Function #21
-                                    
-    # saving_single_lmfit_fitting_data(save_path, save_file_folder_name, npy_file_folder_name, lmfit_single_exp_fit_parameters, lmfit_single_exp_fit_cap_varieables, lmfit_single_exp_fit_log_master, lmfit_single_exp_fit_cap_varieables_master)      # Function #22
+    params = Parameters()
     
-# plotting_total_double_lmfit_tau_trends(lmfit_double_exp_10min_windows_master, pHs, save_path, save_file_folder_name, plots_folder_name, fit_vals_plots_folder_name, file_tag, time_steps, PLOT_DPI)       # Function #15
-
-# plotting_total_single_lmfit_tau_trends(lmfit_single_exp_10min_windows_master, pHs, save_path, save_file_folder_name, plots_folder_name, fit_vals_plots_folder_name, file_tag, time_steps, PLOT_DPI)       # Function #12
-
-plotting_global_conductance_trends(cond_time_chunks_master, pHs, time_steps_in_minutes_for_legends, total_voltage_cycle_time, longest_run, save_path, save_file_folder_name, plots_folder_name, global_conductance_trends_folder, PLOT_DPI)
-
-plotting_the_final_G_v_pH(pHs, end_cond_master, save_path, save_file_folder_name, plots_folder_name, global_conductance_trends_folder, PLOT_DPI)
+    params.add('m', value = 20000, vary = True, min= 1.0, max= 40000)
+    params.add('k', value = 40, vary = True, min= 1.0, max= 5000)
+    params.add('h', value = 400, vary = True, min= 1.0, max= 5000)
+    
+    fitted_values = []
+    for o in range(len(cap_indexs)):
+        cap_index = cap_indexs[o]
+        cap_data_first_index = cap_index + fit_offset
+        cap_data_last_index = cap_data_first_index + acquisition_rate
+        cap_data = abs(raw_current[cap_data_first_index:cap_data_last_index])
+        fitting_x_data = np.linspace(0, len(cap_data), num = len(cap_data), endpoint = True)
+        
+        fitted_params = minimize(power_fitting_lmfit, params, args=(fitting_x_data,cap_data,), method='least_squares')
+        
+        m = fitted_params.params['m'].value
+        k = fitted_params.params['k'].value
+        h = fitted_params.params['h'].value
+        fitted_values.append((m, k, h))
+    
+    return(fitted_values)
 
-saving_conductance_calulations(cond_time_chunks_master, save_path, save_file_folder_name, npy_file_folder_name)
 
+"""28. Regression check of the fast code paths"""
+def regression_check(path_to_file, file_name, voltage_switch_threshold, seconds_after_spike, cap_data_backstep_seconds, data_per_cap_spike_seconds, cond_data_location_seconds, fit_offset, time_steps_seconds, conductance_final_plot_data_seconds, total_voltage_cycle_time, include_fits = True, number_of_fit_workers = 2, slope_rtol = 1e-6, tau_rtol = 1e-2, closed_form_tau_rtol = 0.1):
+    """
+        This function runs the reference versions of the analysis (functions #27 - #27.4, the original loops) and the fast versions on the same recording ((file_name) in (path_to_file), a real one or a synthetic one from function #25.1), and checks
+        that they agree, so each fast mode can be turned on with confidence:
+        
+        switch index's (functions #6, #2.1 memory mapped, #7.64 streaming) and the pos/neg/zero sorting (function #7) have to be exactly the same,
+        the conductance of every voltage cycle (functions #7.5, #7.64) the same within (slope_rtol),
+        the taus of the double exponential fits (function #8 with the lmfit and scipy backends, warm starts, and (number_of_fit_workers) processes) and
+        single exponential fits (function #9 with lmfit, warm started and 'seeded') the same within (tau_rtol), and the closed form single exponential
+        taus ('fast') within (closed_form_tau_rtol). The two taus of a double exponential fit are compared as (faster, slower) so a fit that swaps them still passes.
+        
+        1. check_results, list of [check name, passed (True/False), details] for every check
+    """
+    raw_current, raw_voltage, x_data_index_master = open_bin_data(path_to_file, file_name)         # Function #2
+    acquisition_rate, gain, bessel_filter = read_text_file(path_to_file, file_name)        # Function #3
+    time_steps = max(int(round(((len(raw_voltage)/acquisition_rate)/time_steps_seconds),0)), 1)
+    conductance_plot_data = int(conductance_final_plot_data_seconds/total_voltage_cycle_time)
+    dp_after_spike = seconds_to_datapoints(seconds_after_spike, acquisition_rate)         # Function #2.41
+    cap_data_backstep = (cap_data_backstep_seconds * acquisition_rate)
+    data_per_cap_spike = seconds_to_datapoints(data_per_cap_spike_seconds, acquisition_rate)
+    cond_datapoints = seconds_to_datapoints(cond_data_location_seconds, acquisition_rate)
+    check_results = []
+    
+    def check_equal(check_name, reference_values, values):
+        reference_values = list(reference_values)
+        values = list(values)
+        passed = reference_values == values
+        details = f"{len(values)} values" if passed else f"{len(reference_values)} reference values, {len(values)} values, first difference at {next((n for n, (r, v) in enumerate(zip(reference_values, values)) if r != v), min(len(reference_values), len(values)))}"
+        check_results.append([check_name, passed, details])
+    
+    def check_close(check_name, reference_values, values, rtol):
+        reference_values = np.asarray(reference_values, dtype = np.float64)
+        values = np.asarray(values, dtype = np.float64)
+        if reference_values.shape != values.shape:
+            check_results.append([check_name, False, f"{reference_values.shape} reference values, {values.shape} values"])
+            return
+        close = np.isclose(values, reference_values, rtol = rtol, atol = 0, equal_nan = True)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            relative_difference = np.abs(values - reference_values) / np.abs(reference_values)
+        largest_difference = np.nanmax(relative_difference) if np.any(np.isfinite(relative_difference)) else 0.0
+        check_results.append([check_name, bool(np.all(close)), f"{values.size} values, {np.count_nonzero(~close)} outside rtol = {rtol}, largest relative difference {largest_difference:.2e}"])
+    
+    reference_switch_index = reference_voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike)        # Function #27
+    reference_pos_index, reference_neg_index, reference_zero_index, reference_cond_index = reference_parse_current_from_v_switchs(reference_switch_index, raw_current, raw_voltage, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold)        # Function #27.1
+    reference_slope, reference_time_chunks, reference_end_cond = reference_conductance_calculation(reference_cond_index, raw_current, raw_voltage, cond_datapoints, time_steps, conductance_plot_data)        # Function #27.2
+    
+    current_switch_index = voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike)        # Function #6
+    check_equal("6. voltage_switch_index", reference_switch_index, current_switch_index)
+    raw_data = open_bin_data_memmap(path_to_file, file_name)        # Function #2.1
+    check_equal("6. voltage_switch_index (memory mapped, #2.1)", reference_switch_index, voltage_switch_index(raw_data['voltage'], voltage_switch_threshold, acquisition_rate, dp_after_spike))
+    del raw_data
+    
+    switch_table = parse_current_from_v_switchs(current_switch_index, raw_current, raw_voltage, acquisition_rate, cap_data_backstep, data_per_cap_spike, voltage_switch_threshold, cond_datapoints)        # Function #7
+    pos_caps_index = switch_table_index(switch_table, "pos")
+    neg_caps_index = switch_table_index(switch_table, "neg")
+    zero_caps_index = switch_table_index(switch_table, "zero")
+    check_equal("7. parse_current_from_v_switchs pos", reference_pos_index, pos_caps_index)
+    check_equal("7. parse_current_from_v_switchs neg", reference_neg_index, neg_caps_index)
+    check_equal("7. parse_current_from_v_switchs zero", reference_zero_index, zero_caps_index)
+    
+    cond_time_chunks = conductance_calculation(switch_table, cond_datapoints, time_steps, conductance_plot_data)[0]        # Function #7.5
+    check_close("7.5 conductance_calculation", reference_slope, [cond for time_chunk in cond_time_chunks for cond in time_chunk], slope_rtol)
+    
+    streaming_results = streaming_conductance_calculation(path_to_file, file_name, voltage_switch_threshold, dp_after_spike, cap_data_backstep, data_per_cap_spike, cond_datapoints, time_steps, conductance_plot_data)        # Function #7.64
+    check_equal("7.64 streaming pos", reference_pos_index, streaming_results[2])
+    check_equal("7.64 streaming neg", reference_neg_index, streaming_results[3])
+    check_equal("7.64 streaming zero", reference_zero_index, streaming_results[4])
+    check_close("7.64 streaming conductance", reference_slope, [cond for time_chunk in streaming_results[0] for cond in time_chunk], slope_rtol)
+    
+    if include_fits:
+        reference_cap_indexs = list(reference_pos_index) + list(reference_neg_index)
+        cap_data_first_indexs = [cap_index + fit_offset for cap_index in reference_cap_indexs]
+        polarities = ['pos']*len(reference_pos_index) + ['neg']*len(reference_neg_index)
+        
+        def double_exp_taus(fitted_values):
+            return(np.sort(np.asarray([[fitted[1], fitted[3]] for fitted in fitted_values], dtype = np.float64).reshape(-1, 2), axis = 1))
+        
+        reference_double_taus = double_exp_taus(reference_double_exp_fits(reference_cap_indexs, raw_current, fit_offset, data_per_cap_spike))        # Function #27.3
+        check_close("8. double exp taus (lmfit backend)", reference_double_taus, double_exp_taus(fit_cap_spike_series_double_exp(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, double_exp_fit_parameters())), tau_rtol)        # Function #8.15
+        check_close("8. double exp taus (scipy backend)", reference_double_taus, double_exp_taus(fit_cap_spike_series_double_exp(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, double_exp_fit_parameters(), 'scipy')), tau_rtol)
+        check_close("8. double exp taus (warm start)", reference_double_taus, double_exp_taus(fit_cap_spike_series_double_exp(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, double_exp_fit_parameters(), 'lmfit', True)), tau_rtol)
+        if number_of_fit_workers > 1:
+            check_close(f"8. double exp taus ({number_of_fit_workers} fit workers, #8.3)", reference_double_taus, double_exp_taus(fit_cap_spikes_double_exp_parallel(raw_current, cap_data_first_indexs, polarities, data_per_cap_spike, double_exp_fit_parameters(), number_of_fit_workers, 64)), tau_rtol)
+        
+        reference_single_taus = [fitted[1] for fitted in reference_single_exp_fits(reference_cap_indexs, raw_current, fit_offset, acquisition_rate)]        # Function #27.4
+        check_close("9. single exp taus (lmfit)", reference_single_taus, [fitted[1] for fitted in fit_cap_spike_series_single_exp(raw_current, cap_data_first_indexs, polarities, acquisition_rate, single_exp_fit_parameters())], tau_rtol)        # Function #9.15
+        check_close("9. single exp taus (warm start)", reference_single_taus, [fitted[1] for fitted in fit_cap_spike_series_single_exp(raw_current, cap_data_first_indexs, polarities, acquisition_rate, single_exp_fit_parameters(), True)], tau_rtol)
+        check_close("9. single exp taus ('seeded')", reference_single_taus, [fitted[1] for fitted in fit_cap_spike_series_single_exp(raw_current, cap_data_first_indexs, polarities, acquisition_rate, single_exp_fit_parameters(), fit_mode = 'seeded')], tau_rtol)
+        check_close("9. single exp taus ('fast', closed form)", reference_single_taus, [fitted[1] for fitted in fit_cap_spike_series_single_exp(raw_current, cap_data_first_indexs, polarities, acquisition_rate, single_exp_fit_parameters(), fit_mode = 'fast')], closed_form_tau_rtol)
+    
+    for check_name, passed, details in check_results:
+        print(f"{'PASS' if passed else 'FAIL'}  {file_name}  {check_name}: {details}")
+    
+    return(check_results)
+    
 #%%
 
+#....................DATA INPUT..................
+"""USER INPUT REQUIRED""" # assign the path/location of data to be analyzed, the common tag of the data, and the tag at the end of the saved data folder
 
+path = "ENTER FILE PATH"
 
+save_path = "ENTER SAVE PATH"     # this is the path for the master folder
 
+common_name = ("ENTER COMMON TITLE")
+file_tag = ("ENTER FILE TAG TO ADD TO SAVE FOLDERS")
+pH_in_label = (1, 2)         # numbers corrispond to the groups of numbers ex. BS_p130_GvpH1_pH3-51_3_1302 === (2,3) === pH 3.51
+logger_name = common_name
+logger_name += file_tag
+PLOT_DPI = 180      
+memory_map_bin_files = False         # True = memory map each .bin file (function #2.1) instead of reading it all into RAM, use for files larger than the RAM
+streaming_mode = False          # True = find the voltage switches and calculate the conductance while reading the .bin file in blocks (function #7.64), the recording is never fully loaded
+number_of_workers = 1           # number of pH files to analyze at the same time (function #17), each one runs in its own process. 1 = one file after the other in this process
+incremental_mode = False          # True = only analyze the files that are new or changed since the last run (function #18), the results of the other files are loaded from the manifest in the save path
+result_cache_folder = None      # folder to save the results of each stage in (function #2.5), re-running with the same settings loads them instead of redoing the analysis. None = no cache
+result_cache_size_limit_mb = 2048        # largest size of the result cache folder, the results that were used the longest time ago are deleted first
+hash_bin_file_contents = False          # True = identify each .bin file in the cache by a hash of its contents instead of its size and modification time
+follow_file_name = None          # name of a .bin file (no .bin) in the path that is still being written, its conductance is printed as the run goes (function #7.65) before the analysis starts. None = off
+follow_idle_seconds = 60        # the followed run is taken to be over once its .bin file has not grown for this many seconds
+stage_reports = False         # True = time every numbered function and save a stage_report.json for each file and the global steps (function #19), with a summary table at the end (function #20)
+trace_stage_memory = False          # True = also find the peak Python memory of each stage with tracemalloc (much slower), only used with stage_reports
+benchmark_folder = None         # folder to make synthetic recordings in and time each stage on them (function #26) before the analysis starts. None = off
+benchmark_durations_seconds = (260, 2600)         # lengths of the synthetic recordings for the benchmark, in seconds
+benchmark_acquisition_rates = (10000,)          # acquisition rates of the synthetic recordings for the benchmark
+regression_check_folder = None          # folder for a synthetic recording (function #25.1), the fast code paths are checked against the reference ones (function #28) on it and on every file to analyze before the analysis starts. None = off
 
+pos_time = 3        # enter amount of time spent applying positive voltege
+neg_time = 3        # enter amount of time spent applying negative voltege
+zero_time = 10      # enter amount of time spent applying zero voltege
+total_voltage_cycle_time = pos_time + neg_time + (zero_time*2)       # input the total time it takes to complete one voltage cycle: 3 + 10 + 3 + 10 = 26 seconds
+longest_run = 0       # enter which run was your longest to help with labeling, starts at 0.
 
+time_steps_seconds = 52           #used for global trend plotting, must be a multiple of 26 seconds (156 = 2.6 minutes, 312 = slightly above 5 minutes (5.2 min), 624 = slightly above ten minutes)
+time_steps_in_minutes_for_legends = time_steps_seconds/60
 
+conductance_final_plot_data_seconds = 312         # input the number of seconds of data to use from the end of each pH run for the "final" conductance plot, must be a multiple of 26 seconds (312 = slightly above 5 minutes, 624 = slightly above ten minutes)
 
+voltage_switch_threshold = 5        # input value theat will be used to signal a voltage switch (example: applied_voltage +/- voltage_switch_threshold = 100 +/- 5 = (105 or 95), (5 or-5), (-95 or -105))
 
+seconds_after_spike = 2         # input the amount of time for the index to jump forward after detecting a voltage change (cap. spike) AND the location for the voltage values to use for the detection of the next switch
 
+cap_data_backstep_seconds = 0.01        # input value for the number of seconds to backstep when collecting capacitance spike current_values (for function #7)
 
+data_per_cap_spike_seconds = 1          # input the mount of data to include fit with the exponential decay
 
+cond_data_location_seconds = 1        # amount of data to use for the time chunked conductance calculations. starts where cap spike data ends and goes for this user defined duration
 
+"""USER INPUT REQUIRED""" # assign the number of points to remove in the current data starting from the voltage switch index, do this to handle repeating values when there is an overload during the cap. spike
+fit_method = ('lm') # lm = Levenberg-Marquardt algorithm through scipy.optimize.leastsq
+fit_offset = 50        # number of datapoints to move forward after voltage switch signal before fitting. (when cap spikes overload this is needed so that the oveload is not included in the fit)
+number_of_fit_iteration = 1600
+fit_backend = 'lmfit'           # 'lmfit' = lmfit.minimize, 'scipy' = scipy.optimize.least_squares with an analytic Jacobian (faster, same limits and starting values) for the double exp fits (function #8.1)
+single_exp_fit_mode = 'lmfit'    # 'lmfit' = full fit of every spike, 'fast' = closed form estimate only (no fitting), 'seeded' = full fit started from the closed form estimate (function #9.15)
+warm_start_fits = False          # True = start each cap. spike fit from the last fit of the same polarity (functions #8.15 and #9.15), falls back to the defaults if a fit diverges
+number_of_fit_workers = 1        # number of processes used to fit the cap. spikes of one file (function #8.3). 1 = fit one spike after the other in this process
+keep_fit_curves = True           # False = keep only the fit variables and index of each cap. spike, the fit curves are remade from the variables when plotted (function #8.55), saves a lot of memory
 
+"""USER INPUT REQUIRED""" 
+raw_current_data_seen = 100         # assign the number of data points you want to see befor the capacitance spike (for plotting only)
+render_plots = True         # False = skip saving the per window and per cap. spike plots (functions #7.25, #10 and #13)
+number_of_plot_workers = 1          # number of processes used to save the per window and per cap. spike plots (function #24.3). 1 = one plot after the other in this process
 
+parameter_master = []
+lmfit_parameters = []
+lmfit_cap_varieables_master = []
+lmfit_single_exp_fit_cap_varieables_master = []
+lmfit_single_exp_fit_parameters = []
+lmfit_double_exp_10min_windows_master = []
+lmfit_single_exp_10min_windows_master = []
 
+plots_folder_name = ["plot_files"]
+raw_data_plots_folder_name = ["raw_data_plots"]
+noise_plot_folder_name = ["noise_plots"]
+double_fit_plots_folder_name = ["double_fit_plots"]
+fit_vals_plots_folder_name = ["fit_vals_plots"]
+npy_file_folder_name = ["data_sets"]
+lmfit_double_fit_plots_folder_name = ["lmfit_double_exp caps_and_fits"]
+lmfit_double_fit_vals_plots_folder_name = ["lmfit_double_exp_fit_variables"]
+lmfit_single_fit_plots_folder_name = ["lmfit_single_exp_caps_and_fits"]
+lmfit_single_fit_vals_plots_folder_name = ["lmfit_single_exp_fit_variables"]
 
+"""29. Analysis configuration"""
+@dataclass
+class AnalysisConfig:
+    """
+        All the user inputs of the DATA INPUT section in one object, so the analysis can be run from other code (function #30) or from the command
+        line (function #31) without editing this file. The defaults are the values in the DATA INPUT section, see the comments there for what each does.
+        
+        example: run(["BS_p130_GvpH1_pH3-51_3_1302"], AnalysisConfig(path = "D:/data", save_path = "D:/analysis", file_tag = "test", number_of_workers = 4))
+    """
+    path: str = path
+    save_path: str = save_path
+    common_name: str = common_name
+    file_tag: str = file_tag
+    pH_in_label: tuple = pH_in_label
+    PLOT_DPI: int = PLOT_DPI
+    memory_map_bin_files: bool = memory_map_bin_files
+    streaming_mode: bool = streaming_mode
+    number_of_workers: int = number_of_workers
+    incremental_mode: bool = incremental_mode
+    result_cache_folder: str = result_cache_folder
+    result_cache_size_limit_mb: int = result_cache_size_limit_mb
+    hash_bin_file_contents: bool = hash_bin_file_contents
+    follow_file_name: str = follow_file_name
+    follow_idle_seconds: int = follow_idle_seconds
+    stage_reports: bool = stage_reports
+    trace_stage_memory: bool = trace_stage_memory
+    benchmark_folder: str = benchmark_folder
+    benchmark_durations_seconds: tuple = benchmark_durations_seconds
+    benchmark_acquisition_rates: tuple = benchmark_acquisition_rates
+    regression_check_folder: str = regression_check_folder
+    pos_time: int = pos_time
+    neg_time: int = neg_time
+    zero_time: int = zero_time
+    longest_run: int = longest_run
+    time_steps_seconds: int = time_steps_seconds
+    conductance_final_plot_data_seconds: int = conductance_final_plot_data_seconds
+    voltage_switch_threshold: float = voltage_switch_threshold
+    seconds_after_spike: float = seconds_after_spike
+    cap_data_backstep_seconds: float = cap_data_backstep_seconds
+    data_per_cap_spike_seconds: float = data_per_cap_spike_seconds
+    cond_data_location_seconds: float = cond_data_location_seconds
+    fit_offset: int = fit_offset
+    fit_backend: str = fit_backend
+    single_exp_fit_mode: str = single_exp_fit_mode
+    warm_start_fits: bool = warm_start_fits
+    number_of_fit_workers: int = number_of_fit_workers
+    keep_fit_curves: bool = keep_fit_curves
+    raw_current_data_seen: int = raw_current_data_seen
+    render_plots: bool = render_plots
+    number_of_plot_workers: int = number_of_plot_workers
+    
+    def total_voltage_cycle_time(self):
+        """
+            1. total_voltage_cycle_time, seconds of one voltage cycle: pos + zero + neg + zero
+        """
+        return(self.pos_time + self.neg_time + (self.zero_time*2))
+    
+    def keyword_settings(self, setting_names):
+        """
+            1. keyword_settings, dictionary of the fields in (setting_names) ({setting name: value}), to pass to a function by name
+        """
+        config_settings = asdict(self)
+        return({setting_name: config_settings[setting_name] for setting_name in setting_names})
+    
+    def analysis_settings(self):
+        """
+            1. analysis_settings, dictionary of the settings passed to function #16 by name for every file (ANALYSIS_SETTING_NAMES, function #17)
+        """
+        return(self.keyword_settings(ANALYSIS_SETTING_NAMES))
 
 
+"""30. Run the analysis"""
+BENCHMARK_SETTING_NAMES = ('pos_time', 'neg_time', 'zero_time', 'time_steps_seconds', 'conductance_final_plot_data_seconds', 'voltage_switch_threshold', 'seconds_after_spike', 
+                           'cap_data_backstep_seconds', 'data_per_cap_spike_seconds', 'cond_data_location_seconds', 'fit_offset', 'number_of_fit_workers', 'fit_backend', 
+                           'single_exp_fit_mode', 'number_of_plot_workers', 'raw_current_data_seen', 'PLOT_DPI')      # settings of function #26 with the same name in the AnalysisConfig
+REGRESSION_CHECK_SETTING_NAMES = ('voltage_switch_threshold', 'seconds_after_spike', 'cap_data_backstep_seconds', 'data_per_cap_spike_seconds', 'cond_data_location_seconds', 
+                                  'fit_offset', 'time_steps_seconds', 'conductance_final_plot_data_seconds')      # settings of function #28 with the same name in the AnalysisConfig
 
+def run(files = None, config = None):
+    """
+        This function runs the whole analysis with the settings in (config) (function #29, None = the DATA INPUT section): following a file that is
+        being written (function #7.65), the benchmark (function #26), the regression check (function #28), every pH file (function #17 or #18), the
+        global conductance plots (functions #7.75 and #7.76), saving the conductance (function #23) and the stage report summary (function #20).
+        
+        (files) is a list of file names (no .bin) in config.path to analyze, None = all the files with config.common_name in their name (function #1).
+        The pH of each file is taken from its name (function #1.1).
+        The settings are passed to functions #16, #26 and #28 by name, from the config fields with the same names (AnalysisConfig.keyword_settings).
+        
+        1. files_to_analyze, list of the file names that were analyzed
+        2. pHs, pH of each file
+        3. cond_time_chunks_master, conductance time chunks for all files
+        4. end_cond_master, end conductance values for all files
+        5. pH_time_steps, number of time steps in each file
+    """
+    if config is None:
+        config = AnalysisConfig()
+    total_voltage_cycle_time = config.total_voltage_cycle_time()
+    time_steps_in_minutes_for_legends = config.time_steps_seconds/60
+    analysis_settings = config.analysis_settings()
+    global_conductance_trends_folder = [f"global_conductance_trends_{config.file_tag}"]
+    
+    if config.follow_file_name is not None:
+        follow_acquisition_rate, follow_gain, follow_bessel_filter = read_text_file(config.path, config.follow_file_name)        # Function #3
+        for cycle_seconds, cycle_conductance in follow_bin_file(config.path, config.follow_file_name, config.voltage_switch_threshold, seconds_to_datapoints(config.seconds_after_spike, follow_acquisition_rate), config.cap_data_backstep_seconds * follow_acquisition_rate, 
+                                                                seconds_to_datapoints(config.data_per_cap_spike_seconds, follow_acquisition_rate), seconds_to_datapoints(config.cond_data_location_seconds, follow_acquisition_rate), follow_acquisition_rate, idle_seconds = config.follow_idle_seconds):        # Function #7.65
+            print(f"{config.follow_file_name}: {cycle_seconds/60:.2f} min, G = {cycle_conductance}")
+    
+    if config.benchmark_folder is not None:
+        os.makedirs(config.benchmark_folder, exist_ok = True)
+        run_benchmark(config.benchmark_folder, config.benchmark_durations_seconds, config.benchmark_acquisition_rates, include_fits = True, include_plots = config.render_plots, trace_memory = config.trace_stage_memory, 
+                      **config.keyword_settings(BENCHMARK_SETTING_NAMES))        # Function #26
+    
+    try:
+        os.mkdir(os.path.join(config.save_path, global_conductance_trends_folder[0]))    # makes a folder to save everything in (master folder)
+    except OSError as error:
+        print(error)
+    
+    global_stage_report = new_stage_report(f"global_{config.file_tag}", config.trace_stage_memory) if config.stage_reports else None        # Function #19
+    if files is None:
+        files_to_analyze, save_file_names, pHs = timed_stage(global_stage_report, "1. list_of_files", lambda result: len(result[0]), list_of_files, config.path, config.common_name, config.file_tag, config.pH_in_label)         # Function #1
+    else:
+        files_to_analyze = list(files)
+        save_file_names = [[f"{file_name}_{config.file_tag}"] for file_name in files_to_analyze]
+        pHs = [pH_from_file_name(file_name, config.pH_in_label) for file_name in files_to_analyze]         # Function #1.1
+    
+    if config.regression_check_folder is not None:
+        os.makedirs(config.regression_check_folder, exist_ok = True)
+        regression_check_files = [(config.regression_check_folder, write_synthetic_recording(config.regression_check_folder, "synthetic_GvpH1_pH7-00_regression", 520, 10000, pos_time = config.pos_time, neg_time = config.neg_time, zero_time = config.zero_time))]        # Function #25.1
+        regression_check_files += [(config.path, file_name) for file_name in files_to_analyze]
+        failed_checks = []
+        for check_path, check_file_name in regression_check_files:
+            check_results = regression_check(check_path, check_file_name, total_voltage_cycle_time = total_voltage_cycle_time, number_of_fit_workers = max(config.number_of_fit_workers, 2), 
+                                             **config.keyword_settings(REGRESSION_CHECK_SETTING_NAMES))        # Function #28
+            failed_checks += [f"{check_file_name}: {check_name}" for check_name, passed, details in check_results if not passed]
+        print(f"regression check: {len(failed_checks)} failed checks" + "".join([f"\n    {failed_check}" for failed_check in failed_checks]))
+    
+    if config.incremental_mode:
+        cond_time_chunks_master, end_cond_master, pH_time_steps = analyze_pH_files_incremental(config.path, files_to_analyze, config.save_path, save_file_names, analysis_settings, config.number_of_workers, os.path.join(config.save_path, f"analysis_manifest_{config.file_tag}.pkl"))         # Function #18
+    else:
+        cond_time_chunks_master, end_cond_master, pH_time_steps = analyze_pH_files(config.path, files_to_analyze, config.save_path, save_file_names, analysis_settings, config.number_of_workers)         # Function #17
+    
+    save_file_folder_name = save_file_names[-1]
+    
+    # timed_stage(global_stage_report, "15. plotting_total_double_lmfit_tau_trends", None, plotting_total_double_lmfit_tau_trends, lmfit_double_exp_10min_windows_master, pHs, config.save_path, save_file_folder_name, plots_folder_name, fit_vals_plots_folder_name, config.file_tag, time_steps, config.PLOT_DPI)       # Function #15
+    
+    # timed_stage(global_stage_report, "12. plotting_total_single_lmfit_tau_trends", None, plotting_total_single_lmfit_tau_trends, lmfit_single_exp_10min_windows_master, pHs, config.save_path, save_file_folder_name, plots_folder_name, fit_vals_plots_folder_name, config.file_tag, time_steps, config.PLOT_DPI)       # Function #12
+    
+    timed_stage(global_stage_report, "7.75 plotting_global_conductance_trends", None, plotting_global_conductance_trends, cond_time_chunks_master, pHs, time_steps_in_minutes_for_legends, total_voltage_cycle_time, config.longest_run, config.save_path, save_file_folder_name, plots_folder_name, global_conductance_trends_folder, config.PLOT_DPI)        # Function #7.75
+    
+    timed_stage(global_stage_report, "7.76 plotting_the_final_G_v_pH", None, plotting_the_final_G_v_pH, pHs, end_cond_master, config.save_path, save_file_folder_name, plots_folder_name, global_conductance_trends_folder, config.PLOT_DPI)        # Function #7.76
+    
+    timed_stage(global_stage_report, "23. saving_conductance_calulations", None, saving_conductance_calulations, cond_time_chunks_master, config.save_path, save_file_folder_name, npy_file_folder_name)        # Function #23
+    
+    if config.stage_reports:
+        global_report_path = save_stage_report(global_stage_report, os.path.join(config.save_path, global_conductance_trends_folder[0], "stage_report.json"))        # Function #19.2
+        stage_report_summary([os.path.join(config.save_path, save_file_name[0], "stage_report.json") for save_file_name in save_file_names] + [global_report_path])        # Function #20
+    
+    return(files_to_analyze, pHs, cond_time_chunks_master, end_cond_master, pH_time_steps)
 
 
-check_y = (raw_current[0:-1])
-check_x_temp = np.linspace(1, len(check_y), num = len(check_y), endpoint = True)
-check_x = [x / acquisition_rate for x in check_x_temp]
-
-# mean_y = window_mean_master[0:-1]
-# mean_x = window_mean_index_master[0:-1]
-
-# small_mean_y = small_window_mean_master[0:-1]
-# small_mean_x = small_window_index_master[0:-1]
-
-# state_0_events_y_data = state_0_event_current_data[0:-1]
-# state_0_events_x_data = state_0_event_index_data[0:-1]
-
-# state_1_events_y_data = state_1_event_current_data[0:-1]
-# state_1_events_x_data = state_1_event_index_data[0:-1]
-
+"""31. Command line"""
+def command_line_config(argv = None):
+    """
+        This function reads the command line (argv, None = sys.argv[1:]) into an AnalysisConfig (function #29). Every setting has an option with the
+        same name (--pos-time 3, --render-plots false, --pH-in-label 1 2, --plot-dpi 180, ...), settings that are not given keep the value of the DATA INPUT section.
+        The file names (no .bin) to analyze can be listed after the options, none = all the files with the common name.
+        
+        example: python G_vs_pH_analysis_01-24-2023.py --path D:/data --save-path D:/analysis --file-tag test --number-of-workers 4
+        
+        1. files, list of file names to analyze (None = all files with the common name)
+        2. config, AnalysisConfig
+    """
+    def true_or_false(text):
+        if text.lower() in ('true', 'yes', '1', 'on'):
+            return(True)
+        if text.lower() in ('false', 'no', '0', 'off'):
+            return(False)
+        raise argparse.ArgumentTypeError(f"expected true or false, got {text}")
+    
+    def text_or_none(text):
+        return(None if text.lower() == 'none' else text)
+    
+    parser = argparse.ArgumentParser(description = "Conductance vs pH analysis of .bin/.txt recordings. Settings not given keep the values of the DATA INPUT section.")
+    parser.add_argument('files', nargs = '*', help = "file names (no .bin) in --path to analyze, none = all files with --common-name in their name")
+    for setting in fields(AnalysisConfig):
+        if isinstance(setting.default, bool):
+            setting_type = {'type': true_or_false}
+        elif isinstance(setting.default, tuple):
+            setting_type = {'type': type(setting.default[0]), 'nargs': '+'}
+        elif setting.default is None or isinstance(setting.default, str):
+            setting_type = {'type': text_or_none}
+        else:
+            setting_type = {'type': setting.type}
+        option = f"--{setting.name.replace('_', '-')}"
+        parser.add_argument(*dict.fromkeys([option, option.lower()]), dest = setting.name, default = setting.default, help = f"default: {setting.default}", **setting_type)
+    
+    arguments = vars(parser.parse_args(argv))
+    files = arguments.pop('files') or None
+    config = AnalysisConfig(**{name: tuple(value) if isinstance(value, list) else value for name, value in arguments.items()})
+    
+    return(files, config)
 
-fig = plt.figure(figsize=(15,10))
-plt.scatter(check_x, check_y, s = 2, zorder = 0, alpha = 0.75)
-# plt.scatter(mean_x, mean_y, c = 'k', s=0.75, zorder = 2)
-# plt.scatter(small_mean_x, small_mean_y, c = 'y', s=0.5, zorder = 1)
-# plt.scatter(state_0_events_x_data, state_0_events_y_data, c = 'r', s=1, zorder = 1)
-# plt.scatter(state_1_events_x_data, state_1_events_y_data, c = 'r', s=1, zorder = 1)
-ax = plt.gca()
-ax.set_xlabel('Seconds')
-ax.set_ylabel('Current (pA)')
-# ax.set_title(f'initial_window_size = {initial_window_size}\nwindow_size_limit = {window_size_limit}\nwindow_stdev_limit = {window_stdev_limit}\nbaseline_focusing_val = {baseline_focusing_val}')
-plt.ylim(-200,22500)
-plt.xlim(9.98,10.1)
-# plt.savefig(os.path.join(path_to_save, final_analysis_folder_name[0], plots_file_folder[0], "1_min"), dpi = PLOT_DPI, bbox_inches = 'tight')
-# plt.close()
 
+if __name__ == "__main__":      # the analysis only runs when this file is run, not when the worker processes of function #17 import it
+    
+    files, config = command_line_config()        # Function #31
+    files_to_analyze, pHs, cond_time_chunks_master, end_cond_master, pH_time_steps = run(files, config)        # Function #30
 
+    #%%
+    
+    raw_current, raw_voltage, x_data_index_master = open_bin_data(config.path, files_to_analyze[-1], config.memory_map_bin_files or config.streaming_mode)     # last file analyzed, for checking
+    acquisition_rate, gain, bessel_filter = read_text_file(config.path, files_to_analyze[-1])
+    
+    check_window = (9.98, 10.1)         # seconds shown in the check plot, only this part of the trace is plotted
+    check_start = max(int(check_window[0] * acquisition_rate) - 1, 0)
+    check_stop = min(int(check_window[1] * acquisition_rate) + 1, len(raw_current) - 1)
+    check_y = (raw_current[check_start:check_stop])
+    check_x_temp = np.linspace(check_start + 1, check_stop, num = len(check_y), endpoint = True)
+    check_x, check_y = min_max_decimate(check_x_temp / acquisition_rate, check_y, int(15 * config.PLOT_DPI))         # Function #5.4
+    
+    # mean_y = window_mean_master[0:-1]
+    # mean_x = window_mean_index_master[0:-1]
+    
+    # small_mean_y = small_window_mean_master[0:-1]
+    # small_mean_x = small_window_index_master[0:-1]
+    
+    # state_0_events_y_data = state_0_event_current_data[0:-1]
+    # state_0_events_x_data = state_0_event_index_data[0:-1]
+    
+    # state_1_events_y_data = state_1_event_current_data[0:-1]
+    # state_1_events_x_data = state_1_event_index_data[0:-1]
+    
+    
+    fig = plt.figure(figsize=(15,10))
+    plt.scatter(check_x, check_y, s = 2, zorder = 0, alpha = 0.75)
+    # plt.scatter(mean_x, mean_y, c = 'k', s=0.75, zorder = 2)
+    # plt.scatter(small_mean_x, small_mean_y, c = 'y', s=0.5, zorder = 1)
+    # plt.scatter(state_0_events_x_data, state_0_events_y_data, c = 'r', s=1, zorder = 1)
+    # plt.scatter(state_1_events_x_data, state_1_events_y_data, c = 'r', s=1, zorder = 1)
+    ax = plt.gca()
+    ax.set_xlabel('Seconds')
+    ax.set_ylabel('Current (pA)')
+    # ax.set_title(f'initial_window_size = {initial_window_size}\nwindow_size_limit = {window_size_limit}\nwindow_stdev_limit = {window_stdev_limit}\nbaseline_focusing_val = {baseline_focusing_val}')
+    plt.ylim(-200,22500)
+    plt.xlim(*check_window)
+    # plt.savefig(os.path.join(path_to_save, final_analysis_folder_name[0], plots_file_folder[0], "1_min"), dpi = PLOT_DPI, bbox_inches = 'tight')
+    # plt.close()
 
 
 
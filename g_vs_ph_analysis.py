@@ -0,0 +1,26 @@
+"""
+Importable name for G_vs_pH_analysis_01-24-2023.py, whose file name has dashes in it and can not be imported directly.
+
+    from g_vs_ph_analysis import AnalysisConfig, run
+    run(["BS_p130_GvpH1_pH3-51_3_1302"], AnalysisConfig(path = "D:/data", save_path = "D:/analysis", file_tag = "test"))
+
+The analysis file is loaded in place of this module, so every function of it can be used from here, and the worker processes
+(functions #8.3, #17 and #24.3) find the same functions when they import this module. The command line works from here too:
+
+    python -m g_vs_ph_analysis --path D:/data --save-path D:/analysis --file-tag test
+"""
+import importlib.util
+import os
+import sys
+
+analysis_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "G_vs_pH_analysis_01-24-2023.py")
+analysis_module_name = "g_vs_ph_analysis" if __name__ == "__main__" else __name__
+
+analysis_spec = importlib.util.spec_from_file_location(analysis_module_name, analysis_file_path)
+analysis_module = importlib.util.module_from_spec(analysis_spec)
+sys.modules[analysis_module_name] = analysis_module
+analysis_spec.loader.exec_module(analysis_module)
+
+if __name__ == "__main__":
+    files, config = analysis_module.command_line_config()        # Function #31
+    analysis_module.run(files, config)        # Function #30
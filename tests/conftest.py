@@ -0,0 +1,15 @@
+import os
+import sys
+
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope = "session")
+def analysis():
+    """The analysis file, imported through g_vs_ph_analysis (its own file name has dashes in it)."""
+    import g_vs_ph_analysis
+    return(g_vs_ph_analysis)
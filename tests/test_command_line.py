@@ -0,0 +1,25 @@
+import inspect
+
+import pytest
+
+
+def keyword_parameters(function):
+    return({name for name, parameter in inspect.signature(function).parameters.items() if parameter.kind in (parameter.KEYWORD_ONLY, parameter.POSITIONAL_OR_KEYWORD)})
+
+
+def test_command_line_settings_are_passed_by_name(analysis):
+    files, config = analysis.command_line_config(["file_a", "file_b", "--pos-time", "4", "--voltage-switch-threshold", "7.5", "--render-plots", "false", "--pH-in-label", "1", "2", "--plot-dpi", "90"])        # Function #31
+    analysis_settings = config.analysis_settings()
+    
+    assert files == ["file_a", "file_b"]
+    assert config.pH_in_label == (1, 2)
+    assert (analysis_settings['pos_time'], analysis_settings['voltage_switch_threshold'], analysis_settings['render_plots'], analysis_settings['PLOT_DPI']) == (4, 7.5, False, 90)
+    assert set(analysis_settings) == {name for name, parameter in inspect.signature(analysis.analyze_pH_file).parameters.items() if parameter.kind == parameter.KEYWORD_ONLY}
+
+
+@pytest.mark.parametrize("function_name, setting_names_name", [("run_benchmark", "BENCHMARK_SETTING_NAMES"), ("regression_check", "REGRESSION_CHECK_SETTING_NAMES"), ("analyze_pH_file", "RESULT_SETTING_NAMES")])
+def test_setting_names_are_parameters(analysis, function_name, setting_names_name):
+    setting_names = set(getattr(analysis, setting_names_name))
+    
+    assert setting_names <= keyword_parameters(getattr(analysis, function_name))
+    assert set(analysis.AnalysisConfig().keyword_settings(setting_names)) == setting_names         # every setting is an AnalysisConfig field
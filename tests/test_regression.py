@@ -0,0 +1,36 @@
+import pytest
+
+# DATA INPUT values the regression check is run with, for the 3 / 10 / 3 / 10 second synthetic voltage cycle of function #25
+voltage_switch_threshold = 5
+seconds_after_spike = 2
+cap_data_backstep_seconds = 0.01
+data_per_cap_spike_seconds = 1
+cond_data_location_seconds = 1
+fit_offset = 50
+time_steps_seconds = 52
+conductance_final_plot_data_seconds = 52
+total_voltage_cycle_time = 26
+
+
+def run_regression_check(analysis, folder, duration_seconds, acquisition_rate, seed, include_fits, number_of_fit_workers = 1):
+    file_name = analysis.write_synthetic_recording(str(folder), f"synthetic_GvpH1_pH7-00_seed{seed}", duration_seconds, acquisition_rate, seed = seed)        # Function #25.1
+    check_results = analysis.regression_check(str(folder), file_name, voltage_switch_threshold, seconds_after_spike, cap_data_backstep_seconds, data_per_cap_spike_seconds, 
+                                              cond_data_location_seconds, fit_offset, time_steps_seconds, conductance_final_plot_data_seconds, total_voltage_cycle_time, 
+                                              include_fits = include_fits, number_of_fit_workers = number_of_fit_workers)        # Function #28
+    return(check_results)
+
+
+@pytest.mark.parametrize("seed, acquisition_rate", [(0, 10000), (1, 5000), (2, 2000)])
+def test_switches_and_conductance_match_reference(analysis, tmp_path, seed, acquisition_rate):
+    check_results = run_regression_check(analysis, tmp_path, 520, acquisition_rate, seed, include_fits = False)
+    
+    assert [check_name for check_name, passed, details in check_results if not passed] == []
+    assert len(check_results) == 10
+
+
+@pytest.mark.parametrize("seed", [0, 3])
+def test_fits_match_original_lmfit_loops(analysis, tmp_path, seed):
+    check_results = run_regression_check(analysis, tmp_path, 260, 10000, seed, include_fits = True, number_of_fit_workers = 2)
+    
+    assert [check_name for check_name, passed, details in check_results if not passed] == []
+    assert {check_name for check_name, passed, details in check_results} >= {"8. double exp taus (lmfit backend)", "9. single exp taus (lmfit)", "8. double exp taus (2 fit workers, #8.3)"}
@@ -0,0 +1,114 @@
+import ast
+import os
+
+import numpy as np
+import pytest
+
+analysis_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "G_vs_pH_analysis_01-24-2023.py")
+
+
+def load_analysis_function(function_name):
+    """Takes one function out of the analysis file, without running the rest of the file (it runs the analysis when it is imported)."""
+    with open(analysis_file_path) as analysis_file:
+        analysis_tree = ast.parse(analysis_file.read())
+    function_node = next(node for node in analysis_tree.body if isinstance(node, ast.FunctionDef) and node.name == function_name)
+    namespace = {'np': np}
+    exec(compile(ast.Module(body = [function_node], type_ignores = []), analysis_file_path, "exec"), namespace)
+    return(namespace[function_name])
+
+
+voltage_switch_index = load_analysis_function("voltage_switch_index")        # Function #6
+
+
+def original_voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike):
+    """The original one datapoint at a time loop of function #6, the vectorized scan has to give exactly the same index's."""
+    initial_v = int(np.mean(raw_voltage[500:1000]))
+    
+    current_switch_index = []
+    loop = len(raw_voltage)
+    i = 0
+    while i < loop:
+        if raw_voltage[i] > initial_v + voltage_switch_threshold or raw_voltage[i] < initial_v - voltage_switch_threshold:
+            current_switch_index.append(i)
+            initial_v = np.mean(raw_voltage[i+(dp_after_spike):i+(dp_after_spike)+500]) #sets the initial to two seconds into the current 
+            i = i + (dp_after_spike) # skips ahead time_after_spike seconds
+        else: i += 1
+    
+    return(current_switch_index)
+
+
+def synthetic_voltage(duration_seconds, acquisition_rate, seed, pos_time = 3, neg_time = 3, zero_time = 10, applied_voltage = 100, voltage_noise = 0.05):
+    """pos / zero / neg / zero voltage cycles with gaussian noise, like the recordings"""
+    rng = np.random.default_rng(seed)
+    cycle = np.concatenate([np.full(pos_time*acquisition_rate, applied_voltage), np.zeros(zero_time*acquisition_rate), 
+                            np.full(neg_time*acquisition_rate, -applied_voltage), np.zeros(zero_time*acquisition_rate)])
+    raw_voltage = np.tile(cycle, int(np.ceil(duration_seconds*acquisition_rate/len(cycle))))[:duration_seconds*acquisition_rate]
+    return(raw_voltage + rng.normal(0, voltage_noise, len(raw_voltage)))
+
+
+def assert_same_switches(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike, **scan_settings):
+    reference_switch_index = original_voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike)
+    current_switch_index = voltage_switch_index(raw_voltage, voltage_switch_threshold, acquisition_rate, dp_after_spike, **scan_settings)
+    
+    np.testing.assert_array_equal(np.asarray(current_switch_index, dtype = np.int64), np.asarray(reference_switch_index, dtype = np.int64))
+    return(reference_switch_index)
+
+
+@pytest.mark.parametrize("seed, acquisition_rate, seconds_after_spike", [(0, 10000, 2), (1, 5000, 2), (2, 2000, 1), (3, 1000, 5)])
+def test_synthetic_recordings(seed, acquisition_rate, seconds_after_spike):
+    raw_voltage = synthetic_voltage(156, acquisition_rate, seed)
+    
+    reference_switch_index = assert_same_switches(raw_voltage, 5, acquisition_rate, seconds_after_spike*acquisition_rate)
+    assert len(reference_switch_index) > 10
+
+
+@pytest.mark.parametrize("switch_scan_block_size", [1, 7, 4999, 65536])
+def test_block_sizes_and_big_endian_data(switch_scan_block_size):
+    # the .bin files are big endian, switches can fall on or next to the edge of a scan block
+    raw_voltage = synthetic_voltage(104, 1000, 4).astype('>d')
+    
+    assert_same_switches(raw_voltage, 5, 1000, 2000, switch_scan_block_size = switch_scan_block_size)
+
+
+def test_switches_inside_dp_after_spike_are_skipped():
+    # a second step 300 datapoints after the first one is inside the skip ahead, the baseline is then taken from the new level
+    raw_voltage = np.zeros(20000)
+    raw_voltage[5000:] = 100
+    raw_voltage[5300:] = 200
+    raw_voltage[12000:] = 0
+    
+    assert assert_same_switches(raw_voltage, 5, 1000, 1000) == [5000, 12000]
+
+
+def test_baseline_is_retaken_after_every_switch():
+    # after the skip ahead the baseline is the mean of the next 500 datapoints, a slow drift smaller than the threshold is not a switch
+    rng = np.random.default_rng(5)
+    raw_voltage = rng.normal(0, 0.5, 40000)
+    raw_voltage[8000:] += 100
+    raw_voltage[16000:] += np.linspace(0, 4, 24000)
+    raw_voltage[24000:] -= 200
+    raw_voltage[32000:] += 100
+    
+    assert_same_switches(raw_voltage, 5, 1000, 2000)
+
+
+@pytest.mark.filterwarnings("ignore:Mean of empty slice", "ignore:invalid value encountered")         # the original loop takes the mean of an empty baseline window
+def test_baseline_window_is_partly_or_fully_past_the_end():
+    raw_voltage = np.zeros(12000)
+    raw_voltage[9000:] = 100
+    raw_voltage[11800:] = 0       # the new baseline only has 200 datapoints
+    assert_same_switches(raw_voltage, 5, 1000, 2800)
+    
+    raw_voltage = np.zeros(12000)
+    raw_voltage[11000:] = 100         # the skip ahead runs past the end, no baseline (NaN) and no more switches
+    assert assert_same_switches(raw_voltage, 5, 1000, 2000) == [11000]
+
+
+def test_single_datapoint_spikes_and_values_on_the_threshold():
+    raw_voltage = np.zeros(20000)
+    raw_voltage[3000] = 5         # on the threshold, not a switch
+    raw_voltage[4000] = -5.000001       # just past it
+    raw_voltage[9000] = 50
+    raw_voltage[9500] = -50       # inside the skip ahead of the switch at 9000
+    
+    assert assert_same_switches(raw_voltage, 5, 1000, 1000) == [4000, 9000]